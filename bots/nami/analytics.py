@@ -1,107 +1,428 @@
+import gzip
 import json
 import logging
-from datetime import datetime
-from typing import Dict, Any
+import logging.handlers
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Set, Tuple
 import asyncio
 
+ANALYTICS_DIR = os.getenv("ANALYTICS_DIR", "analytics")  # event log segments + rollup snapshot
+FLUSH_INTERVAL = float(os.getenv("ANALYTICS_FLUSH_INTERVAL", 30))  # seconds between background saves
+FLUSH_EVENTS = int(os.getenv("ANALYTICS_FLUSH_EVENTS", 500))  # save early after this many unsaved events
+SNAPSHOT_INTERVAL = float(os.getenv("ANALYTICS_SNAPSHOT_INTERVAL", 300))  # seconds between rollup snapshots; newer events are replayed from the log
+RAW_RETENTION_DAYS = int(os.getenv("ANALYTICS_RAW_RETENTION_DAYS", 7))  # hourly segments older than this are compacted
+ARCHIVE_RETENTION_DAYS = int(os.getenv("ANALYTICS_ARCHIVE_RETENTION_DAYS", 0))  # delete compacted days after this, 0 keeps forever
+
+# Rollup resolution -> (bucket width in seconds, how long buckets are kept)
+RESOLUTIONS = {
+    "minute": (60, 2 * 86400),
+    "hour": (3600, 90 * 86400),
+    "day": (86400, 730 * 86400),
+}
+
+SNAPSHOT_FILE = "rollups.json"
+COMPACT_EVERY = 3600  # seconds between compaction passes
+
+
+class Bucket:
+    """Aggregated counts for one time bucket"""
+    __slots__ = ("commands", "errors", "users")
+
+    def __init__(self, commands=None, errors=None, users=None):
+        self.commands: Dict[str, int] = dict(commands or {})
+        self.errors: Dict[str, int] = dict(errors or {})
+        self.users = set(users or ())
+
+    def to_json(self) -> Dict:
+        """Plain copy of the counts, safe to serialize in another thread"""
+        return {"commands": dict(self.commands), "errors": dict(self.errors), "users": list(self.users)}
+
+
+def _segment_name(ts: float) -> str:
+    return "events-" + datetime.fromtimestamp(ts, timezone.utc).strftime("%Y%m%d%H") + ".jsonl"
+
+
 class Analytics:
-    def __init__(self, analytics_file: str = "analytics.json"):
-        self.analytics_file = analytics_file
-        self.data = self._load_data()
+    """
+    Usage analytics stored as an append-only event log (one JSON line per
+    event, rotated hourly) plus per-minute/hour/day rollups that are updated
+    as events arrive, so reports and time-range queries never rescan history.
+
+    Events are buffered in memory and a background task appends them in
+    batches (every FLUSH_INTERVAL seconds or FLUSH_EVENTS events). Every
+    SNAPSHOT_INTERVAL seconds, and in aclose(), the rollups are also saved
+    as an atomic snapshot: only buckets changed since the last snapshot are
+    copied on the event loop, and a worker thread merges them into its own
+    copy of the rollups and serializes that.
+    Hourly segments older than RAW_RETENTION_DAYS are compacted into one
+    gzipped file per day.
+    """
+
+    def __init__(self, analytics_dir: str = ANALYTICS_DIR, legacy_file: str = "analytics.json"):
+        self.analytics_dir = Path(analytics_dir)
+        self.analytics_dir.mkdir(parents=True, exist_ok=True)
         self._setup_logging()
 
+        self.rollups: Dict[str, Dict[int, Bucket]] = {name: {} for name in RESOLUTIONS}
+        # Lifetime counters
+        self.totals = {"commands": {}, "errors": {}, "users": set()}
+        self._pending: List[Dict] = []
+        # Rollup buckets changed since the last snapshot, as (resolution, bucket start)
+        self._dirty: Set[Tuple[str, int]] = set()
+        # The writer thread's copy of the rollups as last saved; only touched under _write_lock
+        self._saved: Dict[str, Dict[int, Dict]] = {name: {} for name in RESOLUTIONS}
+        self._write_lock = threading.Lock()
+        self._snapshot_at = 0.0
+        self._flush_event = None
+        self._flush_task = None
+        self._last_compaction = 0.0
+
+        self._load(Path(legacy_file))
+
     def _setup_logging(self):
-        """Set up analytics logging"""
+        """Set up analytics logging (lines are written by a listener thread, not the event loop)"""
         self.logger = logging.getLogger("nami_analytics")
         self.logger.setLevel(logging.INFO)
         handler = logging.FileHandler(filename="analytics.log", encoding='utf-8', mode='a')
         handler.setFormatter(logging.Formatter('%(asctime)s - %(message)s'))
-        self.logger.addHandler(handler)
+        log_queue = queue.SimpleQueue()
+        self._log_listener = logging.handlers.QueueListener(log_queue, handler)
+        self._log_listener.start()
+        self.logger.addHandler(logging.handlers.QueueHandler(log_queue))
+
+    # --- loading ---
 
-    def _load_data(self) -> Dict:
-        """Load analytics data from file"""
+    def _load(self, legacy_file: Path):
+        """Restore rollups from the snapshot and replay any events logged after it"""
+        snapshot_path = self.analytics_dir / SNAPSHOT_FILE
+        saved_at = 0.0
         try:
-            with open(self.analytics_file, 'r') as f:
-                return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            return {
-                'commands': {},
-                'errors': {},
-                'usage': {},
-                'preferences': {}
-            }
+            with open(snapshot_path, 'r') as f:
+                snapshot = json.load(f)
+            saved_at = snapshot["saved_at"]
+            for name, buckets in snapshot["rollups"].items():
+                if name in self.rollups:
+                    self.rollups[name] = {int(start): Bucket(**b) for start, b in buckets.items()}
+                    self._saved[name] = {int(start): b for start, b in buckets.items()}
+            totals = snapshot["totals"]
+            self.totals = {"commands": totals["commands"], "errors": totals["errors"], "users": set(totals["users"])}
+        except FileNotFoundError:
+            self._migrate_legacy(legacy_file)
+        except (ValueError, KeyError, TypeError) as e:
+            self.logger.error(f"Analytics snapshot unreadable, rebuilding from event log: {e}")
+            saved_at = 0.0
+
+        replayed = 0
+        for event in self._read_events(since=saved_at):
+            self._apply(event)
+            replayed += 1
+        if replayed:
+            self.logger.info(f"Replayed {replayed} analytics events newer than the snapshot")
 
-    def _save_data(self):
-        """Save analytics data to file"""
+    def _migrate_legacy(self, legacy_file: Path):
+        """Carry lifetime counters over from the old analytics.json"""
+        if not legacy_file.exists():
+            return
         try:
-            with open(self.analytics_file, 'w') as f:
-                json.dump(self.data, f, indent=4)
+            with open(legacy_file, 'r') as f:
+                legacy = json.load(f)
+            for cmd, users in legacy.get('commands', {}).items():
+                self.totals["commands"][cmd] = sum(users.values())
+                self.totals["users"].update(str(u) for u in users)
+            for cmd, errors in legacy.get('errors', {}).items():
+                self.totals["errors"][cmd] = sum(errors.values())
+            legacy_file.rename(legacy_file.with_name(legacy_file.name + ".migrated"))
+            self.logger.info(f"Migrated lifetime counters from {legacy_file}")
         except Exception as e:
-            self.logger.error(f"Failed to save analytics data: {e}")
+            self.logger.error(f"Failed to migrate {legacy_file}: {e}")
+
+    def _read_events(self, since: float = 0.0, until: Optional[float] = None):
+        """Yield logged events with since < ts <= until, oldest first (raw and compacted segments)"""
+        first_segment = _segment_name(since)[:len("events-YYYYMMDD")] if since else ""
+        for path in sorted(self.analytics_dir.glob("events-*")):
+            # Compacted days sort before their hours, so compare on the day prefix
+            if path.name[:len("events-YYYYMMDD")] < first_segment:
+                continue
+            opener = gzip.open if path.suffix == ".gz" else open
+            try:
+                with opener(path, 'rt', encoding='utf-8') as f:
+                    for line in f:
+                        try:
+                            event = json.loads(line)
+                        except ValueError:
+                            continue  # torn write at the end of a segment
+                        if event["ts"] > since and (until is None or event["ts"] <= until):
+                            yield event
+            except OSError as e:
+                self.logger.error(f"Failed to read {path}: {e}")
+
+    # --- recording ---
+
+    def _apply(self, event: Dict):
+        """Fold one event into the lifetime counters and every rollup resolution"""
+        kind = event["type"]
+        if kind == "preference":
+            return
+        command = event["command"]
+        user = str(event["user"])
+        target = "commands" if kind == "command" else "errors"
+
+        self.totals[target][command] = self.totals[target].get(command, 0) + 1
+        self.totals["users"].add(user)
+
+        ts = int(event["ts"])
+        for name, (width, _) in RESOLUTIONS.items():
+            start = ts - ts % width
+            bucket = self.rollups[name].get(start)
+            if bucket is None:
+                bucket = self.rollups[name][start] = Bucket()
+            counts = bucket.commands if kind == "command" else bucket.errors
+            counts[command] = counts.get(command, 0) + 1
+            bucket.users.add(user)
+            self._dirty.add((name, start))
+
+    def _record(self, event: Dict):
+        """Apply an event now and queue it for the event log"""
+        self._apply(event)
+        self._pending.append(event)
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # No event loop (scripts/tests): save straight away
+            self._persist(*self._prepare_flush(snapshot=True))
+            return
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_event = asyncio.Event()
+            self._flush_task = loop.create_task(self._flush_loop())
+        if len(self._pending) >= FLUSH_EVENTS:
+            self._flush_event.set()
 
     def log_command(self, command: str, user_id: int):
         """Log command usage"""
-        if command not in self.data['commands']:
-            self.data['commands'][command] = {}
-        
-        if user_id not in self.data['commands'][command]:
-            self.data['commands'][command][user_id] = 0
-        
-        self.data['commands'][command][user_id] += 1
-        self._save_data()
+        self._record({"ts": time.time(), "type": "command", "command": command, "user": user_id})
         self.logger.info(f"Command {command} used by user {user_id}")
 
     def log_error(self, command: str, error: str, user_id: int):
         """Log command errors"""
-        if command not in self.data['errors']:
-            self.data['errors'][command] = {}
-        
-        if error not in self.data['errors'][command]:
-            self.data['errors'][command][error] = 0
-        
-        self.data['errors'][command][error] += 1
-        self._save_data()
+        self._record({"ts": time.time(), "type": "error", "command": command, "user": user_id, "error": error})
         self.logger.error(f"Error in {command} by user {user_id}: {error}")
 
     def log_preference(self, user_id: int, preference: str, value: Any):
         """Log user preferences"""
-        if user_id not in self.data['preferences']:
-            self.data['preferences'][user_id] = {}
-        
-        self.data['preferences'][user_id][preference] = value
-        self._save_data()
+        self._record({"ts": time.time(), "type": "preference", "user": user_id, "preference": preference, "value": value})
         self.logger.info(f"User {user_id} set preference {preference} to {value}")
 
+    # --- persistence ---
+
+    def _prune_rollups(self, now: float):
+        for name, (_, retention) in RESOLUTIONS.items():
+            buckets = self.rollups[name]
+            cutoff = now - retention
+            # Buckets are created in time order, so the oldest are first
+            while buckets:
+                oldest = next(iter(buckets))
+                if oldest >= cutoff:
+                    break
+                del buckets[oldest]
+
+    def _prepare_flush(self, snapshot: bool = False):
+        """
+        Take the pending events and, if snapshot is set, copies of the rollup buckets changed since
+        the last snapshot (must run on the loop; the cost doesn't grow with history)
+        """
+        now = time.time()
+        self._prune_rollups(now)
+        events, self._pending = self._pending, []
+
+        lines: Dict[str, List[str]] = {}
+        for event in events:
+            lines.setdefault(_segment_name(event["ts"]), []).append(json.dumps(event, default=str) + "\n")
+
+        changes = None
+        if snapshot:
+            dirty, self._dirty = self._dirty, set()
+            changes = {
+                "saved_at": now,
+                "buckets": {
+                    (name, start): self.rollups[name][start].to_json()
+                    for name, start in dirty if start in self.rollups[name]
+                },
+                "totals": {
+                    "commands": dict(self.totals["commands"]),
+                    "errors": dict(self.totals["errors"]),
+                    "users": list(self.totals["users"]),
+                },
+            }
+        return lines, changes
+
+    def _persist(self, lines: Dict[str, List[str]], changes: Optional[Dict]):
+        """Append events to their segments, then (with changes) atomically replace the rollup snapshot"""
+        for segment, segment_lines in lines.items():
+            with open(self.analytics_dir / segment, 'a', encoding='utf-8') as f:
+                f.writelines(segment_lines)
+        if changes is None:
+            return
+        with self._write_lock:
+            for (name, start), bucket in changes["buckets"].items():
+                self._saved[name][start] = bucket
+            for name, (_, retention) in RESOLUTIONS.items():
+                cutoff = changes["saved_at"] - retention
+                for start in [start for start in self._saved[name] if start < cutoff]:
+                    del self._saved[name][start]
+            tmp_path = self.analytics_dir / (SNAPSHOT_FILE + ".tmp")
+            with open(tmp_path, 'w') as f:
+                json.dump({"saved_at": changes["saved_at"], "rollups": self._saved, "totals": changes["totals"]}, f)
+            os.replace(tmp_path, self.analytics_dir / SNAPSHOT_FILE)
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_event.wait(), timeout=FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_event.clear()
+            await self.flush()
+            if time.time() - self._last_compaction > COMPACT_EVERY:
+                self._last_compaction = time.time()
+                try:
+                    await asyncio.to_thread(self.compact)
+                except Exception as e:
+                    self.logger.error(f"Analytics compaction failed: {e}")
+
+    async def flush(self, snapshot: Optional[bool] = None):
+        """
+        Save pending events, plus a rollup snapshot when one is due (or snapshot=True); events are
+        encoded here, the snapshot is serialized and everything written in a worker thread
+        """
+        if snapshot is None:
+            snapshot = time.time() - self._snapshot_at >= SNAPSHOT_INTERVAL
+        snapshot = snapshot and bool(self._dirty)
+        if not self._pending and not snapshot:
+            return
+        events = list(self._pending)
+        lines, changes = self._prepare_flush(snapshot)
+        try:
+            await asyncio.to_thread(self._persist, lines, changes)
+            if changes is not None:
+                self._snapshot_at = changes["saved_at"]
+        except Exception as e:
+            # Put the events and changed buckets back so the next flush retries them
+            self._pending[:0] = events
+            if changes is not None:
+                self._dirty.update(changes["buckets"])
+            self.logger.error(f"Failed to save analytics data: {e}")
+
+    def compact(self, now: Optional[float] = None):
+        """
+        Merge hourly segments older than RAW_RETENTION_DAYS into one gzipped
+        segment per day, and drop compacted days past ARCHIVE_RETENTION_DAYS.
+        """
+        now = now or time.time()
+        raw_cutoff = _segment_name(now - RAW_RETENTION_DAYS * 86400)[:len("events-YYYYMMDD")]
+
+        by_day: Dict[str, List[Path]] = {}
+        for path in sorted(self.analytics_dir.glob("events-*.jsonl")):
+            day = path.name[:len("events-YYYYMMDD")]
+            if day < raw_cutoff:
+                by_day.setdefault(day, []).append(path)
+
+        for day, paths in by_day.items():
+            archive = self.analytics_dir / f"{day}.jsonl.gz"
+            with gzip.open(archive, 'at', encoding='utf-8') as out:
+                for path in paths:
+                    with open(path, 'r', encoding='utf-8') as f:
+                        out.writelines(f)
+            for path in paths:
+                path.unlink()
+            self.logger.info(f"Compacted {len(paths)} analytics segments into {archive.name}")
+
+        if ARCHIVE_RETENTION_DAYS > 0:
+            archive_cutoff = _segment_name(now - ARCHIVE_RETENTION_DAYS * 86400)[:len("events-YYYYMMDD")]
+            for path in self.analytics_dir.glob("events-*.jsonl.gz"):
+                if path.name[:len("events-YYYYMMDD")] < archive_cutoff:
+                    path.unlink()
+
+    async def aclose(self):
+        """Stop the background flusher and save everything still pending"""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        await self.flush(snapshot=True)
+        self._log_listener.stop()
+
+    # --- queries ---
+
+    def query(self, start: float, end: float, resolution: str = "hour") -> List[Dict]:
+        """
+        Rollup buckets overlapping [start, end) at the given resolution
+        ("minute", "hour" or "day"), oldest first, including empty buckets.
+        """
+        width, _ = RESOLUTIONS[resolution]
+        buckets = self.rollups[resolution]
+        first = int(start) - int(start) % width
+        results = []
+        for bucket_start in range(first, int(end), width):
+            bucket = buckets.get(bucket_start)
+            results.append({
+                "start": bucket_start,
+                "commands": sum(bucket.commands.values()) if bucket else 0,
+                "errors": sum(bucket.errors.values()) if bucket else 0,
+                "unique_users": len(bucket.users) if bucket else 0,
+                "by_command": dict(bucket.commands) if bucket else {},
+            })
+        return results
+
+    def summarize(self, start: float, end: float, resolution: str = "hour") -> Dict:
+        """Totals over [start, end): commands, errors and distinct users"""
+        width, _ = RESOLUTIONS[resolution]
+        buckets = self.rollups[resolution]
+        first = int(start) - int(start) % width
+        commands = errors = 0
+        users = set()
+        for bucket_start in range(first, int(end), width):
+            bucket = buckets.get(bucket_start)
+            if bucket:
+                commands += sum(bucket.commands.values())
+                errors += sum(bucket.errors.values())
+                users |= bucket.users
+        return {"commands": commands, "errors": errors, "unique_users": len(users)}
+
     async def generate_report(self):
         """Generate analytics report"""
+        now = time.time()
         report = {
-            'total_commands': sum(len(cmds) for cmds in self.data['commands'].values()),
-            'total_errors': sum(len(errs) for errs in self.data['errors'].values()),
+            'total_commands': sum(self.totals["commands"].values()),
+            'total_errors': sum(self.totals["errors"].values()),
             'top_commands': self._get_top_commands(),
             'error_rates': self._get_error_rates(),
-            'user_count': len(self.data['preferences'])
+            'user_count': len(self.totals["users"]),
+            'last_24h': self.summarize(now - 86400, now, "hour"),
+            'last_7d': self.summarize(now - 7 * 86400, now, "day"),
         }
-        
+
         return report
 
     def _get_top_commands(self, limit: int = 5) -> Dict:
         """Get top used commands"""
-        command_counts = {}
-        for cmd, users in self.data['commands'].items():
-            command_counts[cmd] = sum(users.values())
-        
-        return dict(sorted(command_counts.items(), key=lambda x: x[1], reverse=True)[:limit])
+        return dict(sorted(self.totals["commands"].items(), key=lambda x: x[1], reverse=True)[:limit])
 
     def _get_error_rates(self) -> Dict:
         """Calculate error rates per command"""
         error_rates = {}
-        for cmd, errors in self.data['errors'].items():
-            total_errors = sum(errors.values())
-            if cmd in self.data['commands']:
-                total_uses = sum(self.data['commands'][cmd].values())
-                error_rate = (total_errors / total_uses) * 100 if total_uses > 0 else 0
-                error_rates[cmd] = f"{error_rate:.2f}%"
-        
+        for cmd, total_errors in self.totals["errors"].items():
+            total_uses = self.totals["commands"].get(cmd, 0)
+            if total_uses:
+                error_rates[cmd] = f"{(total_errors / total_uses) * 100:.2f}%"
+
         return error_rates
 
 # Initialize analytics
@@ -0,0 +1,79 @@
+"""
+Normalized NewsAPI articles.
+
+A response is parsed into an ArticlePage once per cache entry (see the news
+cache's decode hook), and each Article renders its Discord embed on first use
+and keeps it, so cached pages and pages nobody looks at cost nothing to serve.
+"""
+
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from discord import Embed
+
+logger = logging.getLogger(__name__)
+
+NO_DESCRIPTION = "No description available"
+REMOVED = "[Removed]"  # NewsAPI's placeholder for withdrawn articles
+
+
+class Article:
+    __slots__ = ("title", "url", "description", "published_at", "image_url", "source", "_embed")
+
+    def __init__(self, title: str, url: str, description: str, published_at: Optional[datetime],
+                 image_url: Optional[str], source: str):
+        self.title = title
+        self.url = url
+        self.description = description
+        self.published_at = published_at
+        self.image_url = image_url
+        self.source = source
+        self._embed: Optional[Embed] = None
+
+    @classmethod
+    def from_json(cls, raw: Dict) -> Optional["Article"]:
+        """Build an Article from one NewsAPI article object, or None if it's unusable"""
+        title = raw.get("title")
+        url = raw.get("url")
+        if not title or not url or title == REMOVED:
+            return None
+        published_at = None
+        if raw.get("publishedAt"):
+            try:
+                published_at = datetime.fromisoformat(raw["publishedAt"].replace("Z", "+00:00"))
+            except ValueError:
+                pass
+        return cls(
+            title=title,
+            url=url,
+            description=raw.get("description") or NO_DESCRIPTION,
+            published_at=published_at,
+            image_url=raw.get("urlToImage") or None,
+            source=(raw.get("source") or {}).get("name") or "Unknown source",
+        )
+
+    def embed(self) -> Embed:
+        """The article's Discord embed, built on first call and shared afterwards (don't mutate it)"""
+        if self._embed is None:
+            embed = Embed(title=self.title[:256], url=self.url, description=self.description[:4096],
+                          timestamp=self.published_at)
+            if self.image_url:
+                embed.set_image(url=self.image_url)
+            embed.set_author(name=self.source)
+            self._embed = embed
+        return self._embed
+
+
+class ArticlePage:
+    """One decoded NewsAPI response"""
+    __slots__ = ("articles", "total_results")
+
+    def __init__(self, articles: List[Article], total_results: int):
+        self.articles = articles
+        self.total_results = total_results
+
+    @classmethod
+    def from_response(cls, data: Dict) -> "ArticlePage":
+        articles = [a for a in (Article.from_json(raw) for raw in data.get("articles") or []) if a is not None]
+        return cls(articles, data.get("totalResults") or 0)
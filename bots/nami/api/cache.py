@@ -0,0 +1,260 @@
+"""
+Bounded response cache shared by the News, Weather and Crypto APIs.
+
+Entries are evicted least-recently-used once max_entries or max_bytes is
+exceeded. An expired entry is still served for stale_ttl seconds while a
+background task refreshes it (stale-while-revalidate), and failures listed in
+negative_errors are cached for error_ttl seconds so a bad query doesn't hit
+the upstream API on every retry.
+
+Pass a store (see api/cache_store.py) to write entries through to disk and
+warm the cache from it at startup.
+
+Pass decode to turn a raw (JSON-serializable) value into the object callers
+want; it runs once per cache entry and the result is kept with the entry,
+while the store still persists the raw value.
+
+Pass the provider's governor (see api/quota.py) to fall back to cached data:
+while it is conserving, any cached value is served without a refresh, and
+when it refuses a request an expired value is served rather than an error.
+"""
+
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, Type
+
+from api.quota import QuotaExceeded
+from api.singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+
+def _json_size(value: Any) -> int:
+    """Approximate the memory cost of a decoded JSON response by its encoded length"""
+    try:
+        return len(json.dumps(value, default=str))
+    except (TypeError, ValueError):
+        return 1024
+
+
+class CacheEntry:
+    __slots__ = ("value", "error", "size", "expires_at", "stale_until", "decoded")
+
+    def __init__(self, value: Any, error: Optional[Exception], size: int, expires_at: float, stale_until: float):
+        self.value = value
+        self.error = error
+        self.size = size
+        self.expires_at = expires_at
+        self.stale_until = stale_until
+        self.decoded = None
+
+
+class ResponseCache:
+    def __init__(
+        self,
+        name: str,
+        ttl: float,
+        max_entries: int = 1024,
+        max_bytes: int = 16 * 1024 * 1024,
+        stale_ttl: float = 0,
+        error_ttl: float = 0,
+        negative_errors: Tuple[Type[Exception], ...] = (),
+        sizeof: Callable[[Any], int] = _json_size,
+        store=None,
+        governor=None,
+        decode: Optional[Callable[[Any], Any]] = None,
+    ):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.stale_ttl = stale_ttl
+        self.error_ttl = error_ttl
+        self.negative_errors = negative_errors
+        self.sizeof = sizeof
+        self.store = store
+        self.governor = governor
+        self.decode = decode
+
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._bytes = 0
+        # key -> background refresh task (holding the reference keeps it from being garbage collected)
+        self._refreshing: Dict[str, asyncio.Task] = {}
+        # Concurrent misses for the same key share one fetch
+        self.flight = SingleFlight()
+
+        self.hits = 0
+        self.stale_hits = 0
+        self.negative_hits = 0
+        self.fallback_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if self.store is not None:
+            self._warm()
+
+    # --- storage ---
+
+    def _store(self, key: str, entry: CacheEntry):
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= old.size
+        self._entries[key] = entry
+        self._bytes += entry.size
+
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= evicted.size
+            self.evictions += 1
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        """Cache value under key for ttl seconds (default: the cache's ttl)"""
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl
+        self._store(key, CacheEntry(value, None, self.sizeof(value), expires_at, expires_at + self.stale_ttl))
+        if self.store is not None:
+            wall_expires_at = time.time() + ttl
+            self.store.put(self.name, key, value, wall_expires_at, wall_expires_at + self.stale_ttl)
+
+    def set_error(self, key: str, error: Exception, ttl: Optional[float] = None):
+        """Negatively cache error under key"""
+        expires_at = time.monotonic() + (self.error_ttl if ttl is None else ttl)
+        self._store(key, CacheEntry(None, error, 0, expires_at, expires_at))
+
+    def invalidate(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.size
+        if self.store is not None:
+            self.store.delete(self.name, key)
+
+    def _warm(self):
+        """Load still-servable entries from the store, converting wall-clock expiry to monotonic"""
+        offset = time.monotonic() - time.time()
+        rows = self.store.load(self.name)
+        for key, value, expires_at, stale_until in rows:
+            self._store(key, CacheEntry(value, None, self.sizeof(value), expires_at + offset, stale_until + offset))
+        if rows:
+            logger.info(f"[{self.name} cache] Warmed {len(self._entries)} entries from disk")
+
+    def clear(self):
+        self._entries.clear()
+        self._bytes = 0
+
+    # --- lookups ---
+
+    def _result(self, entry: CacheEntry) -> Any:
+        """What callers get for an entry: the raw value, or its memoized decoding"""
+        if self.decode is None:
+            return entry.value
+        if entry.decoded is None:
+            entry.decoded = self.decode(entry.value)
+        return entry.decoded
+
+    def get_stale(self, key: str) -> Optional[Any]:
+        """Return whatever value is cached for key, however old (for when upstream is unavailable)"""
+        entry = self._entries.get(key)
+        if entry is None or entry.error is not None:
+            return None
+        self.fallback_hits += 1
+        return self._result(entry)
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the fresh cached value for key, or None (negative and stale entries count as misses)"""
+        entry = self._entries.get(key)
+        if entry is not None and entry.error is None and time.monotonic() < entry.expires_at:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._result(entry)
+        self.misses += 1
+        return None
+
+    async def get_or_fetch(self, key: str, fetch: Callable[[], Awaitable[Any]], ttl: Optional[float] = None) -> Any:
+        """
+        Return the cached value for key, calling fetch() on a miss.
+        A stale entry is returned immediately and refreshed in the background.
+        """
+        entry = self._entries.get(key)
+        now = time.monotonic()
+
+        if entry is not None:
+            if now < entry.expires_at:
+                self._entries.move_to_end(key)
+                if entry.error is not None:
+                    self.negative_hits += 1
+                    raise entry.error
+                self.hits += 1
+                return self._result(entry)
+
+            if entry.error is None and self.governor is not None and self.governor.conserving():
+                # Upstream budget is tight or its circuit is open: don't spend a request on a refresh
+                self._entries.move_to_end(key)
+                self.fallback_hits += 1
+                return self._result(entry)
+
+            if entry.error is None and now < entry.stale_until:
+                self._entries.move_to_end(key)
+                self.stale_hits += 1
+                self._refresh_in_background(key, fetch, ttl)
+                return self._result(entry)
+
+        self.misses += 1
+        try:
+            return await self.flight.do(key, lambda: self._load(key, fetch, ttl))
+        except QuotaExceeded:
+            if entry is not None and entry.error is None:
+                self.misses -= 1
+                self.fallback_hits += 1
+                return self._result(entry)
+            raise
+
+    async def _load(self, key: str, fetch: Callable[[], Awaitable[Any]], ttl: Optional[float]) -> Any:
+        try:
+            value = await fetch()
+        except self.negative_errors as e:
+            if self.error_ttl > 0:
+                self.set_error(key, e)
+            raise
+        self.set(key, value, ttl)
+        entry = self._entries.get(key)
+        if entry is None:
+            # Too big to keep, but the caller still gets it
+            return value if self.decode is None else self.decode(value)
+        return self._result(entry)
+
+    def _refresh_in_background(self, key: str, fetch: Callable[[], Awaitable[Any]], ttl: Optional[float]):
+        if key in self._refreshing:
+            return
+
+        async def refresh():
+            try:
+                value = await self.flight.do(key, fetch)
+                self.set(key, value, ttl)
+            except Exception as e:
+                # Keep serving the stale entry until it runs out
+                logger.warning(f"[{self.name} cache] Background refresh failed: {e}")
+            finally:
+                self._refreshing.pop(key, None)
+
+        self._refreshing[key] = asyncio.create_task(refresh())
+
+    def stats(self) -> Dict:
+        total = self.hits + self.stale_hits + self.negative_hits + self.fallback_hits + self.misses
+        served = self.hits + self.stale_hits + self.negative_hits + self.fallback_hits
+        return {
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "negative_hits": self.negative_hits,
+            "fallback_hits": self.fallback_hits,
+            "misses": self.misses,
+            "hit_rate": (served / total) * 100 if total else 0.0,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "bytes": self._bytes
+        }
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,116 @@
+"""
+Optional on-disk backing store for ResponseCache, so a restart doesn't cold-start every upstream API.
+
+Enabled by setting CACHE_DB_PATH. Caches write through to a SQLite file and
+warm themselves from it at startup; entries whose stale window has passed are
+skipped and pruned. Writes run on a dedicated worker thread so they never
+block the event loop.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+CACHE_DB_PATH = os.getenv("CACHE_DB_PATH")
+
+
+class SQLiteCacheStore:
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS cache_entries (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                stale_until REAL NOT NULL,
+                PRIMARY KEY (namespace, key)
+            )"""
+        )
+        self._conn.commit()
+        # Every statement after this point runs on this single worker thread
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cache-store")
+        self.prune()
+        logger.info(f"Using persistent response cache at {db_path}")
+
+    def load(self, namespace: str) -> List[Tuple[str, Any, float, float]]:
+        """
+        Return (key, value, expires_at, stale_until) rows still usable now; times are wall-clock epoch seconds.
+        Blocks until the read completes, so only call it at startup.
+        """
+        return self._writer.submit(self._load, namespace).result()
+
+    def _load(self, namespace: str) -> List[Tuple[str, Any, float, float]]:
+        rows = self._conn.execute(
+            "SELECT key, value, expires_at, stale_until FROM cache_entries WHERE namespace = ? AND stale_until > ?",
+            (namespace, time.time()),
+        ).fetchall()
+        entries = []
+        for key, value, expires_at, stale_until in rows:
+            try:
+                entries.append((key, json.loads(value), expires_at, stale_until))
+            except ValueError:
+                continue
+        return entries
+
+    def put(self, namespace: str, key: str, value: Any, expires_at: float, stale_until: float):
+        """Queue a write-through of one entry (times are wall-clock epoch seconds)"""
+        try:
+            encoded = json.dumps(value)
+        except (TypeError, ValueError):
+            return  # Not JSON-serializable, keep it memory-only
+        self._writer.submit(
+            self._execute,
+            "INSERT OR REPLACE INTO cache_entries (namespace, key, value, expires_at, stale_until) VALUES (?, ?, ?, ?, ?)",
+            (namespace, key, encoded, expires_at, stale_until),
+        )
+
+    def delete(self, namespace: str, key: str):
+        self._writer.submit(self._execute, "DELETE FROM cache_entries WHERE namespace = ? AND key = ?", (namespace, key))
+
+    def prune(self):
+        """Drop entries that can no longer be served"""
+        self._writer.submit(self._execute, "DELETE FROM cache_entries WHERE stale_until <= ?", (time.time(),))
+
+    def _execute(self, sql: str, params: Tuple):
+        try:
+            self._conn.execute(sql, params)
+            self._conn.commit()
+        except sqlite3.Error as e:
+            logger.error(f"Cache store write failed: {e}")
+
+    def close(self):
+        """Finish queued writes and close the database"""
+        self._writer.shutdown(wait=True)
+        self._conn.close()
+
+
+_store: Optional[SQLiteCacheStore] = None
+
+
+def get_store() -> Optional[SQLiteCacheStore]:
+    """Return the process-wide store, or None when CACHE_DB_PATH isn't set"""
+    global _store
+    if _store is None and CACHE_DB_PATH:
+        try:
+            _store = SQLiteCacheStore(CACHE_DB_PATH)
+        except sqlite3.Error as e:
+            logger.error(f"Could not open persistent cache at {CACHE_DB_PATH}, continuing in memory only: {e}")
+    return _store
+
+
+def close_store():
+    global _store
+    if _store is not None:
+        _store.close()
+        _store = None
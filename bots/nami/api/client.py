@@ -0,0 +1,123 @@
+"""
+Shared async HTTP client used by the News, Weather and Crypto APIs
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+import aiohttp
+
+from api.quota import QuotaGovernor
+from metrics import UPSTREAM_LATENCY
+
+logger = logging.getLogger(__name__)
+
+# Connection pool / timeout tuning (all optional, defaults shown)
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", 10))  # total seconds per request
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", 5))
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", 100))  # max open connections
+HTTP_POOL_PER_HOST = int(os.getenv("HTTP_POOL_PER_HOST", 20))  # max connections per upstream host
+HTTP_KEEPALIVE = float(os.getenv("HTTP_KEEPALIVE", 30))  # seconds an idle connection is kept
+HTTP_DNS_TTL = int(os.getenv("HTTP_DNS_TTL", 300))  # seconds a DNS lookup is cached
+
+class InvalidResponse(aiohttp.ClientError):
+    """A successful response whose body wasn't valid JSON (e.g. an HTML error page from a proxy)"""
+    pass
+
+
+# Exceptions callers should treat as "request failed"
+HTTP_ERRORS = (aiohttp.ClientError, asyncio.TimeoutError)
+
+_session: Optional[aiohttp.ClientSession] = None
+_session_lock = asyncio.Lock()
+
+
+def _clean_params(params: Optional[Dict]) -> Dict:
+    """Drop None values and stringify the rest, like requests does"""
+    cleaned = {}
+    for key, value in (params or {}).items():
+        if value is None:
+            continue
+        if isinstance(value, bool):
+            value = "true" if value else "false"
+        cleaned[key] = str(value)
+    return cleaned
+
+
+async def get_session() -> aiohttp.ClientSession:
+    """Return the process-wide ClientSession, creating it on first use"""
+    global _session
+    if _session is not None and not _session.closed:
+        return _session
+
+    async with _session_lock:
+        if _session is None or _session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=HTTP_POOL_SIZE,
+                limit_per_host=HTTP_POOL_PER_HOST,
+                keepalive_timeout=HTTP_KEEPALIVE,
+                ttl_dns_cache=HTTP_DNS_TTL,
+                use_dns_cache=True,
+            )
+            timeout = aiohttp.ClientTimeout(total=HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT)
+            _session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+            logger.info(
+                f"Opened HTTP session (pool={HTTP_POOL_SIZE}, per_host={HTTP_POOL_PER_HOST}, "
+                f"timeout={HTTP_TIMEOUT}s)"
+            )
+    return _session
+
+
+async def get_json(url: str, params: Optional[Dict] = None, headers: Optional[Dict] = None,
+                   quota: Optional[QuotaGovernor] = None):
+    """
+    GET a URL and decode the JSON body.
+    Raises aiohttp.ClientResponseError for non-2xx responses, InvalidResponse for
+    bodies that aren't JSON and aiohttp.ClientError / asyncio.TimeoutError for
+    transport failures.
+    With a quota governor, raises QuotaExceeded instead of sending a request
+    it expects to fail, and reports the outcome back to it.
+    """
+    if quota is not None:
+        quota.acquire()
+    session = await get_session()
+    status = "error"
+    start = time.perf_counter()
+    try:
+        async with session.get(url, params=_clean_params(params), headers=headers) as response:
+            status = str(response.status)
+            if quota is not None:
+                quota.record(response.status, response.headers)
+            response.raise_for_status()
+            try:
+                return await response.json(content_type=None)
+            except ValueError:
+                raise InvalidResponse(f"invalid JSON in HTTP {response.status} response")
+    except HTTP_ERRORS as e:
+        if quota is not None and not isinstance(e, aiohttp.ClientResponseError):
+            quota.record_failure(describe_error(e))
+        raise
+    finally:
+        UPSTREAM_LATENCY.labels(api=urlsplit(url).hostname, status=status).observe(time.perf_counter() - start)
+
+
+def describe_error(error: Exception) -> str:
+    """Short, user-safe description of a request failure (never includes the URL/API key)"""
+    if isinstance(error, aiohttp.ClientResponseError):
+        return f"HTTP {error.status}: {error.message}"
+    if isinstance(error, asyncio.TimeoutError):
+        return "request timed out"
+    return str(error)
+
+
+async def close_session():
+    """Close the shared session (call on shutdown)"""
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+        logger.info("Closed HTTP session")
+    _session = None
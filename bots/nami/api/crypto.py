@@ -1,64 +1,232 @@
 import asyncio
-import requests
-from typing import Dict, Optional, List
+import re
+import time
+from typing import Dict, Optional, List, Iterable, Set
 from dotenv import load_dotenv
 import os
+from api.client import get_json, describe_error, HTTP_ERRORS
+from api.cache import ResponseCache
+from api.cache_store import get_store
+from api.quota import QuotaExceeded, QuotaGovernor
 
 load_dotenv()
 
+QUOTE_TTL = int(os.getenv("CRYPTO_QUOTE_TTL", 60))  # seconds a quote is served from cache
+BATCH_WINDOW = float(os.getenv("CRYPTO_BATCH_WINDOW", 0.05))  # seconds to collect lookups into one request
+POLL_INTERVAL = float(os.getenv("CRYPTO_POLL_INTERVAL", 0))  # seconds between background polls, 0 disables
+QUOTA_PER_MINUTE = 30  # CoinGecko public API; override with CRYPTO_QUOTA_PER_MINUTE
+
+# Map common symbols to CoinGecko IDs
+SYMBOL_MAP = {
+    "btc": "bitcoin",
+    "eth": "ethereum",
+    "sol": "solana",
+    "doge": "dogecoin",
+    "ada": "cardano",
+    "dot": "polkadot",
+    "ltc": "litecoin"
+}
+# Other names must look like a CoinGecko coin id, e.g. "shiba-inu", and be tracked (see CryptoAPI.track)
+COIN_ID_PATTERN = re.compile(r"^[a-z0-9][a-z0-9-]{0,63}$")
+
 class CryptoAPIError(Exception):
     """Custom exception for crypto API errors"""
     pass
 
+class Ticker:
+    """Latest polled quote for one coin"""
+    __slots__ = ("price", "change_24h", "market_cap", "volume_24h", "updated_at")
+
+    def __init__(self, quote: Dict, updated_at: float):
+        self.price = quote["price"]
+        self.change_24h = quote["change_24h"]
+        self.market_cap = quote["market_cap"]
+        self.volume_24h = quote["volume_24h"]
+        self.updated_at = updated_at
+
+    def as_quote(self) -> Dict:
+        return {
+            "price": self.price,
+            "market_cap": self.market_cap,
+            "volume_24h": self.volume_24h,
+            "change_24h": self.change_24h
+        }
+
+class TickerTable:
+    """In-memory table of polled quotes; rows older than max_age are ignored"""
+
+    def __init__(self, max_age: float):
+        self.max_age = max_age
+        self._rows: Dict[str, Ticker] = {}
+
+    def update(self, quotes: Dict[str, Dict]):
+        now = time.monotonic()
+        for coin_id, quote in quotes.items():
+            self._rows[coin_id] = Ticker(quote, now)
+
+    def get(self, coin_id: str) -> Optional[Dict]:
+        row = self._rows.get(coin_id)
+        if row is None or time.monotonic() - row.updated_at > self.max_age:
+            return None
+        return row.as_quote()
+
+    def __len__(self):
+        return len(self._rows)
+
 class CryptoAPI:
     def __init__(self):
         self.base_url = "https://api.coingecko.com/api/v3"
-        self.session = requests.Session()
-        
-    async def get_price(self, symbol: str) -> Dict:
-        """Get current price for a cryptocurrency"""
-        # Map common symbols to CoinGecko IDs
-        symbol_map = {
-            "btc": "bitcoin",
-            "eth": "ethereum",
-            "sol": "solana",
-            "doge": "dogecoin",
-            "ada": "cardano",
-            "dot": "polkadot",
-            "ltc": "litecoin"
-        }
-        
-        if symbol.lower() not in symbol_map:
+        self.symbol_map = dict(SYMBOL_MAP)
+        # CoinGecko ids outside symbol_map that we poll and answer for (DEFAULT_CRYPTO, subscribers' coins);
+        # anything else is refused locally rather than spending the upstream quota on it
+        self.tracked_ids: Set[str] = set()
+        # Batched lookups do their own coalescing, so this is only used through get()/set()
+        self.quota = QuotaGovernor.from_env("CRYPTO", per_minute=QUOTA_PER_MINUTE)
+        self.quotes = ResponseCache("crypto", ttl=QUOTE_TTL, max_entries=256, store=get_store(), governor=self.quota)
+        # Filled by poll_prices() when the background poller is enabled; a few
+        # missed polls are tolerated before falling back to on-demand requests
+        self.tickers = TickerTable(max_age=POLL_INTERVAL * 3)
+        # coin id -> future resolved by the next batched /simple/price call
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+
+    def _coin_id(self, symbol: str) -> str:
+        """CoinGecko id for a symbol in symbol_map or a tracked coin id"""
+        symbol = symbol.lower()
+        if symbol in self.symbol_map:
+            return self.symbol_map[symbol]
+        if symbol not in self.tracked_ids:
             raise CryptoAPIError(f"Unsupported cryptocurrency symbol: {symbol}")
-            
-        id = symbol_map[symbol.lower()]
+        return symbol
+
+    def track(self, symbols: Iterable[str]) -> Set[str]:
+        """Accept these symbols or CoinGecko ids from now on; returns their coin ids"""
+        coin_ids = set()
+        for symbol in symbols:
+            symbol = (symbol or "").lower()
+            if symbol in self.symbol_map:
+                coin_ids.add(self.symbol_map[symbol])
+            elif COIN_ID_PATTERN.match(symbol):
+                self.tracked_ids.add(symbol)
+                coin_ids.add(symbol)
+        return coin_ids
+
+    @staticmethod
+    def _parse_quote(entry: Dict) -> Dict:
+        return {
+            "price": entry["usd"],
+            "market_cap": entry["usd_market_cap"],
+            "volume_24h": entry["usd_24h_vol"],
+            "change_24h": entry["usd_24h_change"]
+        }
+
+    async def _fetch_quotes(self, coin_ids: Iterable[str]) -> Dict[str, Dict]:
+        """Fetch quotes for several coins with a single /simple/price request"""
         url = f"{self.base_url}/simple/price"
         params = {
-            "ids": id,
+            "ids": ",".join(sorted(coin_ids)),
             "vs_currencies": "usd",
             "include_market_cap": "true",
             "include_24hr_vol": "true",
             "include_24hr_change": "true"
         }
-        
+
         try:
-            response = await asyncio.to_thread(self.session.get, url, params=params, timeout=10)
-            response.raise_for_status()
-            data = response.json()
-            
-            if not data:
-                raise CryptoAPIError("No data returned from API")
-                
-            return {
-                "price": data[id]["usd"],
-                "market_cap": data[id]["usd_market_cap"],
-                "volume_24h": data[id]["usd_24h_vol"],
-                "change_24h": data[id]["usd_24h_change"]
-            }
-            
-        except requests.RequestException as e:
-            raise CryptoAPIError(f"Request failed: {str(e)}")
-            
+            data = await get_json(url, params=params, quota=self.quota)
+        except HTTP_ERRORS as e:
+            raise CryptoAPIError(f"Request failed: {describe_error(e)}")
+
+        if not data:
+            raise CryptoAPIError("No data returned from API")
+
+        quotes = {}
+        for coin_id, entry in data.items():
+            try:
+                quotes[coin_id] = self._parse_quote(entry)
+            except KeyError:
+                continue  # Incomplete entry, treat as missing
+            self.quotes.set(coin_id, quotes[coin_id])
+        return quotes
+
+    async def _flush_pending(self):
+        """Wait out the batch window, then resolve every pending lookup with one request"""
+        await asyncio.sleep(BATCH_WINDOW)
+        pending, self._pending = self._pending, {}
+        self._flush_task = None
+
+        try:
+            quotes = await self._fetch_quotes(pending.keys())
+        except Exception as e:
+            for coin_id, future in pending.items():
+                if future.done():
+                    continue
+                # CoinGecko is off limits for now: an old quote beats no quote
+                stale = self.quotes.get_stale(coin_id) if isinstance(e, QuotaExceeded) else None
+                if stale is not None:
+                    future.set_result(stale)
+                else:
+                    future.set_exception(e)
+            return
+
+        for coin_id, future in pending.items():
+            if future.done():
+                continue
+            if coin_id in quotes:
+                future.set_result(quotes[coin_id])
+            else:
+                future.set_exception(CryptoAPIError(f"No data returned for {coin_id}"))
+
+    def _enqueue(self, coin_id: str) -> asyncio.Future:
+        """Join the next batch for coin_id (sharing the future if it's already queued)"""
+        future = self._pending.get(coin_id)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            self._pending[coin_id] = future
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_pending())
+        return future
+
+    async def get_prices(self, symbols: Iterable[str]) -> Dict[str, Dict]:
+        """
+        Get current prices for several cryptocurrencies.
+        Cached quotes are returned directly; everything else is coalesced with other
+        pending lookups into a single upstream request.
+        Returns a dict of lower-cased symbol -> quote.
+        """
+        coin_ids = {symbol.lower(): self._coin_id(symbol) for symbol in symbols}
+
+        results = {}
+        waiting = {}
+        for symbol, coin_id in coin_ids.items():
+            quote = self.tickers.get(coin_id) or self.quotes.get(coin_id)
+            if quote is None and self.quota.conserving():
+                quote = self.quotes.get_stale(coin_id)
+            if quote is not None:
+                results[symbol] = quote
+            else:
+                waiting[symbol] = self._enqueue(coin_id)
+
+        if waiting:
+            # shield() so one caller being cancelled doesn't cancel the shared future
+            quotes = await asyncio.gather(*(asyncio.shield(f) for f in waiting.values()))
+            results.update(zip(waiting.keys(), quotes))
+        return results
+
+    async def get_price(self, symbol: str) -> Dict:
+        """Get current price for a cryptocurrency"""
+        return (await self.get_prices([symbol]))[symbol.lower()]
+
+    async def poll_prices(self, extra_symbols: Iterable[str] = ()) -> int:
+        """
+        Refresh the ticker table for every coin in symbol_map plus extra_symbols
+        (symbols or CoinGecko ids, e.g. DEFAULT_CRYPTO and users' preferred coins)
+        with one upstream request. Returns the number of coins updated.
+        """
+        coin_ids = set(self.symbol_map.values()) | self.track(extra_symbols)
+        quotes = await self._fetch_quotes(coin_ids)
+        self.tickers.update(quotes)
+        return len(quotes)
+
     async def get_top_cryptos(self, limit: int = 10) -> List[Dict]:
         """Get top cryptocurrencies by market cap"""
         url = f"{self.base_url}/coins/markets"
@@ -71,9 +239,7 @@ class CryptoAPI:
         }
         
         try:
-            response = await asyncio.to_thread(self.session.get, url, params=params, timeout=10)
-            response.raise_for_status()
-            data = response.json()
+            data = await get_json(url, params=params, quota=self.quota)
             
             if not isinstance(data, list):
                 raise CryptoAPIError("Invalid data format from API")
@@ -87,5 +253,5 @@ class CryptoAPI:
                 "change_24h": item["price_change_percentage_24h"]
             } for item in data]
             
-        except requests.RequestException as e:
-            raise CryptoAPIError(f"Request failed: {str(e)}")
+        except HTTP_ERRORS as e:
+            raise CryptoAPIError(f"Request failed: {describe_error(e)}")
@@ -1,13 +1,18 @@
-import requests
-from typing import List, Dict, Optional, Tuple
+import aiohttp
+from typing import Awaitable, Callable, List, Dict, Optional, Tuple
+from collections import OrderedDict
 from dotenv import load_dotenv
 import os
-from datetime import datetime, timedelta
 from functools import lru_cache
 import asyncio
-from discord import Embed
+import time
 import json
 import logging
+from api.client import get_json, describe_error, HTTP_ERRORS
+from api.cache import ResponseCache
+from api.cache_store import get_store
+from api.quota import QuotaExceeded, QuotaGovernor
+from api.articles import Article, ArticlePage
 
 load_dotenv()
 
@@ -16,6 +21,14 @@ logger = logging.getLogger(__name__)
 
 NEWS_API_KEY = os.getenv("NEWS_API_KEY")
 CACHE_TIMEOUT = 300  # 5 minutes in seconds
+CACHE_STALE_TIMEOUT = 600  # serve expired responses this much longer while refreshing
+CACHE_ERROR_TIMEOUT = 30  # remember failed queries this long
+CACHE_MAX_ENTRIES = 512
+CACHE_MAX_BYTES = 8 * 1024 * 1024
+QUOTA_PER_DAY = 100  # NewsAPI developer plan; override with NEWS_QUOTA_PER_DAY
+PAGE_SIZE = int(os.getenv("NEWS_PAGE_SIZE", 20))  # articles per NewsAPI request (max 100)
+MAX_RESULTS = int(os.getenv("NEWS_MAX_RESULTS", 100))  # developer plan refuses pages past the first 100 results
+FEED_BUFFER_PAGES = int(os.getenv("NEWS_FEED_BUFFER_PAGES", 3))  # pages each !news view keeps in memory
 
 if not NEWS_API_KEY:
     raise ValueError("NEWS_API_KEY environment variable is not set")
@@ -31,27 +44,35 @@ class NewsAPI:
     def __init__(self, api_key: str = NEWS_API_KEY):
         self.api_key = api_key
         self.base_url = "https://newsapi.org/v2"
-        self.session = requests.Session()
-        self.session.headers.update({"X-Api-Key": self.api_key})
-        self._last_rate_limit_error = None
-        self._cache = {}
+        self.headers = {"X-Api-Key": self.api_key}
+        self.quota = QuotaGovernor.from_env("NEWS", per_day=QUOTA_PER_DAY)
+        self._cache = ResponseCache(
+            "news",
+            ttl=CACHE_TIMEOUT,
+            max_entries=CACHE_MAX_ENTRIES,
+            max_bytes=CACHE_MAX_BYTES,
+            stale_ttl=CACHE_STALE_TIMEOUT,
+            error_ttl=CACHE_ERROR_TIMEOUT,
+            store=get_store(),
+            negative_errors=(NewsAPIError,),
+            governor=self.quota,
+            # Parsed into Article objects once per cached response; embeds are memoized on those
+            decode=ArticlePage.from_response,
+        )
 
-    async def _get_cached(self, url: str, params: Dict) -> Dict:
+    async def _get_cached(self, url: str, params: Dict) -> ArticlePage:
         """Internal method to handle caching and rate limiting"""
         # Create a cache key from the URL and sorted params
         cache_key = f"{url}:{json.dumps(params, sort_keys=True)}"
-        
-        # Check if we have a cached response
-        if cache_key in self._cache:
-            cached_data, timestamp = self._cache[cache_key]
-            if datetime.now() - timestamp < timedelta(seconds=CACHE_TIMEOUT):
-                return cached_data
-        
+
+        # Identical concurrent misses share one request; expired entries are served while refreshing
+        return await self._cache.get_or_fetch(cache_key, lambda: self._fetch(url, params))
+
+    async def _fetch(self, url: str, params: Dict) -> Dict:
+        """Request url from NewsAPI"""
         try:
             logger.info(f"Making request to {url} with params: {params}")
-            response = await asyncio.to_thread(self.session.get, url, params=params, timeout=10)
-            response.raise_for_status()
-            data = response.json()
+            data = await get_json(url, params=params, headers=self.headers, quota=self.quota)
             
             logger.info(f"API Response status: {data.get('status')}")
             logger.info(f"Total results: {data.get('totalResults')}")
@@ -59,118 +80,236 @@ class NewsAPI:
             if data["status"] != "ok":
                 raise NewsAPIError(f"API Error: {data.get('message', 'Unknown error')}")
             
-            # Cache the response
-            self._cache[cache_key] = (data, datetime.now())
             return data
             
-        except requests.RequestException as e:
-            if hasattr(e.response, 'headers') and 'Retry-After' in e.response.headers:
-                retry_after = int(e.response.headers['Retry-After'])
-                self._last_rate_limit_error = datetime.now() + timedelta(seconds=retry_after)
+        except aiohttp.ClientResponseError as e:
+            if e.status == 429:
+                # get_json already opened self.quota's circuit until Retry-After
+                retry_after = max(1, round(self.quota.open_until - time.monotonic()))
                 raise NewsAPIError(f"Rate limited. Please try again later.", retry_after)
-            raise NewsAPIError(f"Request failed: {str(e)}")
+            raise NewsAPIError(f"Request failed: {describe_error(e)}")
+        except HTTP_ERRORS as e:
+            raise NewsAPIError(f"Request failed: {describe_error(e)}")
 
-    async def get_top_headlines(self, country: str = "us", category: str = "general", keyword: Optional[str] = None) -> Tuple[List[Dict], Optional[int]]:
-        """
-        Get top headlines from NewsAPI with optional keyword search
-        Returns a tuple of (articles, total_results)
-        """
+    def coalescing_stats(self) -> Dict:
+        """Upstream calls made vs. requests that piggy-backed on an in-flight call"""
+        return self._cache.flight.stats()
+
+    def cache_stats(self) -> Dict:
+        return self._cache.stats()
+
+    async def _get_page(self, params: Dict) -> ArticlePage:
         url = f"{self.base_url}/top-headlines"
-        params = {
-            "country": country,
-            "category": category,
-            "language": "en",
-            "q": keyword if keyword else None
-        }
-        
         try:
-            data = await self._get_cached(url, params)
-            articles = data["articles"]
-            total_results = data["totalResults"]
-            
-            logger.info(f"Found {len(articles)} articles")
-            
-            # Format articles into Discord embeds
-            embeds = []
-            for article in articles[:5]:  # Limit to top 5
-                embed = Embed(
-                    title=article["title"],
-                    url=article["url"],
-                    description=article.get("description", "No description available"),
-                    timestamp=datetime.fromisoformat(article["publishedAt"].replace("Z", "+00:00"))
-                )
-                if article.get("urlToImage"):
-                    embed.set_image(url=article["urlToImage"])
-                
-                embed.set_author(name=article["source"]["name"])
-                embeds.append(embed)
-                
-            return embeds, total_results
-            
+            return await self._get_cached(url, params)
         except NewsAPIError as e:
             if e.retry_after:
                 raise NewsAPIError(f"Rate limited. Please try again in {e.retry_after} seconds.")
             raise
 
-    async def get_article_by_source(self, source: str, keyword: Optional[str] = None) -> Tuple[List[Dict], Optional[int]]:
+    async def get_top_headlines(self, country: str = "us", category: str = "general", keyword: Optional[str] = None,
+                                page: int = 1, page_size: int = PAGE_SIZE) -> Tuple[List[Article], int]:
         """
-        Get articles from a specific source with optional keyword search
-        Returns a tuple of (articles, total_results)
+        Get one page of top headlines from NewsAPI with optional keyword search
+        Returns a tuple of (articles, total_results); call article.embed() to render one
         """
-        url = f"{self.base_url}/top-headlines"
-        params = {
+        result = await self._get_page({
+            "country": country,
+            "category": category,
+            "language": "en",
+            "q": keyword if keyword else None,
+            "page": page,
+            "pageSize": page_size,
+        })
+        logger.info(f"Found {len(result.articles)} articles (page {page})")
+        return result.articles, result.total_results
+
+    async def get_article_by_source(self, source: str, keyword: Optional[str] = None,
+                                    page: int = 1, page_size: int = PAGE_SIZE) -> Tuple[List[Article], int]:
+        """
+        Get one page of articles from a specific source with optional keyword search
+        Returns a tuple of (articles, total_results); call article.embed() to render one
+        """
+        result = await self._get_page({
             "sources": source,
             "language": "en",
-            "q": keyword if keyword else None
-        }
-        
-        try:
-            data = await self._get_cached(url, params)
-            articles = data["articles"]
-            total_results = data["totalResults"]
-            
-            logger.info(f"Found {len(articles)} articles from source {source}")
-            
-            # Format articles into Discord embeds
-            embeds = []
-            for article in articles[:5]:  # Limit to top 5
-                embed = Embed(
-                    title=article["title"],
-                    url=article["url"],
-                    description=article.get("description", "No description available"),
-                    timestamp=datetime.fromisoformat(article["publishedAt"].replace("Z", "+00:00"))
-                )
-                if article.get("urlToImage"):
-                    embed.set_image(url=article["urlToImage"])
-                
-                embed.set_author(name=article["source"]["name"])
-                embeds.append(embed)
-                
-            return embeds, total_results
-            
-        except NewsAPIError as e:
-            if e.retry_after:
-                raise NewsAPIError(f"Rate limited. Please try again in {e.retry_after} seconds.")
-            raise
+            "q": keyword if keyword else None,
+            "page": page,
+            "pageSize": page_size,
+        })
+        logger.info(f"Found {len(result.articles)} articles from source {source} (page {page})")
+        return result.articles, result.total_results
+
+    def headlines_feed(self, country: str = "us", category: str = "general", keyword: Optional[str] = None) -> "NewsFeed":
+        return NewsFeed(
+            lambda page, page_size: self.get_top_headlines(country, category, keyword, page=page, page_size=page_size),
+            quota=self.quota,
+        )
+
+    def source_feed(self, source: str, keyword: Optional[str] = None) -> "NewsFeed":
+        return NewsFeed(
+            lambda page, page_size: self.get_article_by_source(source, keyword, page=page, page_size=page_size),
+            quota=self.quota,
+        )
 
     async def get_article_summary(self, article_url: str) -> str:
         """Get a summary of an article using natural language processing"""
         # TODO: Implement article summarization using NLP
         return "Article summary feature coming soon!"
-        params = {
-            "sources": source,
-            "language": "en"
-        }
-        
-        try:
-            response = await asyncio.to_thread(self.session.get, url, params=params, timeout=10)
-            response.raise_for_status()
-            data = response.json()
-            
-            if data["status"] != "ok":
-                raise NewsAPIError(f"API Error: {data.get('message', 'Unknown error')}")
-                
-            return data["articles"][:5]
-            
-        except requests.RequestException as e:
-            raise NewsAPIError(f"Request failed: {str(e)}")
+
+
+PageFetcher = Callable[[int, int], Awaitable[Tuple[List[Article], int]]]
+
+
+class NewsFeed:
+    """
+    Browses one query's results a NewsAPI page at a time.
+
+    The page after the one being read is prefetched in the background (unless
+    the quota governor is conserving), so stepping forward is normally answered
+    from memory. At most buffer_pages pages are held; the ones furthest from the
+    reader are dropped first and refetched, usually from the response cache, if
+    the reader goes back to them.
+    """
+
+    def __init__(self, fetch_page: PageFetcher, quota: Optional[QuotaGovernor] = None, page_size: int = PAGE_SIZE,
+                 buffer_pages: int = FEED_BUFFER_PAGES, max_results: int = MAX_RESULTS):
+        self._fetch_page = fetch_page
+        self.quota = quota
+        self.page_size = page_size
+        self.buffer_pages = max(2, buffer_pages)
+        self.max_results = max_results
+        self.total_results = 0
+        self.page = 1
+        self.offset = 0
+        self._pages: "OrderedDict[int, List[Article]]" = OrderedDict()
+        self._prefetching: Dict[int, asyncio.Task] = {}
+        # Page loads answered from the buffer vs. ones that had to wait on NewsAPI/the cache
+        self.buffer_hits = 0
+        self.buffer_misses = 0
+
+    @property
+    def last_page(self) -> int:
+        available = min(self.total_results, self.max_results)
+        return max(1, -(-available // self.page_size))
+
+    async def _fetch(self, page: int) -> List[Article]:
+        articles, total_results = await self._fetch_page(page, self.page_size)
+        self.total_results = total_results
+        return articles
+
+    async def _load(self, page: int) -> List[Article]:
+        articles = self._pages.get(page)
+        if articles is not None:
+            self.buffer_hits += 1
+            return articles
+        self.buffer_misses += 1
+        task = self._prefetching.pop(page, None)
+        if task is not None:
+            try:
+                # shield: if our caller is cancelled, the prefetch carries on for whoever asks next
+                articles = await asyncio.shield(task)
+            except (NewsAPIError, QuotaExceeded):
+                task = None
+            except asyncio.CancelledError:
+                if not task.cancelled():
+                    # We're the one being cancelled: keep the prefetch and stop
+                    self._prefetching.setdefault(page, task)
+                    raise
+                task = None
+        if task is None:
+            articles = await self._fetch(page)
+        self._pages[page] = articles
+        return articles
+
+    def _evict(self):
+        while len(self._pages) > self.buffer_pages:
+            furthest = max(self._pages, key=lambda p: abs(p - self.page))
+            del self._pages[furthest]
+
+    def _prefetch(self):
+        page = self.page + 1
+        if page > self.last_page or page in self._pages or page in self._prefetching:
+            return
+        if self.quota is not None and self.quota.conserving():
+            return  # don't spend scarce requests on a page nobody may ask for
+        task = asyncio.create_task(self._fetch(page))
+        self._prefetching[page] = task
+        task.add_done_callback(lambda t: self._prefetched(page, t))
+
+    def _prefetched(self, page: int, task: asyncio.Task):
+        if task.cancelled():
+            self._prefetching.pop(page, None)
+            return
+        if task.exception() is not None:
+            logger.info(f"Prefetching news page {page} failed: {task.exception()}")
+            self._prefetching.pop(page, None)
+            return
+        if self._prefetching.get(page) is task:
+            del self._prefetching[page]
+            self._pages[page] = task.result()
+            self._evict()
+
+    async def start(self) -> bool:
+        """Load the first page; False if the query found nothing"""
+        self._pages[1] = await self._fetch(1)
+        self._prefetch()
+        return bool(self._pages[1])
+
+    @property
+    def current(self) -> Article:
+        return self._pages[self.page][self.offset]
+
+    @property
+    def position(self) -> int:
+        """1-based index of the current article across all pages"""
+        return (self.page - 1) * self.page_size + self.offset + 1
+
+    @property
+    def total(self) -> int:
+        return max(self.position, min(self.total_results, self.max_results))
+
+    def has_previous(self) -> bool:
+        return self.page > 1 or self.offset > 0
+
+    def has_next(self) -> bool:
+        return self.offset + 1 < len(self._pages[self.page]) or self.page < self.last_page
+
+    async def next(self) -> bool:
+        """Step to the next article, loading the next page if needed; False at the end"""
+        if self.offset + 1 < len(self._pages[self.page]):
+            self.offset += 1
+            return True
+        page = self.page + 1
+        while page <= self.last_page:
+            articles = await self._load(page)
+            if articles:
+                self.page, self.offset = page, 0
+                self._evict()
+                self._prefetch()
+                return True
+            page += 1  # a page of nothing but removed articles
+        # NewsAPI's totalResults over-counted; stop here
+        self.total_results = self.position
+        return False
+
+    async def previous(self) -> bool:
+        if self.offset > 0:
+            self.offset -= 1
+            return True
+        page = self.page - 1
+        while page >= 1:
+            articles = await self._load(page)
+            if articles:
+                self.page, self.offset = page, len(articles) - 1
+                self._evict()
+                return True
+            page -= 1
+        return False
+
+    def close(self):
+        """Cancel background prefetches and drop buffered pages"""
+        for task in self._prefetching.values():
+            task.cancel()
+        self._prefetching.clear()
+        self._pages.clear()
@@ -0,0 +1,217 @@
+"""
+Per-provider quota governor and circuit breaker for upstream APIs.
+
+Every request to a provider goes through its governor (see get_json's quota
+argument), which:
+
+- refuses requests once the provider's per-minute or per-day budget is spent,
+- honours Retry-After on 429 responses by opening the circuit until then,
+- opens the circuit after FAILURE_THRESHOLD consecutive 5xx/transport failures,
+  then lets a single probe through (half-open) once the cooldown passes; a
+  failed probe reopens it for twice as long.
+
+Refusals raise QuotaExceeded without touching the network. While a governor
+is conserving (circuit not closed, or less than QUOTA_RESERVE of a budget
+left), ResponseCache serves whatever it has cached instead of refreshing.
+"""
+
+import logging
+import math
+import os
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, Mapping, Optional
+
+from ratelimit import SlidingWindowPolicy
+
+logger = logging.getLogger(__name__)
+
+QUOTA_RESERVE = float(os.getenv("QUOTA_RESERVE", 0.2))  # conserve once less than this share of a budget is left
+FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", 5))  # consecutive failures before opening
+OPEN_SECONDS = float(os.getenv("CIRCUIT_OPEN_SECONDS", 30))  # first cooldown; doubles after each failed probe
+MAX_OPEN_SECONDS = 600
+DEFAULT_RETRY_AFTER = 60  # for 429s without a usable Retry-After header
+PROBE_TIMEOUT = 30  # a half-open probe that never reported back is assumed lost after this long
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class QuotaExceeded(Exception):
+    """Raised instead of making a request the governor expects to fail"""
+
+    def __init__(self, provider: str, reason: str, retry_after: float):
+        self.provider = provider
+        self.reason = reason
+        self.retry_after = retry_after
+        super().__init__(f"{provider} is {reason}, try again in {_format_wait(retry_after)}")
+
+
+def _format_wait(seconds: float) -> str:
+    seconds = max(1, math.ceil(seconds))
+    if seconds < 120:
+        return f"{seconds}s"
+    if seconds < 7200:
+        return f"{seconds // 60}m"
+    return f"{seconds // 3600}h"
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-After is either delta-seconds or an HTTP date"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class QuotaGovernor:
+    def __init__(self, name: str, per_minute: int = 0, per_day: int = 0):
+        self.name = name
+        self.per_minute = per_minute
+        self.per_day = per_day
+        self._minute = SlidingWindowPolicy(per_minute, 60) if per_minute else None
+        self._minute_state = self._minute.new_state(time.monotonic()) if self._minute else None
+        # Daily budgets reset at UTC midnight
+        self._day = int(time.time() // 86400)
+        self._day_count = 0
+
+        self.state = CLOSED
+        self.failures = 0
+        self.open_until = 0.0
+        self._cooldown = OPEN_SECONDS
+        self._probe_started_at: Optional[float] = None
+        # Provider-reported remaining calls, when it sends X-RateLimit-Remaining
+        self.upstream_remaining: Optional[int] = None
+
+        self.requests = 0
+        self.rejected = 0
+        self.opened = 0
+
+    @classmethod
+    def from_env(cls, prefix: str, per_minute: int = 0, per_day: int = 0) -> "QuotaGovernor":
+        """Budgets overridable with <PREFIX>_QUOTA_PER_MINUTE / <PREFIX>_QUOTA_PER_DAY (0 = unlimited)"""
+        return cls(
+            prefix.lower(),
+            per_minute=int(os.getenv(f"{prefix}_QUOTA_PER_MINUTE", per_minute)),
+            per_day=int(os.getenv(f"{prefix}_QUOTA_PER_DAY", per_day)),
+        )
+
+    # --- budgets ---
+
+    def _roll_day(self):
+        day = int(time.time() // 86400)
+        if day != self._day:
+            self._day = day
+            self._day_count = 0
+
+    def remaining(self) -> Dict[str, Optional[float]]:
+        """Calls left in each budget (None where unlimited)"""
+        self._roll_day()
+        minute = None
+        if self._minute:
+            minute = max(0.0, self.per_minute - self._minute.used(self._minute_state, time.monotonic()))
+        day = max(0, self.per_day - self._day_count) if self.per_day else None
+        return {"minute": minute, "day": day, "upstream": self.upstream_remaining}
+
+    def conserving(self) -> bool:
+        """True when callers should prefer cached data over spending a request"""
+        if self.state != CLOSED:
+            return True
+        left = self.remaining()
+        if left["minute"] is not None and left["minute"] < self.per_minute * QUOTA_RESERVE:
+            return True
+        if left["day"] is not None and left["day"] < self.per_day * QUOTA_RESERVE:
+            return True
+        return self.upstream_remaining is not None and self.upstream_remaining <= 1
+
+    # --- request lifecycle ---
+
+    def _reject(self, reason: str, retry_after: float):
+        self.rejected += 1
+        raise QuotaExceeded(self.name, reason, retry_after)
+
+    def acquire(self):
+        """Reserve one request against the budgets, or raise QuotaExceeded"""
+        now = time.monotonic()
+        if self.state == OPEN:
+            if now < self.open_until:
+                self._reject("temporarily unavailable", self.open_until - now)
+            self.state = HALF_OPEN
+            self._probe_started_at = None
+        if self.state == HALF_OPEN:
+            if self._probe_started_at is not None and now - self._probe_started_at < PROBE_TIMEOUT:
+                self._reject("recovering", PROBE_TIMEOUT - (now - self._probe_started_at))
+
+        if self._minute:
+            retry_after = self._minute.retry_after(self._minute_state, now)
+            if retry_after > 0:
+                self._reject("over its per-minute quota", retry_after)
+        self._roll_day()
+        if self.per_day and self._day_count >= self.per_day:
+            self._reject("out of daily quota", (self._day + 1) * 86400 - time.time())
+
+        # Only claim the probe once the request is actually going out
+        if self.state == HALF_OPEN:
+            self._probe_started_at = now
+        if self._minute:
+            self._minute.consume(self._minute_state, now)
+        self._day_count += 1
+        self.requests += 1
+
+    def record(self, status: int, headers: Optional[Mapping[str, str]] = None):
+        """Feed back the HTTP status (and headers) of a request made after acquire()"""
+        headers = headers or {}
+        remaining = headers.get("X-RateLimit-Remaining")
+        if remaining is not None and remaining.isdigit():
+            self.upstream_remaining = int(remaining)
+
+        if status == 429:
+            retry_after = parse_retry_after(headers.get("Retry-After"))
+            self._open(retry_after if retry_after is not None else DEFAULT_RETRY_AFTER, "rate limited (429)")
+        elif status >= 500:
+            self.record_failure(f"HTTP {status}")
+        else:
+            # Includes 4xx like "city not found": the provider is up, the query was just bad
+            self._close()
+
+    def record_failure(self, reason: str = "request failed"):
+        """A transport error or 5xx: count towards opening the circuit"""
+        self.failures += 1
+        if self.state == HALF_OPEN:
+            self._cooldown = min(self._cooldown * 2, MAX_OPEN_SECONDS)
+            self._open(self._cooldown, f"probe failed: {reason}")
+        elif self.failures >= FAILURE_THRESHOLD:
+            self._open(self._cooldown, f"{self.failures} consecutive failures, last: {reason}")
+
+    def _open(self, seconds: float, reason: str):
+        if self.state != OPEN:
+            self.opened += 1
+        self.state = OPEN
+        self.open_until = max(self.open_until, time.monotonic() + seconds)
+        self._probe_started_at = None
+        logger.warning(f"[{self.name}] Circuit open for {seconds:.0f}s: {reason}")
+
+    def _close(self):
+        if self.state != CLOSED:
+            logger.info(f"[{self.name}] Circuit closed, upstream recovered")
+        self.state = CLOSED
+        self.failures = 0
+        self._cooldown = OPEN_SECONDS
+        self._probe_started_at = None
+
+    def stats(self) -> Dict:
+        left = self.remaining()
+        return {
+            "state": self.state,
+            "requests": self.requests,
+            "rejected": self.rejected,
+            "opened": self.opened,
+            "minute_left": left["minute"],
+            "day_left": left["day"],
+            "conserving": self.conserving(),
+        }
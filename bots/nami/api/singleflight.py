@@ -0,0 +1,45 @@
+"""
+Single-flight request coalescing: concurrent calls for the same key share one in-flight result
+"""
+
+import asyncio
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict
+
+MAX_TRACKED_KEYS = 100  # per-key coalescing counts kept for !stats; keys come from user input
+
+
+class SingleFlight:
+    def __init__(self, max_tracked_keys: int = MAX_TRACKED_KEYS):
+        self._inflight: Dict[str, asyncio.Task] = {}
+        # key -> number of callers that joined an existing in-flight call, least recently coalesced first
+        self.coalesced: "OrderedDict[str, int]" = OrderedDict()
+        self.max_tracked_keys = max_tracked_keys
+        self.coalesced_total = 0
+        self.executed = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Run fn() for key, or wait for the call already in flight for key"""
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced_total += 1
+            self.coalesced[key] = self.coalesced.pop(key, 0) + 1
+            if len(self.coalesced) > self.max_tracked_keys:
+                self.coalesced.popitem(last=False)
+        else:
+            # Run as its own task so the first caller being cancelled doesn't fail the others
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            self.executed += 1
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+    def in_flight(self) -> int:
+        return len(self._inflight)
+
+    def stats(self) -> Dict:
+        return {
+            "executed": self.executed,
+            "coalesced": self.coalesced_total,
+            "per_key": dict(self.coalesced)
+        }
@@ -1,13 +1,20 @@
-import requests
-import asyncio
 from typing import Dict, Optional, List
 from dotenv import load_dotenv
 import os
 from datetime import datetime
+from api.client import get_json, describe_error, HTTP_ERRORS
+from api.cache import ResponseCache
+from api.cache_store import get_store
+from api.quota import QuotaGovernor
 
 load_dotenv()
 
 WEATHER_API_KEY = os.getenv("WEATHER_API_KEY")
+CACHE_TIMEOUT = 600  # OpenWeatherMap updates roughly every 10 minutes
+CACHE_STALE_TIMEOUT = 900  # serve expired conditions this much longer while refreshing
+CACHE_ERROR_TIMEOUT = 60  # remember unknown cities / failures this long
+CACHE_MAX_ENTRIES = 1024
+QUOTA_PER_MINUTE = 60  # OpenWeatherMap free plan; override with WEATHER_QUOTA_PER_MINUTE
 
 if not WEATHER_API_KEY:
     raise ValueError("WEATHER_API_KEY environment variable is not set")
@@ -20,18 +27,38 @@ class WeatherAPI:
     def __init__(self, api_key: str = WEATHER_API_KEY):
         self.api_key = api_key
         self.base_url = "https://api.openweathermap.org/data/2.5"
-        self.session = requests.Session()
-        self.session.params = {"appid": self.api_key, "units": "imperial"}
+        self.default_params = {"appid": self.api_key, "units": "imperial"}
+        self.quota = QuotaGovernor.from_env("WEATHER", per_minute=QUOTA_PER_MINUTE)
+        self._cache = ResponseCache(
+            "weather",
+            ttl=CACHE_TIMEOUT,
+            max_entries=CACHE_MAX_ENTRIES,
+            stale_ttl=CACHE_STALE_TIMEOUT,
+            error_ttl=CACHE_ERROR_TIMEOUT,
+            store=get_store(),
+            negative_errors=(WeatherAPIError,),
+            governor=self.quota,
+        )
+
+    def cache_stats(self) -> Dict:
+        return self._cache.stats()
 
     async def get_current_weather(self, city: str) -> Dict:
         """Get current weather for a city"""
+        key = f"weather:{city.strip().lower()}"
+        return await self._cache.get_or_fetch(key, lambda: self._fetch_current_weather(city))
+
+    async def get_forecast(self, city: str) -> List[Dict]:
+        """Get weather forecast for a city"""
+        key = f"forecast:{city.strip().lower()}"
+        return await self._cache.get_or_fetch(key, lambda: self._fetch_forecast(city))
+
+    async def _fetch_current_weather(self, city: str) -> Dict:
         url = f"{self.base_url}/weather"
-        params = {"q": city}
+        params = {**self.default_params, "q": city}
         
         try:
-            response = await asyncio.to_thread(self.session.get, url, params=params, timeout=10)
-            response.raise_for_status()
-            data = response.json()
+            data = await get_json(url, params=params, quota=self.quota)
             
             if data.get("cod") != 200:
                 raise WeatherAPIError(f"API Error: {data.get('message', 'Unknown error')}")
@@ -45,18 +72,15 @@ class WeatherAPI:
                 "icon": data["weather"][0]["icon"]
             }
             
-        except requests.RequestException as e:
-            raise WeatherAPIError(f"Request failed: {str(e)}")
+        except HTTP_ERRORS as e:
+            raise WeatherAPIError(f"Request failed: {describe_error(e)}")
             
-    async def get_forecast(self, city: str) -> List[Dict]:
-        """Get weather forecast for a city"""
+    async def _fetch_forecast(self, city: str) -> List[Dict]:
         url = f"{self.base_url}/forecast"
-        params = {"q": city}
+        params = {**self.default_params, "q": city}
         
         try:
-            response = await asyncio.to_thread(self.session.get, url, params=params, timeout=10)
-            response.raise_for_status()
-            data = response.json()
+            data = await get_json(url, params=params, quota=self.quota)
             
             if data.get("cod") != "200":
                 raise WeatherAPIError(f"API Error: {data.get('message', 'Unknown error')}")
@@ -68,5 +92,5 @@ class WeatherAPI:
                 "icon": item["weather"][0]["icon"]
             } for item in data["list"][:5]]  # Return next 5 hours
             
-        except requests.RequestException as e:
-            raise WeatherAPIError(f"Request failed: {str(e)}")
+        except HTTP_ERRORS as e:
+            raise WeatherAPIError(f"Request failed: {describe_error(e)}")
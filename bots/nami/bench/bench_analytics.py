@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Benchmark: Analytics event throughput.
+
+"before" updates per-user counters and rewrites the whole analytics.json
+with indent=4 after every event (the original behaviour); "after" is the
+current Analytics, which updates rollups in memory and appends to the event
+log in batches from a background task.
+
+Usage: python bench/bench_analytics.py [--events 5000] [--users 2000]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+COMMANDS = ["news", "weather", "crypto", "dailybrief"]
+
+
+class LegacyAnalytics:
+    """The original implementation's per-event cost"""
+
+    def __init__(self, path):
+        self.path = path
+        self.data = {'commands': {}, 'errors': {}, 'usage': {}, 'preferences': {}}
+
+    def log_command(self, command, user_id):
+        users = self.data['commands'].setdefault(command, {})
+        users[user_id] = users.get(user_id, 0) + 1
+        with open(self.path, 'w') as f:
+            json.dump(self.data, f, indent=4)
+
+    async def aclose(self):
+        pass
+
+
+async def run(label, a, events, users):
+    start = time.perf_counter()
+    for i in range(events):
+        a.log_command(random.choice(COMMANDS), random.randrange(users))
+    await a.aclose()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<8} {events} events in {elapsed:7.3f}s  ->  {events / elapsed:10.1f} events/s")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=5000)
+    parser.add_argument("--users", type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # analytics.log is opened relative to the working directory
+        os.chdir(tmp)
+        from analytics import Analytics
+
+        await run("before", LegacyAnalytics(os.path.join(tmp, "analytics.json")), args.events, args.users)
+        await run("after", Analytics(os.path.join(tmp, "after")), args.events, args.users)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Benchmark: concurrent !news / !weather / !crypto upstream throughput.
+
+Starts a local stub server that mimics NewsAPI, OpenWeatherMap and CoinGecko,
+then compares the old blocking requests-in-a-thread transport against the
+shared aiohttp client.
+
+Usage: python bench/bench_http.py [--requests 300] [--latency 0.05]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("NEWS_API_KEY", "bench")
+os.environ.setdefault("WEATHER_API_KEY", "bench")
+
+import requests
+from aiohttp import web
+
+from api import client
+from api.crypto import CryptoAPI
+from api.news import NewsAPI
+from api.weather import WeatherAPI
+
+NEWS_BODY = {
+    "status": "ok",
+    "totalResults": 1,
+    "articles": [{
+        "title": "Stub headline",
+        "url": "https://example.com/a",
+        "description": "Stub article",
+        "publishedAt": "2024-01-01T00:00:00Z",
+        "source": {"name": "Stub"},
+    }],
+}
+WEATHER_BODY = {
+    "cod": 200,
+    "name": "Stub City",
+    "main": {"temp": 70.0, "humidity": 40},
+    "weather": [{"description": "clear sky", "icon": "01d"}],
+    "wind": {"speed": 3.0},
+}
+CRYPTO_BODY = {
+    "bitcoin": {"usd": 1.0, "usd_market_cap": 1.0, "usd_24h_vol": 1.0, "usd_24h_change": 0.0},
+}
+
+
+def make_stub(latency: float) -> web.Application:
+    def handler(body):
+        async def handle(request):
+            await asyncio.sleep(latency)
+            return web.json_response(body)
+        return handle
+
+    app = web.Application()
+    app.router.add_get("/v2/top-headlines", handler(NEWS_BODY))
+    app.router.add_get("/data/2.5/weather", handler(WEATHER_BODY))
+    app.router.add_get("/api/v3/simple/price", handler(CRYPTO_BODY))
+    return app
+
+
+def legacy_calls(base: str):
+    """The pre-aiohttp transport: a blocking requests.Session per API, run via to_thread"""
+    session = requests.Session()
+    urls = [
+        (f"{base}/v2/top-headlines", {"country": "us", "category": "general"}),
+        (f"{base}/data/2.5/weather", {"q": "stub"}),
+        (f"{base}/api/v3/simple/price", {"ids": "bitcoin", "vs_currencies": "usd"}),
+    ]
+
+    def call(i):
+        url, params = urls[i % len(urls)]
+        return asyncio.to_thread(session.get, url, params=params, timeout=10)
+
+    return call
+
+
+def aiohttp_calls(base: str):
+    news = NewsAPI("bench")
+    news.base_url = f"{base}/v2"
+    weather = WeatherAPI("bench")
+    weather.base_url = f"{base}/data/2.5"
+    crypto = CryptoAPI()
+    crypto.base_url = f"{base}/api/v3"
+
+    def call(i):
+        kind = i % 3
+        if kind == 0:
+            # Unique keyword per call so the news cache never short-circuits the transport
+            return news.get_top_headlines(keyword=f"bench-{i}")
+        if kind == 1:
+            return weather.get_current_weather("stub")
+        return crypto.get_price("btc")
+
+    return call
+
+
+async def run(label: str, call, total: int):
+    start = time.perf_counter()
+    await asyncio.gather(*(call(i) for i in range(total)))
+    elapsed = time.perf_counter() - start
+    print(f"{label:<22} {total} requests in {elapsed:6.3f}s  ->  {total / elapsed:8.1f} req/s")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--latency", type=float, default=0.05, help="stub server latency in seconds")
+    args = parser.parse_args()
+
+    runner = web.AppRunner(make_stub(args.latency))
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    base = f"http://127.0.0.1:{port}"
+
+    try:
+        await run("requests + to_thread", legacy_calls(base), args.requests)
+        await run("shared aiohttp client", aiohttp_calls(base), args.requests)
+    finally:
+        await client.close_session()
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
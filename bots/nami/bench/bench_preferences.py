@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Benchmark: PreferencesDB get/set latency with a large user base.
+
+Compares the legacy preferences.json store against the SQLite store
+(cold = first read of a user, warm = served from the in-memory cache).
+
+Usage: python bench/bench_preferences.py [--users 100000] [--ops 200]
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db.preferences import JSONPreferencesDB, PreferencesDB
+
+
+def sample_prefs(i):
+    return {
+        "preferred_sources": random.choice(["all", "bbc-news", "cnn", "reuters"]),
+        "preferred_crypto": random.choice(["btc", "eth", "sol", "doge"]),
+        "preferred_location": random.choice(["los angeles", "new york", "london", "tokyo"]),
+        "brief_enabled": i % 2 == 0,
+    }
+
+
+def timed(label, fn, ops):
+    start = time.perf_counter()
+    for i in range(ops):
+        fn(i)
+    per_op = (time.perf_counter() - start) / ops
+    print(f"{label:<28} {per_op * 1e6:12.1f} us/op  ({ops} ops)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--ops", type=int, default=200)
+    args = parser.parse_args()
+
+    user_ids = list(range(10**17, 10**17 + args.users))
+    seed = {str(uid): sample_prefs(i) for i, uid in enumerate(user_ids)}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path = Path(tmp) / "preferences.json"
+        with open(json_path, "w") as f:
+            json.dump(seed, f, indent=2)
+
+        print(f"{args.users} users")
+        legacy = JSONPreferencesDB(json_path)
+        # The JSON store re-reads the whole file per call, so a handful of ops is plenty
+        legacy_ops = max(1, min(args.ops, 20))
+        timed("json get", lambda i: legacy.get_user_preferences(random.choice(user_ids)), legacy_ops)
+        timed("json set", lambda i: legacy.set_user_preferences(random.choice(user_ids), sample_prefs(i)), legacy_ops)
+
+        start = time.perf_counter()
+        sqlite_db = PreferencesDB(Path(tmp) / "preferences.sqlite3", legacy_json_path=json_path)
+        print(f"{'sqlite migration':<28} {time.perf_counter() - start:12.3f} s")
+
+        sample = random.sample(user_ids, args.ops)
+        timed("sqlite get (cold)", lambda i: sqlite_db.get_user_preferences(sample[i]), args.ops)
+        timed("sqlite get (warm)", lambda i: sqlite_db.get_user_preferences(sample[i]), args.ops)
+        timed("sqlite set", lambda i: sqlite_db.set_user_preferences(sample[i], sample_prefs(i)), args.ops)
+        sqlite_db.close()
+
+
+if __name__ == "__main__":
+    main()
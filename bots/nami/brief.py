@@ -0,0 +1,257 @@
+"""
+Daily brief pipeline: fetch news, weather and crypto concurrently, render
+whatever succeeded, and send it in as few Discord messages as possible
+"""
+
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import discord
+from discord import Embed
+
+from api.singleflight import SingleFlight
+from metrics import REGISTRY
+from scheduler import next_daily
+
+logger = logging.getLogger(__name__)
+
+SOURCE_TIMEOUT = float(os.getenv("BRIEF_SOURCE_TIMEOUT", 8))  # seconds each source gets before it's skipped
+MAX_NEWS_EMBEDS = 5
+SNAPSHOT_TTL = float(os.getenv("BRIEF_SNAPSHOT_TTL", 300))  # seconds a rendered brief is reused
+PARTIAL_SNAPSHOT_TTL = float(os.getenv("BRIEF_PARTIAL_SNAPSHOT_TTL", 30))  # same, for briefs where a source failed
+PREWARM_LEAD = float(os.getenv("BRIEF_PREWARM_LEAD", 120))  # rebuild snapshots this many seconds before each slot
+MAX_SNAPSHOTS = 1000  # distinct (sources, city, coin) combinations tracked
+SNAPSHOT_IDLE_DAYS = 7  # stop prewarming combinations nobody has asked for in this long
+PREWARM_CONCURRENCY = 8
+
+# Discord limits per message
+MAX_EMBEDS_PER_MESSAGE = 10
+MAX_EMBED_CHARS_PER_MESSAGE = 6000
+
+BRIEF_STAGE_LATENCY = REGISTRY.histogram(
+    "bot_brief_stage_duration_seconds", "Time spent in each daily brief stage", ("stage",)
+)
+
+
+class Brief:
+    """A rendered brief plus how long each build stage took"""
+
+    def __init__(self, embeds: List[Embed], errors: Dict[str, str], timings: Dict[str, float]):
+        self.embeds = embeds
+        self.errors = errors
+        self.timings = timings
+        self.built_at = time.monotonic()
+
+    def age(self) -> float:
+        return time.monotonic() - self.built_at
+
+    def timing_summary(self) -> str:
+        return ", ".join(f"{stage}={seconds * 1000:.0f}ms" for stage, seconds in self.timings.items())
+
+    def message_count(self) -> int:
+        """How many Discord messages send_brief() will use for this brief"""
+        return len(_batch_embeds(self.embeds))
+
+
+class BriefBuilder:
+    def __init__(self, news_api, weather_api, crypto_api):
+        self.news_api = news_api
+        self.weather_api = weather_api
+        self.crypto_api = crypto_api
+
+    async def _timed(self, stage: str, coro, timings: Dict[str, float]):
+        """Await coro with the per-source timeout, recording how long it took"""
+        start = time.perf_counter()
+        try:
+            return await asyncio.wait_for(coro, timeout=SOURCE_TIMEOUT)
+        finally:
+            elapsed = time.perf_counter() - start
+            timings[stage] = elapsed
+            BRIEF_STAGE_LATENCY.labels(stage=stage).observe(elapsed)
+
+    async def _fetch_news(self, sources: Optional[str]):
+        if sources and sources != "all":
+            articles, _ = await self.news_api.get_article_by_source(sources)
+        else:
+            articles, _ = await self.news_api.get_top_headlines()
+        return [article.embed() for article in articles[:MAX_NEWS_EMBEDS]]
+
+    async def build(self, sources: Optional[str], city: str, coin: str) -> Brief:
+        """Fetch all three sources at once; a failed or slow source becomes an error embed"""
+        timings: Dict[str, float] = {}
+        start = time.perf_counter()
+        news, weather, crypto = await asyncio.gather(
+            self._timed("news", self._fetch_news(sources), timings),
+            self._timed("weather", self.weather_api.get_current_weather(city), timings),
+            self._timed("crypto", self.crypto_api.get_price(coin), timings),
+            return_exceptions=True,
+        )
+        timings["fetch"] = time.perf_counter() - start
+        BRIEF_STAGE_LATENCY.labels(stage="fetch").observe(timings["fetch"])
+
+        render_start = time.perf_counter()
+        embeds: List[Embed] = []
+        errors: Dict[str, str] = {}
+
+        if isinstance(news, BaseException):
+            errors["news"] = _describe(news)
+            embeds.append(_error_embed("📰 News unavailable", errors["news"]))
+        elif news:
+            embeds.extend(news[:MAX_NEWS_EMBEDS])
+        else:
+            embeds.append(_error_embed("📰 No news", "No news articles available at the moment."))
+
+        if isinstance(weather, BaseException):
+            errors["weather"] = _describe(weather)
+            embeds.append(_error_embed(f"🌤 Weather in {city} unavailable", errors["weather"]))
+        else:
+            weather_embed = Embed(title=f"🌤 Weather in {city}", color=discord.Color.blue())
+            weather_embed.add_field(name="Temperature", value=f"{weather['temperature']}°F", inline=True)
+            weather_embed.add_field(name="Description", value=weather['description'], inline=True)
+            embeds.append(weather_embed)
+
+        price = change = None
+        if not isinstance(crypto, BaseException):
+            price = crypto.get('price')
+            change = crypto.get('change_24h')
+        if price is None or change is None:
+            errors["crypto"] = _describe(crypto) if isinstance(crypto, BaseException) else "missing price data"
+            embeds.append(_error_embed(f"💰 {coin.upper()} price unavailable", errors["crypto"]))
+        else:
+            crypto_embed = Embed(title=f"💰 {coin.upper()} Price", color=discord.Color.gold())
+            crypto_embed.add_field(name="Price", value=f"${price:,.2f}", inline=True)
+            crypto_embed.add_field(name="24h Change", value=f"{change:.2f}%", inline=True)
+            embeds.append(crypto_embed)
+
+        timings["render"] = time.perf_counter() - render_start
+        BRIEF_STAGE_LATENCY.labels(stage="render").observe(timings["render"])
+        return Brief(embeds, errors, timings)
+
+
+BriefKey = Tuple[str, str, str]
+
+
+class BriefSnapshots:
+    """
+    Rendered briefs shared by everyone with the same (sources, city, coin)
+    preferences, so cost scales with distinct combinations rather than users.
+    Snapshots are rebuilt in the background shortly before each scheduled slot.
+    A brief with a failed source is only reused for partial_ttl, so one upstream
+    blip doesn't show error embeds to everyone for the full ttl.
+    """
+
+    def __init__(self, builder: BriefBuilder, ttl: float = SNAPSHOT_TTL, partial_ttl: float = PARTIAL_SNAPSHOT_TTL):
+        self.builder = builder
+        self.ttl = ttl
+        self.partial_ttl = min(partial_ttl, ttl)
+        # key -> latest snapshot (may be missing until first built)
+        self._snapshots: Dict[BriefKey, Brief] = {}
+        # key -> last time someone asked for it, least recently used first
+        self._last_used: "OrderedDict[BriefKey, float]" = OrderedDict()
+        self._flight = SingleFlight()
+        self.hits = 0
+        self.builds = 0
+
+    @staticmethod
+    def key(sources: Optional[str], city: str, coin: str) -> BriefKey:
+        return (sources or "all", city.strip().lower(), coin.strip().lower())
+
+    def track(self, key: BriefKey):
+        """Remember key for prewarming, evicting the least recently used beyond MAX_SNAPSHOTS"""
+        self._last_used[key] = time.time()
+        self._last_used.move_to_end(key)
+        while len(self._last_used) > MAX_SNAPSHOTS:
+            evicted, _ = self._last_used.popitem(last=False)
+            self._snapshots.pop(evicted, None)
+
+    async def get(self, sources: Optional[str], city: str, coin: str) -> Brief:
+        """Serve the snapshot for these preferences, building it if missing or older than ttl"""
+        key = self.key(sources, city, coin)
+        self.track(key)
+        snapshot = self._snapshots.get(key)
+        if snapshot is not None and snapshot.age() < (self.partial_ttl if snapshot.errors else self.ttl):
+            self.hits += 1
+            return snapshot
+        return await self._flight.do(key, lambda: self._build(key))
+
+    async def _build(self, key: BriefKey) -> Brief:
+        sources, city, coin = key
+        brief = await self.builder.build(None if sources == "all" else sources, city, coin)
+        self.builds += 1
+        self._snapshots[key] = brief
+        return brief
+
+    async def refresh_all(self, extra_keys: Iterable[BriefKey] = ()):
+        """Rebuild every recently used combination (plus extra_keys) with bounded concurrency"""
+        cutoff = time.time() - SNAPSHOT_IDLE_DAYS * 86400
+        for key, last_used in list(self._last_used.items()):
+            if last_used < cutoff:
+                del self._last_used[key]
+                self._snapshots.pop(key, None)
+        for key in extra_keys:
+            self.track(key)
+
+        semaphore = asyncio.Semaphore(PREWARM_CONCURRENCY)
+
+        async def rebuild(key):
+            async with semaphore:
+                try:
+                    await self._flight.do(key, lambda: self._build(key))
+                except Exception as e:
+                    logger.warning(f"Failed to prewarm brief {key}: {e}")
+
+        start = time.perf_counter()
+        keys = list(self._last_used)
+        await asyncio.gather(*(rebuild(key) for key in keys))
+        logger.info(f"Prewarmed {len(keys)} brief snapshots in {time.perf_counter() - start:.2f}s")
+
+    async def run_prewarm(self, slots: Iterable[str], extra_keys: Iterable[BriefKey] = (), tz: Optional[str] = None):
+        """Forever: sleep until PREWARM_LEAD seconds before the next HH:MM slot (in tz), then refresh_all()"""
+        slots = list(slots)
+        extra_keys = list(extra_keys)
+        at = 0.0
+        while True:
+            # Never before the previous run's slot, even if sleep() woke a hair early
+            at = next_daily(slots, tz, max(time.time(), at) + PREWARM_LEAD) - PREWARM_LEAD
+            await asyncio.sleep(max(0.0, at - time.time()))
+            await self.refresh_all(extra_keys)
+
+    def stats(self) -> Dict:
+        return {"snapshots": len(self._snapshots), "tracked": len(self._last_used), "hits": self.hits, "builds": self.builds}
+
+
+async def send_brief(destination, brief: Brief, header: str) -> List[discord.Message]:
+    """Send the brief using as few messages as Discord's per-message embed limits allow"""
+    start = time.perf_counter()
+    messages = []
+    for i, batch in enumerate(_batch_embeds(brief.embeds)):
+        messages.append(await destination.send(header if i == 0 else None, embeds=batch))
+    BRIEF_STAGE_LATENCY.labels(stage="send").observe(time.perf_counter() - start)
+    return messages
+
+
+def _batch_embeds(embeds: List[Embed]) -> List[List[Embed]]:
+    batches: List[List[Embed]] = [[]]
+    chars = 0
+    for embed in embeds:
+        size = len(embed)
+        if batches[-1] and (len(batches[-1]) >= MAX_EMBEDS_PER_MESSAGE or chars + size > MAX_EMBED_CHARS_PER_MESSAGE):
+            batches.append([])
+            chars = 0
+        batches[-1].append(embed)
+        chars += size
+    return batches
+
+
+def _error_embed(title: str, description: str) -> Embed:
+    return Embed(title=title, description=description, color=discord.Color.dark_grey())
+
+
+def _describe(error: BaseException) -> str:
+    if isinstance(error, asyncio.TimeoutError):
+        return f"Timed out after {SOURCE_TIMEOUT:g}s"
+    return str(error) or error.__class__.__name__
@@ -3,82 +3,383 @@
 Database module for handling user preferences
 """
 
+import asyncio
 import json
 import logging
 import os
+import sqlite3
+import threading
+from collections import OrderedDict
 from pathlib import Path
 
 logger = logging.getLogger(__name__)
 
-class PreferencesDB:
+DB_DIR = Path(os.path.dirname(os.path.abspath(__file__)))
+FLUSH_INTERVAL = float(os.getenv("PREFS_FLUSH_INTERVAL", 1.0))  # seconds between background write flushes
+FLUSH_BATCH_SIZE = int(os.getenv("PREFS_FLUSH_BATCH_SIZE", 500))  # flush early once this many users are dirty
+CACHE_SIZE = int(os.getenv("PREFS_CACHE_SIZE", 10000))  # users whose preferences are kept in memory
+
+class JSONPreferencesDB:
+    """Legacy store: every user in one preferences.json (kept for migration and benchmarking)"""
+
     def __init__(self, db_path=None):
         """Initialize the preferences database"""
         if db_path is None:
             # Default to a preferences.json in the same directory
-            self.db_path = Path(os.path.dirname(os.path.abspath(__file__))) / "preferences.json"
+            self.db_path = DB_DIR / "preferences.json"
         else:
             self.db_path = Path(db_path)
-            
+
         # Create the directory if it doesn't exist
         self.db_path.parent.mkdir(parents=True, exist_ok=True)
-        
+
         # Initialize the database if it doesn't exist
         if not self.db_path.exists():
             with open(self.db_path, 'w') as f:
                 json.dump({}, f)
             logger.info(f"Created new preferences database at {self.db_path}")
-        
+
         logger.info(f"Using preferences database at {self.db_path}")
-    
+
+    def get_all_preferences(self):
+        """Get every user's preferences keyed by user id string"""
+        with open(self.db_path, 'r') as f:
+            return json.load(f)
+
     def get_user_preferences(self, user_id):
         """Get preferences for a user"""
         try:
-            with open(self.db_path, 'r') as f:
-                all_prefs = json.load(f)
-            
+            all_prefs = self.get_all_preferences()
+
             # Convert user_id to string for JSON compatibility
             user_id = str(user_id)
-            
+
             # Return existing preferences or empty dict for new users
             return all_prefs.get(user_id, {})
         except Exception as e:
             logger.error(f"Error retrieving preferences for user {user_id}: {e}")
             return {}
-    
+
     def set_user_preferences(self, user_id, preferences):
         """Set preferences for a user"""
         try:
             # Read existing preferences
-            with open(self.db_path, 'r') as f:
-                all_prefs = json.load(f)
-            
+            all_prefs = self.get_all_preferences()
+
             # Convert user_id to string for JSON compatibility
             user_id = str(user_id)
-            
+
             # Update preferences
             all_prefs[user_id] = preferences
-            
+
             # Write back to file
             with open(self.db_path, 'w') as f:
                 json.dump(all_prefs, f, indent=2)
-                
+
             return True
         except Exception as e:
             logger.error(f"Error setting preferences for user {user_id}: {e}")
             return False
-    
+
     def toggle_daily_brief(self, user_id, status):
         """Toggle daily brief status for a user"""
         try:
             # Get current preferences
             preferences = self.get_user_preferences(user_id)
-            
+
             # Update brief_enabled status
             preferences['brief_enabled'] = status
-            
+
             # Save updated preferences
             return self.set_user_preferences(user_id, preferences)
         except Exception as e:
             logger.error(f"Error toggling daily brief for user {user_id}: {e}")
             return False
 
+class PreferencesDB:
+    """
+    SQLite-backed preferences: one row per user, WAL journaling, and a
+    write-through LRU cache of the cache_size most recently used users so
+    repeat reads never touch disk. brief_enabled is mirrored into an indexed
+    generated column, so finding subscribers doesn't scan every row's JSON.
+
+    Command handlers should use the async API (aget/aset/get_many), which
+    never blocks the event loop: aset updates the cache immediately and a
+    background task writes dirty users to disk in batches.
+    """
+
+    def __init__(self, db_path=None, legacy_json_path=None, cache_size=CACHE_SIZE):
+        """Initialize the preferences database, migrating preferences.json on first run"""
+        if db_path is None:
+            self.db_path = DB_DIR / "preferences.sqlite3"
+        else:
+            self.db_path = Path(db_path)
+        if legacy_json_path is None:
+            legacy_json_path = self.db_path.with_name("preferences.json")
+
+        # Create the directory if it doesn't exist
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+
+        # Connection is shared between the event loop and worker threads, guarded by _lock
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS user_preferences (user_id TEXT PRIMARY KEY, preferences TEXT NOT NULL)"
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_xinfo(user_preferences)")}
+        if "brief_enabled" not in columns:
+            self._conn.execute(
+                "ALTER TABLE user_preferences ADD COLUMN brief_enabled INTEGER "
+                "GENERATED ALWAYS AS (json_extract(preferences, '$.brief_enabled') = 1) VIRTUAL"
+            )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS user_preferences_brief_enabled ON user_preferences (brief_enabled)"
+        )
+        self._conn.commit()
+
+        # user id string -> preferences dict (including {} for users with none saved), least recently used first
+        self._cache = OrderedDict()
+        self.cache_size = cache_size
+        # user id string -> preferences waiting for the background flush
+        self._dirty = {}
+        # user id string -> preferences in the batch being written right now
+        self._inflight = {}
+        # One flush at a time; a caller that finds one running waits for it to land
+        self._flush_lock = asyncio.Lock()
+        self._flush_event = None
+        self._flush_task = None
+
+        self._migrate_from_json(Path(legacy_json_path))
+        logger.info(f"Using preferences database at {self.db_path}")
+
+    def _migrate_from_json(self, json_path):
+        """One-time import of the legacy preferences.json, which is then renamed out of the way"""
+        if not json_path.exists():
+            return
+        try:
+            with open(json_path, 'r') as f:
+                all_prefs = json.load(f)
+            with self._lock, self._conn:
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO user_preferences (user_id, preferences) VALUES (?, ?)",
+                    ((str(user_id), json.dumps(prefs)) for user_id, prefs in all_prefs.items()),
+                )
+            json_path.rename(json_path.with_name(json_path.name + ".migrated"))
+            logger.info(f"Migrated {len(all_prefs)} users from {json_path} to {self.db_path}")
+        except Exception as e:
+            logger.error(f"Error migrating preferences from {json_path}: {e}")
+
+    # --- cache ---
+
+    def _cached(self, user_id):
+        """Cached preferences for a user id string (marking them recently used), or None"""
+        prefs = self._cache.get(user_id)
+        if prefs is not None:
+            self._cache.move_to_end(user_id)
+            return prefs
+        # Evicted while a write was queued or being written: that copy is newer than the database
+        prefs = self._dirty.get(user_id)
+        if prefs is None:
+            prefs = self._inflight.get(user_id)
+        if prefs is not None:
+            return self._remember(user_id, dict(prefs))
+        return None
+
+    def _remember(self, user_id, prefs):
+        self._cache[user_id] = prefs
+        self._cache.move_to_end(user_id)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return prefs
+
+    def _remember_loaded(self, user_id, prefs):
+        """Cache prefs read from disk, unless a write landed while we were reading"""
+        cached = self._cached(user_id)
+        return cached if cached is not None else self._remember(user_id, prefs)
+
+    def _load_one(self, user_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT preferences FROM user_preferences WHERE user_id = ?", (user_id,)
+            ).fetchone()
+        return json.loads(row[0]) if row else {}
+
+    # --- sync API ---
+
+    def get_user_preferences(self, user_id):
+        """Get preferences for a user"""
+        user_id = str(user_id)
+        try:
+            cached = self._cached(user_id)
+            if cached is None:
+                cached = self._remember_loaded(user_id, self._load_one(user_id))
+            # Callers mutate the dict they get back, so hand out a copy
+            return dict(cached)
+        except Exception as e:
+            logger.error(f"Error retrieving preferences for user {user_id}: {e}")
+            return {}
+
+    def set_user_preferences(self, user_id, preferences):
+        """Set preferences for a user"""
+        user_id = str(user_id)
+        # This write supersedes any queued async one
+        self._dirty.pop(user_id, None)
+        try:
+            with self._lock, self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO user_preferences (user_id, preferences) VALUES (?, ?)",
+                    (user_id, json.dumps(preferences)),
+                )
+            self._remember(user_id, dict(preferences))
+            return True
+        except Exception as e:
+            logger.error(f"Error setting preferences for user {user_id}: {e}")
+            return False
+
+    def toggle_daily_brief(self, user_id, status):
+        """Toggle daily brief status for a user"""
+        try:
+            # Get current preferences
+            preferences = self.get_user_preferences(user_id)
+
+            # Update brief_enabled status
+            preferences['brief_enabled'] = status
+
+            # Save updated preferences
+            return self.set_user_preferences(user_id, preferences)
+        except Exception as e:
+            logger.error(f"Error toggling daily brief for user {user_id}: {e}")
+            return False
+
+    # --- async API ---
+
+    async def aget(self, user_id):
+        """Get preferences for a user without blocking the event loop"""
+        user_id = str(user_id)
+        cached = self._cached(user_id)
+        if cached is None:
+            try:
+                loaded = await asyncio.to_thread(self._load_one, user_id)
+            except Exception as e:
+                logger.error(f"Error retrieving preferences for user {user_id}: {e}")
+                return {}
+            cached = self._remember_loaded(user_id, loaded)
+        return dict(cached)
+
+    async def aset(self, user_id, preferences):
+        """Set preferences for a user; visible immediately, written to disk by the next batch flush"""
+        user_id = str(user_id)
+        self._remember(user_id, dict(preferences))
+        self._dirty[user_id] = dict(preferences)
+        self._ensure_flusher()
+        if len(self._dirty) >= FLUSH_BATCH_SIZE:
+            self._flush_event.set()
+        return True
+
+    async def atoggle_daily_brief(self, user_id, status):
+        """Toggle daily brief status for a user"""
+        preferences = await self.aget(user_id)
+        preferences['brief_enabled'] = status
+        return await self.aset(user_id, preferences)
+
+    async def get_many(self, user_ids):
+        """Get preferences for many users at once (one query for everything not cached)"""
+        results = {}
+        missing = []
+        for user_id in user_ids:
+            cached = self._cached(str(user_id))
+            if cached is not None:
+                results[user_id] = dict(cached)
+            else:
+                missing.append(user_id)
+
+        if missing:
+            loaded = await asyncio.to_thread(self._load_many, [str(u) for u in missing])
+            for user_id in missing:
+                prefs = self._remember_loaded(str(user_id), loaded.get(str(user_id), {}))
+                results[user_id] = dict(prefs)
+        return results
+
+    async def get_brief_subscribers(self):
+        """Get {user id string: preferences} for every user with brief_enabled set"""
+        # Queued writes include recent !togglebrief calls, so land them first
+        await self.flush()
+        return await asyncio.to_thread(self._load_subscribers)
+
+    def _load_subscribers(self):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT user_id, preferences FROM user_preferences WHERE brief_enabled = 1"
+            ).fetchall()
+        return {user_id: json.loads(prefs) for user_id, prefs in rows}
+
+    def _load_many(self, user_ids):
+        loaded = {}
+        # Stay under SQLite's bound-parameter limit
+        for i in range(0, len(user_ids), 500):
+            chunk = user_ids[i:i + 500]
+            placeholders = ",".join("?" * len(chunk))
+            with self._lock:
+                rows = self._conn.execute(
+                    f"SELECT user_id, preferences FROM user_preferences WHERE user_id IN ({placeholders})", chunk
+                ).fetchall()
+            for user_id, prefs in rows:
+                loaded[user_id] = json.loads(prefs)
+        return loaded
+
+    def _write_many(self, items):
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO user_preferences (user_id, preferences) VALUES (?, ?)",
+                ((user_id, json.dumps(prefs)) for user_id, prefs in items),
+            )
+
+    def _ensure_flusher(self):
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_event = asyncio.Event()
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_event.wait(), timeout=FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_event.clear()
+            await self.flush()
+
+    async def flush(self):
+        """Write every queued preference change to disk in one transaction (waiting out one in progress)"""
+        async with self._flush_lock:
+            if not self._dirty:
+                return
+            batch, self._dirty = self._dirty, {}
+            self._inflight = batch
+            try:
+                await asyncio.to_thread(self._write_many, list(batch.items()))
+                logger.debug(f"Flushed preferences for {len(batch)} users")
+            except Exception as e:
+                logger.error(f"Error flushing preferences for {len(batch)} users: {e}")
+                # Re-queue anything that hasn't been superseded by a newer write
+                for user_id, prefs in batch.items():
+                    self._dirty.setdefault(user_id, prefs)
+            finally:
+                self._inflight = {}
+
+    async def aclose(self):
+        """Flush pending writes, stop the background flusher and close the database"""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        await self.flush()
+        self.close()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,184 @@
+"""
+Scheduled per-user delivery of daily briefs by DM.
+
+Subscribers are grouped by their (sources, city, coin) preferences so each
+group's brief is fetched once, then DMs are paced through a token bucket so a
+slot's sends are spread over a window instead of bursting into Discord's
+global and per-route rate limits.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from collections import defaultdict
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import discord
+
+from brief import Brief, BriefKey, BriefSnapshots, PREWARM_CONCURRENCY, send_brief
+from metrics import REGISTRY
+from ratelimit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+DELIVERY_WINDOW = float(os.getenv("BRIEF_DELIVERY_WINDOW", 600))  # spread each slot's DMs over up to this many seconds
+DELIVERY_RATE = float(os.getenv("BRIEF_DELIVERY_RATE", 10))  # max Discord requests per second (global limit is 50)
+DELIVERY_WORKERS = 8  # DMs in flight at once; the token bucket sets the actual pace
+
+BRIEF_DELIVERIES = REGISTRY.counter(
+    "bot_brief_deliveries_total", "Scheduled brief DMs by outcome", ("status",)
+)
+
+
+class BriefDelivery:
+    """DMs every brief_enabled user their brief, one fetch per preference group"""
+
+    def __init__(self, bot, snapshots: BriefSnapshots, db, default_city: str, default_coin: str,
+                 rate: float = DELIVERY_RATE, window: float = DELIVERY_WINDOW,
+                 on_unsubscribe: Optional[Callable[[str], None]] = None):
+        self.bot = bot
+        self.snapshots = snapshots
+        self.db = db
+        self.default_city = default_city
+        self.default_coin = default_coin
+        self.rate = rate
+        self.window = window
+        self.on_unsubscribe = on_unsubscribe
+        self._tasks = set()
+        # Hard cap shared by overlapping runs (e.g. subscribers in different timezones)
+        self._global_bucket = TokenBucket(rate, capacity=max(1.0, rate))
+        self.last_run: Dict = {}
+
+    def key_for(self, preferences: Dict) -> BriefKey:
+        return BriefSnapshots.key(
+            preferences.get('preferred_sources'),
+            preferences.get('preferred_location', self.default_city),
+            preferences.get('preferred_crypto', self.default_coin),
+        )
+
+    def start(self, header: str, user_ids: Optional[Iterable[str]] = None) -> asyncio.Task:
+        """Kick off a delivery run in the background"""
+        task = asyncio.create_task(self.run(header, user_ids))
+        self._tasks.add(task)
+        task.add_done_callback(self._finished)
+        return task
+
+    def _finished(self, task: asyncio.Task):
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Brief delivery failed: {task.exception()}")
+
+    async def _load_subscribers(self, user_ids: Optional[Iterable[str]]) -> Dict[str, Dict]:
+        if user_ids is None:
+            return await self.db.get_brief_subscribers()
+        preferences = await self.db.get_many([str(user_id) for user_id in user_ids])
+        return {user_id: prefs for user_id, prefs in preferences.items() if prefs.get('brief_enabled')}
+
+    async def run(self, header: str, user_ids: Optional[Iterable[str]] = None) -> Dict:
+        """Deliver to user_ids (those still subscribed), or to every subscriber if None"""
+        start = time.perf_counter()
+        subscribers = await self._load_subscribers(user_ids)
+        groups: Dict[BriefKey, List[str]] = defaultdict(list)
+        for user_id, preferences in subscribers.items():
+            groups[self.key_for(preferences)].append(user_id)
+
+        briefs = await self._fetch_groups(list(groups))
+        jobs: List[Tuple[str, Brief]] = [
+            (user_id, briefs[key]) for key, user_ids in groups.items() if key in briefs for user_id in user_ids
+        ]
+        skipped = len(subscribers) - len(jobs)
+
+        # Pace to finish within the window, but never faster than DELIVERY_RATE.
+        # Each DM is its messages plus (usually) opening the DM channel.
+        requests_needed = sum(brief.message_count() + 1 for _, brief in jobs)
+        rate = min(self.rate, max(1.0, requests_needed / self.window))
+        largest = max((brief.message_count() for brief in briefs.values()), default=1)
+        bucket = TokenBucket(rate, capacity=max(rate, largest))
+
+        outcomes: Dict[str, int] = defaultdict(int)
+        queue: asyncio.Queue = asyncio.Queue()
+        for job in jobs:
+            queue.put_nowait(job)
+
+        async def worker():
+            while True:
+                try:
+                    user_id, brief = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                status = await self._deliver(user_id, brief, header, bucket)
+                outcomes[status] += 1
+                BRIEF_DELIVERIES.labels(status=status).inc()
+
+        await asyncio.gather(*(worker() for _ in range(min(DELIVERY_WORKERS, len(jobs)))))
+
+        self.last_run = {
+            "subscribers": len(subscribers),
+            "groups": len(groups),
+            "skipped": skipped,
+            "outcomes": dict(outcomes),
+            "rate": rate,
+            "seconds": time.perf_counter() - start,
+        }
+        logger.info(
+            f"Delivered briefs to {outcomes.get('sent', 0)}/{len(subscribers)} subscribers "
+            f"in {len(groups)} groups over {self.last_run['seconds']:.0f}s at {rate:.1f} req/s "
+            f"(outcomes: {dict(outcomes)}, skipped: {skipped})"
+        )
+        return self.last_run
+
+    async def _fetch_groups(self, keys: List[BriefKey]) -> Dict[BriefKey, Brief]:
+        """Build (or reuse the prewarmed snapshot of) each group's brief once"""
+        semaphore = asyncio.Semaphore(PREWARM_CONCURRENCY)
+        briefs: Dict[BriefKey, Brief] = {}
+
+        async def fetch(key):
+            sources, city, coin = key
+            async with semaphore:
+                try:
+                    briefs[key] = await self.snapshots.get(None if sources == "all" else sources, city, coin)
+                except Exception as e:
+                    logger.error(f"Could not build brief for group {key}: {e}")
+
+        await asyncio.gather(*(fetch(key) for key in keys))
+        return briefs
+
+    async def _spend(self, bucket: TokenBucket, tokens: int = 1):
+        await bucket.acquire(tokens)
+        await self._global_bucket.acquire(min(tokens, self._global_bucket.capacity))
+
+    async def _deliver(self, user_id: str, brief: Brief, header: str, bucket: TokenBucket) -> str:
+        """Send one user's DM, spending a token per Discord request; returns the outcome label"""
+        try:
+            user = self.bot.get_user(int(user_id))
+            if user is None:
+                await self._spend(bucket)
+                user = await self.bot.fetch_user(int(user_id))
+            if user.dm_channel is None:
+                await self._spend(bucket)
+                await user.create_dm()
+            await self._spend(bucket, brief.message_count())
+            await send_brief(user, brief, header)
+            return "sent"
+        except (discord.Forbidden, discord.NotFound) as e:
+            # DMs closed or account gone: every retry would be another invalid request
+            # counting against Discord's ban threshold, so unsubscribe them
+            logger.info(f"Disabling daily brief for user {user_id}: {e}")
+            await self.db.atoggle_daily_brief(user_id, False)
+            if self.on_unsubscribe is not None:
+                self.on_unsubscribe(user_id)
+            return "unreachable"
+        except discord.HTTPException as e:
+            logger.warning(f"Failed to DM brief to user {user_id}: {e}")
+            return "failed"
+
+    def stats(self) -> Dict:
+        return dict(self.last_run)
+
+    async def aclose(self):
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks.clear()
@@ -11,13 +11,21 @@ from discord.ui import View, Select
 import logging
 from dotenv import load_dotenv
 import asyncio
-from datetime import datetime
-from api.news import NewsAPI, NewsAPIError
+from api.news import NewsAPI, NewsAPIError, NewsFeed
 from api.weather import WeatherAPI
-from api.crypto import CryptoAPI, CryptoAPIError
-from db.preferences import PreferencesDB
+from api.crypto import CryptoAPI, CryptoAPIError, POLL_INTERVAL as CRYPTO_POLL_INTERVAL
+from api.client import close_session
+from api.cache_store import close_store
+from api.quota import QuotaExceeded
+from db.preferences import PreferencesDB, DB_DIR
+from brief import BriefBuilder, BriefSnapshots, send_brief
+from delivery import BriefDelivery
+from scheduler import Job, Scheduler, parse_timezone, parse_times
+from ratelimit import RateLimiter
 from analytics import analytics
-from typing import List
+import metrics
+from metrics import MetricsServer, COMMAND_LATENCY, UPSTREAM_LATENCY, LOOP_LAG
+import time
 
 load_dotenv()
 
@@ -35,12 +43,15 @@ WEATHER_API_KEY = os.getenv("WEATHER_API_KEY")
 DEFAULT_CITY = os.getenv("DEFAULT_CITY", "los angeles")
 DEFAULT_CRYPTO = os.getenv("DEFAULT_CRYPTO", "btc")
 DAILYBRIEF_CHANNEL_ID = int(os.getenv("DAILYBRIEF_CHANNEL_ID", 0))
+BRIEF_SLOTS = ["08:00", "14:00", "20:00"]
+BRIEF_TIMEZONE = os.getenv("BRIEF_TIMEZONE") or None  # IANA name for the default slots; unset means server local time
+SCHEDULE_DB_PATH = os.getenv("SCHEDULE_DB_PATH", str(DB_DIR / "schedule.sqlite3"))
 
-# Rate limiting
+# Rate limiting: seconds between calls per user, or rules like "1/10s user, 20/60s guild window" (see ratelimit.py)
 RATE_LIMITS = {
-    'news': 10,  # seconds
-    'weather': 10,
-    'crypto': 5,
+    'news': "1/10s user, 20/60s guild window",
+    'weather': "1/10s user, 20/60s guild window",
+    'crypto': "1/5s user, 30/60s guild window",
     'dailybrief': 300  # 5 minutes
 }
 
@@ -48,18 +59,111 @@ RATE_LIMITS = {
 news_api = NewsAPI(NEWS_API_KEY)
 weather_api = WeatherAPI(WEATHER_API_KEY)
 crypto_api = CryptoAPI()
+crypto_api.track([DEFAULT_CRYPTO])  # so an unmapped DEFAULT_CRYPTO (a CoinGecko id) works before the first poll
 db = PreferencesDB()
+# Rendered briefs are shared by everyone with the same (sources, city, coin) preferences
+brief_snapshots = BriefSnapshots(BriefBuilder(news_api, weather_api, crypto_api))
+# Channel brief plus one job per subscriber, each firing at their own times in their own timezone
+scheduler = Scheduler(SCHEDULE_DB_PATH)
 
 # Discord bot setup
+class NamiBot(commands.Bot):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics_server = MetricsServer()
+
+    async def setup_hook(self):
+        await self.metrics_server.start()
+        self.prewarm_task = asyncio.create_task(
+            brief_snapshots.run_prewarm(
+                BRIEF_SLOTS, [BriefSnapshots.key(None, DEFAULT_CITY, DEFAULT_CRYPTO)], tz=BRIEF_TIMEZONE
+            )
+        )
+        await sync_brief_jobs()
+        scheduler.start()
+
+    async def close(self):
+        try:
+            await super().close()
+        finally:
+            if getattr(self, "prewarm_task", None):
+                self.prewarm_task.cancel()
+            await scheduler.aclose()
+            await brief_delivery.aclose()
+            await self.metrics_server.stop()
+            # Release pooled upstream connections and finish pending cache/preference/analytics writes
+            await close_session()
+            close_store()
+            await db.aclose()
+            await analytics.aclose()
+
 intents = discord.Intents.default()
 intents.message_content = True
-bot = commands.Bot(command_prefix="!", intents=intents, help_command=None)
+bot = NamiBot(command_prefix="!", intents=intents, help_command=None)
+# DMs each !togglebrief subscriber their own brief at every slot
+brief_delivery = BriefDelivery(
+    bot, brief_snapshots, db, DEFAULT_CITY, DEFAULT_CRYPTO,
+    on_unsubscribe=lambda user_id: scheduler.remove(f"brief:{user_id}"),
+)
+
+metrics.REGISTRY.gauge_callback(
+    "bot_cache_hit_ratio",
+    "Share of lookups served from cache (fresh, stale or negative)",
+    lambda: {
+        ("news",): news_api.cache_stats()['hit_rate'] / 100,
+        ("weather",): weather_api.cache_stats()['hit_rate'] / 100,
+        ("crypto",): crypto_api.quotes.stats()['hit_rate'] / 100,
+    },
+    labelnames=("cache",),
+)
+metrics.REGISTRY.gauge_callback(
+    "bot_upstream_circuit_open",
+    "1 while an upstream provider's circuit is open or half-open (requests refused or probing)",
+    lambda: {
+        (name,): int(quota.state != "closed")
+        for name, quota in (("news", news_api.quota), ("weather", weather_api.quota), ("crypto", crypto_api.quota))
+    },
+    labelnames=("api",),
+)
+metrics.REGISTRY.gauge_callback(
+    "bot_cache_entries",
+    "Entries currently held in each response cache",
+    lambda: {
+        ("news",): news_api.cache_stats()['entries'],
+        ("weather",): weather_api.cache_stats()['entries'],
+        ("crypto",): crypto_api.quotes.stats()['entries'],
+    },
+    labelnames=("cache",),
+)
 
-# Initialize rate limiting dictionaries
-bot.last_news_call = {}
-bot.last_weather_call = {}
-bot.last_crypto_call = {}
-bot.last_dailybrief_call = {}
+# Time every command
+@bot.before_invoke
+async def start_command_timer(ctx):
+    ctx.started_at = time.perf_counter()
+
+@bot.after_invoke
+async def record_command_time(ctx):
+    started_at = getattr(ctx, "started_at", None)
+    if started_at is not None:
+        status = "error" if ctx.command_failed else "ok"
+        COMMAND_LATENCY.labels(command=ctx.command.name, status=status).observe(time.perf_counter() - started_at)
+
+rate_limiter = RateLimiter(RATE_LIMITS)
+
+class RateLimited(commands.CheckFailure):
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"!{name} is rate limited for {retry_after:.1f}s")
+        self.name = name
+        self.retry_after = retry_after
+
+def rate_limited(name: str):
+    """Command check: reject the call if any RATE_LIMITS[name] rule is exhausted"""
+    async def predicate(ctx):
+        retry_after = rate_limiter.hit(name, user=ctx.author.id, guild=ctx.guild.id if ctx.guild else None)
+        if retry_after:
+            raise RateLimited(name, retry_after)
+        return True
+    return commands.check(predicate)
 
 # Command error handler
 @bot.event
@@ -68,6 +172,8 @@ async def on_command_error(ctx, error):
         await ctx.send("Command not found. Use !help for available commands.")
     elif isinstance(error, commands.CommandOnCooldown):
         await ctx.send(f"Please wait {error.retry_after:.2f}s before using this command again.")
+    elif isinstance(error, RateLimited):
+        await ctx.send(f"Please wait {max(1, round(error.retry_after))}s before using !{error.name} again.")
     else:
         logger.error(f"Command error in {ctx.command}: {error}")
         await ctx.send("An unexpected error occurred. Please try again later.")
@@ -76,52 +182,75 @@ async def on_command_error(ctx, error):
 async def on_ready():
     logger.info(f"{bot.user.name} is online!")
     await bot.change_presence(activity=discord.Game(name="!help for Nami's commands"))
-    scheduled_briefs.start()
-
-@tasks.loop(minutes=1)
-async def scheduled_briefs():
-    now = datetime.now().strftime('%H:%M')
-    if now in ["08:00", "14:00", "20:00"]:
-        channel = bot.get_channel(DAILYBRIEF_CHANNEL_ID)
-        if channel:
-            try:
-                # Get news
-                embeds, _ = await news_api.get_top_headlines()
-                await channel.send("☀️ Here's your scheduled Daily Brief:")
-                await channel.send("📰 **Top News:**", embeds=embeds)
-                
-                # Get weather
-                weather_data = await weather_api.get_current_weather(DEFAULT_CITY)
-                weather_embed = Embed(
-                    title=f"Weather in {DEFAULT_CITY}",
-                    color=discord.Color.blue()
-                )
-                weather_embed.add_field(name="Temperature", value=f"{weather_data['temperature']}°F", inline=True)
-                weather_embed.add_field(name="Description", value=weather_data['description'], inline=True)
-                await channel.send("🌤 **Weather Update:**", embed=weather_embed)
-                
-                # Get crypto (always BTC)
-                btc_data = await crypto_api.get_price('btc')
-                if btc_data and isinstance(btc_data, dict):
-                    logger.info(f"Crypto data for BTC: {btc_data}")
-                    price = btc_data.get('price')
-                    change = btc_data.get('change_24h')
-                    if price is not None and change is not None:
-                        crypto_embed = Embed(
-                            title="BTC Price",
-                            color=discord.Color.gold()
-                        )
-                        crypto_embed.add_field(name="Price", value=f"${price:,.2f}", inline=True)
-                        crypto_embed.add_field(name="24h Change", value=f"{change:.2f}%", inline=True)
-                        await channel.send("💰 **Crypto Update:**", embed=crypto_embed)
-                    else:
-                        await channel.send(f"Unable to fetch full BTC price data (missing 'price' or 'change_24h'). Raw data: {btc_data}")
-                else:
-                    await channel.send(f"Unable to fetch BTC price data at the moment. Raw data: {btc_data}")
-                
-            except Exception as e:
-                logger.error(f"Error in scheduled brief: {str(e)}")
-                await channel.send(f"Error generating daily brief: {str(e)}")
+    if CRYPTO_POLL_INTERVAL > 0 and not crypto_poller.is_running():
+        crypto_poller.start()
+
+@tasks.loop(seconds=max(CRYPTO_POLL_INTERVAL, 1))
+async def crypto_poller():
+    """Keep crypto_api's ticker table fresh so !crypto answers from memory"""
+    try:
+        subscribers = await db.get_brief_subscribers()
+        coins = {DEFAULT_CRYPTO} | {p['preferred_crypto'] for p in subscribers.values() if p.get('preferred_crypto')}
+        updated = await crypto_api.poll_prices(extra_symbols=coins)
+        logger.debug(f"Polled {updated} crypto quotes")
+    except (CryptoAPIError, QuotaExceeded) as e:
+        logger.warning(f"Crypto poll failed: {e}")
+
+def user_brief_job(user_id, preferences) -> Job:
+    """The scheduled job for one subscriber, at their own times (default BRIEF_SLOTS) and timezone"""
+    return Job(
+        f"brief:{user_id}", "user_brief", {"user_id": str(user_id)},
+        times=preferences.get('brief_times') or BRIEF_SLOTS,
+        tz=preferences.get('timezone') or BRIEF_TIMEZONE,
+    )
+
+def schedule_user_brief(user_id, preferences):
+    """Add, update or remove a user's brief job to match their preferences"""
+    if preferences.get('brief_enabled'):
+        return scheduler.add(user_brief_job(user_id, preferences))
+    scheduler.remove(f"brief:{user_id}")
+    return None
+
+async def sync_brief_jobs():
+    """Make the scheduled jobs match the channel setting and the current subscribers"""
+    if DAILYBRIEF_CHANNEL_ID:
+        scheduler.add(Job("channel-brief", "channel_brief", times=BRIEF_SLOTS, tz=BRIEF_TIMEZONE))
+    else:
+        scheduler.remove("channel-brief")
+
+    subscribers = await db.get_brief_subscribers()
+    for job in scheduler.jobs("user_brief"):
+        if job.payload["user_id"] not in subscribers:
+            scheduler.remove(job.id)
+    for user_id, preferences in subscribers.items():
+        try:
+            schedule_user_brief(user_id, preferences)
+        except ValueError as e:
+            logger.warning(f"Skipping brief schedule for user {user_id}: {e}")
+    await scheduler.flush()
+    logger.info(f"Scheduled briefs for {len(subscribers)} subscribers")
+
+async def post_channel_brief(jobs):
+    await bot.wait_until_ready()
+    channel = bot.get_channel(DAILYBRIEF_CHANNEL_ID)
+    if not channel:
+        logger.warning(f"Daily brief channel {DAILYBRIEF_CHANNEL_ID} not found")
+        return
+    try:
+        brief = await brief_snapshots.get(None, DEFAULT_CITY, DEFAULT_CRYPTO)
+        await send_brief(channel, brief, "☀️ Here's your scheduled Daily Brief:")
+        logger.info(f"Scheduled brief sent (built {brief.age():.0f}s ago: {brief.timing_summary()})")
+    except Exception as e:
+        logger.error(f"Error in scheduled brief: {str(e)}")
+        await channel.send(f"Error generating daily brief: {str(e)}")
+
+async def deliver_user_briefs(jobs):
+    """Every subscriber due at this moment goes out in one grouped, paced delivery run"""
+    await bot.wait_until_ready()
+    await brief_delivery.run("☀️ Here's your scheduled Daily Brief:", [job.payload["user_id"] for job in jobs])
+
+scheduler.register("channel_brief", post_channel_brief)
+scheduler.register("user_brief", deliver_user_briefs)
 
 @bot.command(name="help")
 async def help_command(ctx):
@@ -136,28 +265,27 @@ async def help_command(ctx):
     embed.add_field(name="!dailybrief", value="Get top news, weather, and crypto update.", inline=False)
     embed.add_field(name="!setprefs", value="Configure your daily brief preferences.", inline=False)
     embed.add_field(name="!togglebrief", value="Toggle daily brief notifications.", inline=False)
+    embed.add_field(
+        name="!briefschedule [timezone] [HH:MM ...]",
+        value="Set when your daily brief arrives.\nExample: !briefschedule America/New_York 07:30 18:00",
+        inline=False
+    )
     await ctx.send(embed=embed)
 
 @bot.command(name="news")
+@rate_limited("news")
 async def news(ctx, category: str = None, *, keyword: str = None):
     """Get top news headlines with optional category and keyword search
     Categories: general, sports, business, technology, entertainment, health, science
     """
     user_id = ctx.author.id
-    preferences = db.get_user_preferences(user_id)
-    
-    # Check rate limit
-    last_call = ctx.bot.last_news_call.get(user_id)
-    if last_call and (datetime.now() - last_call).total_seconds() < RATE_LIMITS['news']:
-        await ctx.send("Please wait a moment before requesting news again.")
-        return
-    ctx.bot.last_news_call[user_id] = datetime.now()
+    preferences = await db.aget(user_id)
 
     try:
         # Use user's preferred sources if set and not "all"
         sources = preferences.get('preferred_sources')
         if sources and sources != "all":
-            embeds, total_results = await news_api.get_article_by_source(sources, keyword=keyword)
+            feed = news_api.source_feed(sources, keyword=keyword)
         else:
             # Validate category if provided
             valid_categories = ['general', 'sports', 'business', 'technology', 'entertainment', 'health', 'science']
@@ -165,32 +293,32 @@ async def news(ctx, category: str = None, *, keyword: str = None):
                 await ctx.send(f"Invalid category. Valid categories are: {', '.join(valid_categories)}")
                 return
                 
-            embeds, total_results = await news_api.get_top_headlines(
+            feed = news_api.headlines_feed(
                 category=category.lower() if category else 'general',
                 keyword=keyword
             )
 
-        if not embeds:
+        if not await feed.start():
+            feed.close()
             await ctx.send("No news articles found.")
             return
 
-        # Create pagination if more than one page of articles
-        if len(embeds) > 1:
-            view = NewsPagination(embeds)
+        # Create pagination if more than one article; further NewsAPI pages load as the user clicks through
+        if feed.has_next():
+            view = NewsPagination(feed)
             await ctx.send(
-                content=f"Found {total_results} articles. Use the buttons to navigate.",
-                embed=embeds[0],
+                content=f"Found {feed.total_results} articles. Use the buttons to navigate.",
+                embed=view.current_embed(),
                 view=view,
             )
         else:
-            # Send articles as Discord embeds
-            for embed in embeds:
-                await ctx.send(embed=embed)
+            await ctx.send(embed=feed.current.embed())
+            feed.close()
 
         # Log command usage
         analytics.log_command("news", user_id)
         
-    except NewsAPIError as e:
+    except (NewsAPIError, QuotaExceeded) as e:
         analytics.log_error("news", str(e), user_id)
         await ctx.send(f"Error fetching news: {e}")
     except Exception as e:
@@ -199,17 +327,11 @@ async def news(ctx, category: str = None, *, keyword: str = None):
         await ctx.send("An unexpected error occurred while fetching news.")
 
 @bot.command(name="weather")
+@rate_limited("weather")
 async def weather(ctx, *, city: str = None):
     """Get current weather for a city"""
     user_id = ctx.author.id
-    preferences = db.get_user_preferences(user_id)
-    
-    # Check rate limit
-    last_call = ctx.bot.last_weather_call.get(user_id)
-    if last_call and (datetime.now() - last_call).total_seconds() < RATE_LIMITS['weather']:
-        await ctx.send("Please wait a moment before requesting weather again.")
-        return
-    ctx.bot.last_weather_call[user_id] = datetime.now()
+    preferences = await db.aget(user_id)
 
     try:
         if not city:
@@ -240,17 +362,11 @@ async def weather(ctx, *, city: str = None):
         await ctx.send(f"Error fetching weather: {str(e)}")
 
 @bot.command(name="crypto")
+@rate_limited("crypto")
 async def crypto(ctx, symbol: str = None):
     """Get current cryptocurrency price"""
     user_id = ctx.author.id
-    preferences = db.get_user_preferences(user_id)
-    
-    # Check rate limit
-    last_call = ctx.bot.last_crypto_call.get(user_id)
-    if last_call and (datetime.now() - last_call).total_seconds() < RATE_LIMITS['crypto']:
-        await ctx.send("Please wait a moment before requesting crypto prices again.")
-        return
-    ctx.bot.last_crypto_call[user_id] = datetime.now()
+    preferences = await db.aget(user_id)
 
     try:
         if not symbol:
@@ -272,7 +388,7 @@ async def crypto(ctx, symbol: str = None):
         # Log command usage
         analytics.log_command("crypto", user_id)
 
-    except CryptoAPIError as e:
+    except (CryptoAPIError, QuotaExceeded) as e:
         analytics.log_error("crypto", str(e), user_id)
         await ctx.send(f"Couldn't get a price for `{symbol}`: {e}")
     except Exception as e:
@@ -281,62 +397,22 @@ async def crypto(ctx, symbol: str = None):
         await ctx.send(f"Error fetching crypto data: {str(e)}")
 
 @bot.command(name="dailybrief")
+@rate_limited("dailybrief")
 async def dailybrief(ctx):
     """Get a comprehensive daily update with news, weather, and crypto"""
     user_id = ctx.author.id
-    preferences = db.get_user_preferences(user_id)
-    
-    # Check rate limit
-    last_call = ctx.bot.last_dailybrief_call.get(user_id)
-    if last_call and (datetime.now() - last_call).total_seconds() < RATE_LIMITS['dailybrief']:
-        await ctx.send("Please wait a few minutes before requesting another daily brief.")
-        return
-    ctx.bot.last_dailybrief_call[user_id] = datetime.now()
+    preferences = await db.aget(user_id)
 
     try:
-        # Get news
-        sources = preferences.get('preferred_sources')
-        if sources and sources != "all":
-            embeds, _ = await news_api.get_article_by_source(sources)
-        else:
-            embeds, _ = await news_api.get_top_headlines()
-            
-        if embeds:
-            await ctx.send("📰 **Top News:**")
-            for embed in embeds[:5]:  # Limit to top 5 articles
-                await ctx.send(embed=embed)
-        else:
-            await ctx.send("No news articles available at the moment.")
-        
-        # Get weather
-        city = preferences.get('preferred_location', DEFAULT_CITY)
-        weather_data = await weather_api.get_current_weather(city)
-        weather_embed = Embed(
-            title=f"Weather in {city}",
-            color=discord.Color.blue()
+        brief = await brief_snapshots.get(
+            preferences.get('preferred_sources'),
+            preferences.get('preferred_location', DEFAULT_CITY),
+            preferences.get('preferred_crypto', DEFAULT_CRYPTO)
         )
-        weather_embed.add_field(name="Temperature", value=f"{weather_data['temperature']}°F", inline=True)
-        weather_embed.add_field(name="Description", value=weather_data['description'], inline=True)
-        await ctx.send("🌤 **Weather Update:**", embed=weather_embed)
-        
-        # Get crypto (always BTC)
-        btc_data = await crypto_api.get_price('btc')
-        if btc_data and isinstance(btc_data, dict):
-            logger.info(f"Crypto data for BTC: {btc_data}")
-            price = btc_data.get('price')
-            change = btc_data.get('change_24h')
-            if price is not None and change is not None:
-                crypto_embed = Embed(
-                    title="BTC Price",
-                    color=discord.Color.gold()
-                )
-                crypto_embed.add_field(name="Price", value=f"${price:,.2f}", inline=True)
-                crypto_embed.add_field(name="24h Change", value=f"{change:.2f}%", inline=True)
-                await ctx.send("💰 **Crypto Update:**", embed=crypto_embed)
-            else:
-                await ctx.send(f"Unable to fetch full BTC price data (missing 'price' or 'change_24h'). Raw data: {btc_data}")
-        else:
-            await ctx.send(f"Unable to fetch BTC price data at the moment. Raw data: {btc_data}")
+        await send_brief(ctx, brief, "☀️ Here's your Daily Brief:")
+        logger.info(f"Daily brief for user {user_id} (built {brief.age():.0f}s ago: {brief.timing_summary()})")
+        for source, error in brief.errors.items():
+            analytics.log_error("dailybrief", f"{source}: {error}", user_id)
         
         # Log command usage
         analytics.log_command("dailybrief", user_id)
@@ -361,12 +437,83 @@ async def stats(ctx):
         embed.add_field(name="Total Commands Used", value=str(report['total_commands']), inline=True)
         embed.add_field(name="Total Errors", value=str(report['total_errors']), inline=True)
         embed.add_field(name="Active Users", value=str(report['user_count']), inline=True)
+
+        for label, window in (("Last 24h", report['last_24h']), ("Last 7 Days", report['last_7d'])):
+            embed.add_field(
+                name=label,
+                value=f"{window['commands']} commands, {window['errors']} errors, {window['unique_users']} users",
+                inline=True
+            )
         
         top_commands = "\n".join([f"{cmd}: {count}" for cmd, count in report['top_commands'].items()])
         embed.add_field(name="Top Commands", value=top_commands, inline=False)
         
         error_rates = "\n".join([f"{cmd}: {rate}" for cmd, rate in report['error_rates'].items()])
         embed.add_field(name="Error Rates", value=error_rates, inline=False)
+
+        cache_lines = []
+        for name, cache_stats in (
+            ("News", news_api.cache_stats()),
+            ("Weather", weather_api.cache_stats()),
+            ("Crypto", crypto_api.quotes.stats()),
+        ):
+            cache_lines.append(
+                f"{name}: {cache_stats['hit_rate']:.1f}% hit rate "
+                f"({cache_stats['hits']} hits, {cache_stats['stale_hits']} stale, "
+                f"{cache_stats['fallback_hits']} fallback, {cache_stats['misses']} misses, "
+                f"{cache_stats['entries']} entries)"
+            )
+        embed.add_field(name="Response Caches", value="\n".join(cache_lines), inline=False)
+
+        quota_lines = []
+        for name, quota in (("News", news_api.quota), ("Weather", weather_api.quota), ("Crypto", crypto_api.quota)):
+            q = quota.stats()
+            budget = [f"{q['minute_left']:.0f}/min" if q['minute_left'] is not None else None,
+                      f"{q['day_left']}/day" if q['day_left'] is not None else None]
+            left = ", ".join(b for b in budget if b) or "unlimited"
+            quota_lines.append(
+                f"{name}: circuit {q['state']}, {left} left, {q['requests']} sent, {q['rejected']} refused"
+                + (" (serving cache)" if q['conserving'] else "")
+            )
+        embed.add_field(name="Upstream Quotas", value="\n".join(quota_lines), inline=False)
+
+        def fmt_ms(seconds):
+            return "n/a" if seconds is None else f"{seconds * 1000:.0f}ms"
+
+        latency_lines = [
+            f"!{name}: p50 {fmt_ms(q['p50'])}, p99 {fmt_ms(q['p99'])} ({q['count']})"
+            for name, q in sorted(metrics.summarize(COMMAND_LATENCY, "command").items())
+        ]
+        latency_lines += [
+            f"{host}: p50 {fmt_ms(q['p50'])}, p99 {fmt_ms(q['p99'])} ({q['count']})"
+            for host, q in sorted(metrics.summarize(UPSTREAM_LATENCY, "api").items())
+        ]
+        latency_lines.append(f"Event loop lag p99: {fmt_ms(LOOP_LAG.labels().quantile(0.99))}")
+        embed.add_field(name="Latency", value="\n".join(latency_lines), inline=False)
+
+        news_flight = news_api.coalescing_stats()
+        busiest = sorted(news_flight['per_key'].items(), key=lambda x: x[1], reverse=True)[:3]
+        coalesced_lines = [f"{news_flight['coalesced']} requests shared {news_flight['executed']} upstream calls"]
+        coalesced_lines += [f"{key.rsplit('/', 1)[-1][:80]}: {count}" for key, count in busiest]
+        embed.add_field(name="News Request Coalescing", value="\n".join(coalesced_lines), inline=False)
+
+        snapshot_stats = brief_snapshots.stats()
+        embed.add_field(
+            name="Brief Snapshots",
+            value=f"{snapshot_stats['hits']} served from snapshot, {snapshot_stats['builds']} builds, "
+                  f"{snapshot_stats['tracked']} preference combinations",
+            inline=False
+        )
+
+        last_delivery = brief_delivery.stats()
+        if last_delivery:
+            outcomes = ", ".join(f"{count} {status}" for status, count in last_delivery['outcomes'].items()) or "nothing sent"
+            embed.add_field(
+                name="Last Brief Delivery",
+                value=f"{last_delivery['subscribers']} subscribers in {last_delivery['groups']} groups: {outcomes} "
+                      f"({last_delivery['seconds']:.0f}s at {last_delivery['rate']:.1f} req/s)",
+                inline=False
+            )
         
         await ctx.send(embed=embed)
         
@@ -379,11 +526,13 @@ async def set_preferences(ctx):
     """Configure your daily brief preferences"""
     user_id = ctx.author.id
     
+    preferences = await db.aget(user_id)
+
     class PreferencesView(View):
         def __init__(self):
             super().__init__(timeout=300)
             self.user_id = user_id
-            self.preferences = db.get_user_preferences(user_id)
+            self.preferences = preferences
 
         @discord.ui.select(
             placeholder="Select your preferred news sources",
@@ -398,7 +547,7 @@ async def set_preferences(ctx):
         async def select_sources(self, interaction: discord.Interaction, select: Select):
             # Store the first selected value directly, not as JSON
             self.preferences['preferred_sources'] = select.values[0]
-            db.set_user_preferences(self.user_id, self.preferences)
+            await db.aset(self.user_id, self.preferences)
             await interaction.response.send_message("News sources updated!", ephemeral=True)
 
         @discord.ui.select(
@@ -412,7 +561,7 @@ async def set_preferences(ctx):
         )
         async def select_crypto(self, interaction: discord.Interaction, select: Select):
             self.preferences['preferred_crypto'] = select.values[0]
-            db.set_user_preferences(self.user_id, self.preferences)
+            await db.aset(self.user_id, self.preferences)
             await interaction.response.send_message("Crypto preference updated!", ephemeral=True)
 
         @discord.ui.select(
@@ -433,13 +582,13 @@ async def set_preferences(ctx):
                                           check=lambda m: m.author == ctx.author,
                                           timeout=30)
                     self.preferences['preferred_location'] = msg.content
-                    db.set_user_preferences(self.user_id, self.preferences)
+                    await db.aset(self.user_id, self.preferences)
                     await msg.reply("Location preference updated!")
                 except asyncio.TimeoutError:
                     await interaction.followup.send("Timeout! Please try again.")
             else:
                 self.preferences['preferred_location'] = select.values[0]
-                db.set_user_preferences(self.user_id, self.preferences)
+                await db.aset(self.user_id, self.preferences)
                 await interaction.response.send_message("Location preference updated!", ephemeral=True)
 
     view = PreferencesView()
@@ -454,36 +603,91 @@ async def set_preferences(ctx):
 async def toggle_daily_brief(ctx):
     """Toggle daily brief notifications"""
     user_id = ctx.author.id
-    current_status = db.get_user_preferences(user_id).get('brief_enabled', True)
-    new_status = not current_status
-    db.toggle_daily_brief(user_id, new_status)
-    
-    status_text = "enabled" if new_status else "disabled"
-    await ctx.send(f"Daily brief notifications have been {status_text}.")
+    preferences = await db.aget(user_id)
+    preferences['brief_enabled'] = not preferences.get('brief_enabled', False)
+    await db.aset(user_id, preferences)
+
+    try:
+        job = schedule_user_brief(user_id, preferences)
+    except ValueError as e:
+        logger.warning(f"Bad brief schedule for user {user_id}: {e}")
+        job = None
+    if job is not None:
+        await ctx.send(
+            f"Daily brief notifications have been enabled. Next one: {format_fire_time(job)}. "
+            "Use `!briefschedule` to change when they arrive."
+        )
+    else:
+        await ctx.send("Daily brief notifications have been disabled.")
+
+@bot.command(name="briefschedule")
+async def brief_schedule(ctx, timezone: str = None, *times: str):
+    """Set the timezone and times for your scheduled daily brief"""
+    user_id = ctx.author.id
+    preferences = await db.aget(user_id)
+
+    if timezone is None:
+        current_tz = preferences.get('timezone') or BRIEF_TIMEZONE or "server local time"
+        current_times = ", ".join(preferences.get('brief_times') or BRIEF_SLOTS)
+        await ctx.send(f"Your daily brief is scheduled for {current_times} ({current_tz}).")
+        return
+
+    try:
+        parse_timezone(timezone)
+        brief_times = list(parse_times(times)) if times else None
+    except ValueError as e:
+        await ctx.send(f"{e}. Example: `!briefschedule America/New_York 07:30 18:00`")
+        return
+
+    preferences['timezone'] = timezone
+    if brief_times:
+        preferences['brief_times'] = brief_times
+    await db.aset(user_id, preferences)
+    job = schedule_user_brief(user_id, preferences)
+    analytics.log_preference(user_id, "timezone", timezone)
+
+    message = f"Daily brief times set to {', '.join(preferences.get('brief_times') or BRIEF_SLOTS)} ({timezone})."
+    if job is not None:
+        message += f" Next one: {format_fire_time(job)}."
+    else:
+        message += " Use `!togglebrief` to start receiving them."
+    await ctx.send(message)
+
+def format_fire_time(job: Job) -> str:
+    return job.local_fire_time().strftime("%a %H:%M %Z").strip()
 
 class NewsPagination(discord.ui.View):
-    def __init__(self, embeds: List[discord.Embed], timeout: int = 180):
+    def __init__(self, feed: NewsFeed, timeout: int = 180):
         super().__init__(timeout=timeout)
-        self.embeds = embeds
-        self.current_page = 0
-        self.total_pages = len(embeds)
+        self.feed = feed
         
         # Update button states
         self.update_buttons()
+
+    def current_embed(self) -> discord.Embed:
+        """Embed for the current article (each article renders its embed once, on first view)"""
+        return self.feed.current.embed()
+
+    def status(self) -> str:
+        return f"Article {self.feed.position} of {self.feed.total}. Use the buttons to navigate."
     
     def update_buttons(self):
-        """Update button states based on current page"""
-        self.previous_button.disabled = self.current_page == 0
-        self.next_button.disabled = self.current_page == self.total_pages - 1
+        """Update button states based on the feed's position"""
+        self.previous_button.disabled = not self.feed.has_previous()
+        self.next_button.disabled = not self.feed.has_next()
+
+    async def on_timeout(self):
+        self.feed.close()
     
     @discord.ui.button(label="Previous", style=ButtonStyle.primary)
     async def previous_button(self, interaction: discord.Interaction, button: discord.ui.Button):
         try:
             await interaction.response.defer()
-            if self.current_page > 0:
-                self.current_page -= 1
+            if await self.feed.previous():
                 self.update_buttons()
-                await interaction.message.edit(embed=self.embeds[self.current_page], view=self)
+                await interaction.message.edit(content=self.status(), embed=self.current_embed(), view=self)
+        except (NewsAPIError, QuotaExceeded) as e:
+            await interaction.followup.send(f"Couldn't load more news: {e}", ephemeral=True)
         except Exception as e:
             logger.error(f"Error in previous button: {e}")
             await interaction.followup.send("Failed to load previous article. Please try again.", ephemeral=True)
@@ -492,10 +696,14 @@ class NewsPagination(discord.ui.View):
     async def next_button(self, interaction: discord.Interaction, button: discord.ui.Button):
         try:
             await interaction.response.defer()
-            if self.current_page < self.total_pages - 1:
-                self.current_page += 1
-                self.update_buttons()
-                await interaction.message.edit(embed=self.embeds[self.current_page], view=self)
+            moved = await self.feed.next()
+            self.update_buttons()
+            if moved:
+                await interaction.message.edit(content=self.status(), embed=self.current_embed(), view=self)
+            else:
+                await interaction.message.edit(view=self)
+        except (NewsAPIError, QuotaExceeded) as e:
+            await interaction.followup.send(f"Couldn't load more news: {e}", ephemeral=True)
         except Exception as e:
             logger.error(f"Error in next button: {e}")
             await interaction.followup.send("Failed to load next article. Please try again.", ephemeral=True)
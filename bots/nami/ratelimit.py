@@ -0,0 +1,232 @@
+"""
+Rate limiting primitives: an awaitable TokenBucket for pacing our own
+outbound work, and a RateLimiter that decides whether a user, guild or the
+whole bot may run a command right now.
+
+RateLimiter rules come from a {name: spec} dict (RATE_LIMITS in each bot).
+A spec is either a number of seconds (one call per user per N seconds) or
+a comma-separated string of rules like "1/10s user, 20/60s guild window,
+100/60s global": COUNT/SECONDS, a scope (user, guild or global) and an
+optional policy (bucket, the default, or window for a sliding window).
+Any spec can be overridden with a RATE_LIMIT_<NAME> environment variable.
+"""
+
+import asyncio
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple, Union
+
+from metrics import REGISTRY
+
+MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", 100_000))  # (rule, user/guild) states kept before evicting the least recent
+
+RATE_LIMITED = REGISTRY.counter(
+    "bot_rate_limited_total", "Commands rejected by a rate limit", ("limit", "scope")
+)
+
+
+class TokenBucket:
+    """
+    Classic token bucket: holds up to `capacity` tokens, refilled at `rate`
+    tokens per second. acquire() waits until a token is available, which
+    spreads bursts out to the configured rate.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def try_acquire(self, tokens: float = 1) -> bool:
+        """Take tokens if available right now"""
+        self._refill(time.monotonic())
+        if self.tokens >= tokens:
+            self.tokens -= tokens
+            return True
+        return False
+
+    def retry_after(self, tokens: float = 1) -> float:
+        """Seconds until `tokens` will be available"""
+        self._refill(time.monotonic())
+        return max(0.0, (tokens - self.tokens) / self.rate)
+
+    async def acquire(self, tokens: float = 1):
+        """Wait until tokens are available, then take them (waiters are served in order)"""
+        async with self._lock:
+            while not self.try_acquire(tokens):
+                await asyncio.sleep(self.retry_after(tokens))
+
+
+class TokenBucketPolicy:
+    """`capacity` calls at once, refilled at capacity/period per second; state is [tokens, updated_at]"""
+    __slots__ = ("capacity", "rate")
+
+    def __init__(self, capacity: int, period: float):
+        self.capacity = capacity
+        self.rate = capacity / period
+
+    def new_state(self, now: float) -> list:
+        return [float(self.capacity), now]
+
+    def idle_ttl(self) -> float:
+        """After this long untouched, a state is indistinguishable from a new one"""
+        return self.capacity / self.rate
+
+    def _refill(self, state: list, now: float):
+        state[0] = min(self.capacity, state[0] + (now - state[1]) * self.rate)
+        state[1] = now
+
+    def retry_after(self, state: list, now: float) -> float:
+        self._refill(state, now)
+        return 0.0 if state[0] >= 1 else (1 - state[0]) / self.rate
+
+    def consume(self, state: list, now: float):
+        self._refill(state, now)
+        state[0] -= 1
+
+
+class SlidingWindowPolicy:
+    """
+    At most `limit` calls in any `window` seconds, estimated from the current and
+    previous fixed windows so each check is O(1); state is [window index, current, previous]
+    """
+    __slots__ = ("limit", "window")
+
+    def __init__(self, limit: int, window: float):
+        self.limit = limit
+        self.window = window
+
+    def new_state(self, now: float) -> list:
+        return [int(now // self.window), 0, 0]
+
+    def idle_ttl(self) -> float:
+        return 2 * self.window
+
+    def _roll(self, state: list, now: float):
+        index = int(now // self.window)
+        if index != state[0]:
+            state[2] = state[1] if index - state[0] == 1 else 0
+            state[1] = 0
+            state[0] = index
+
+    def retry_after(self, state: list, now: float) -> float:
+        self._roll(state, now)
+        index, current, previous = state
+        start = index * self.window
+        elapsed = (now - start) / self.window
+        if previous * (1 - elapsed) + current + 1 <= self.limit:
+            return 0.0
+        if current + 1 > self.limit:
+            # Full even without the previous window: wait for this one to roll over and decay
+            return start + self.window * (2 - (self.limit - 1) / current) - now
+        # Wait until the previous window's weight has decayed enough
+        return start + self.window * (1 - (self.limit - current - 1) / previous) - now
+
+    def consume(self, state: list, now: float):
+        self._roll(state, now)
+        state[1] += 1
+
+    def used(self, state: list, now: float) -> float:
+        """Estimated calls made in the last `window` seconds"""
+        self._roll(state, now)
+        index, current, previous = state
+        return previous * (1 - (now - index * self.window) / self.window) + current
+
+
+Policy = Union[TokenBucketPolicy, SlidingWindowPolicy]
+SCOPES = ("user", "guild", "global")
+_RULE = re.compile(r"^(\d+)\s*/\s*(\d+(?:\.\d+)?)\s*s?\s+(user|guild|global)(?:\s+(bucket|window))?$")
+
+
+class Rule:
+    __slots__ = ("scope", "policy")
+
+    def __init__(self, scope: str, policy: Policy):
+        self.scope = scope
+        self.policy = policy
+
+
+def parse_limits(spec: Union[int, float, str]) -> List[Rule]:
+    """Parse a RATE_LIMITS value (see module docstring) into rules"""
+    if isinstance(spec, (int, float)):
+        return [Rule("user", TokenBucketPolicy(1, float(spec)))] if spec > 0 else []
+    rules = []
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        match = _RULE.match(part.lower())
+        if match is None:
+            raise ValueError(f"Invalid rate limit rule: {part!r} (expected e.g. '1/10s user' or '20/60s guild window')")
+        count, seconds, scope, kind = int(match[1]), float(match[2]), match[3], match[4]
+        policy = SlidingWindowPolicy(count, seconds) if kind == "window" else TokenBucketPolicy(count, seconds)
+        rules.append(Rule(scope, policy))
+    return rules
+
+
+class RateLimiter:
+    """
+    Checks every rule of a named limit in O(1) and only consumes if all pass,
+    so a call rejected by the guild limit doesn't also use up the user's.
+    State lives in one LRU dict bounded by max_keys; idle entries are dropped
+    once they'd be back at full allowance anyway.
+    """
+
+    def __init__(self, config: Dict[str, Union[int, float, str]], max_keys: int = MAX_KEYS):
+        self.rules: Dict[str, List[Rule]] = {
+            name: parse_limits(os.getenv(f"RATE_LIMIT_{name.upper()}", spec)) for name, spec in config.items()
+        }
+        self.max_keys = max_keys
+        # (name, rule index, scope id) -> [expires_at, policy state]
+        self._states: "OrderedDict[Tuple, list]" = OrderedDict()
+
+    def _state(self, key: Tuple, policy: Policy, now: float) -> list:
+        entry = self._states.get(key)
+        if entry is None or entry[0] <= now:
+            entry = self._states[key] = [0.0, policy.new_state(now)]
+        else:
+            self._states.move_to_end(key)
+        entry[0] = now + policy.idle_ttl()
+        # Oldest entries first: drop a couple of expired ones per call, and anything over the cap
+        for _ in range(2):
+            oldest = next(iter(self._states.values()))
+            if oldest[0] > now:
+                break
+            self._states.popitem(last=False)
+        while len(self._states) > self.max_keys:
+            self._states.popitem(last=False)
+        return entry[1]
+
+    def hit(self, name: str, user: Optional[int] = None, guild: Optional[int] = None) -> float:
+        """Record a call if every rule allows it and return 0, else return seconds until it would be allowed"""
+        rules = self.rules.get(name)
+        if not rules:
+            return 0.0
+        now = time.monotonic()
+        ids = {"user": user, "guild": guild, "global": "*"}
+        checked = []
+        wait = 0.0
+        blocked_scope = None
+        for index, rule in enumerate(rules):
+            scope_id = ids[rule.scope]
+            if scope_id is None:
+                continue  # e.g. a guild rule for a command sent in DMs
+            state = self._state((name, index, scope_id), rule.policy, now)
+            retry_after = rule.policy.retry_after(state, now)
+            if retry_after > wait:
+                wait, blocked_scope = retry_after, rule.scope
+            checked.append((rule.policy, state))
+        if wait > 0:
+            RATE_LIMITED.labels(limit=name, scope=blocked_scope).inc()
+            return wait
+        for policy, state in checked:
+            policy.consume(state, now)
+        return 0.0
+
+    def __len__(self):
+        return len(self._states)
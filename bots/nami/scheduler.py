@@ -0,0 +1,313 @@
+"""
+Heap-based job scheduler: sleeps until the earliest due job instead of polling.
+
+Jobs either fire once at a fixed time or recur daily at "HH:MM" times in an
+IANA timezone (None means the server's local time). Next fire times are always
+computed from the scheduled time, so a late or slow run never shifts later
+ones. Jobs persist to SQLite; after a restart, slots missed within
+CATCHUP_WINDOW fire once immediately and older ones are skipped.
+
+Handlers are registered per job kind and receive every job of that kind that
+came due together, so callers can batch work for many users in one go.
+"""
+
+import asyncio
+import heapq
+import itertools
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, time as dtime, timedelta
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+logger = logging.getLogger(__name__)
+
+CATCHUP_WINDOW = float(os.getenv("SCHEDULER_CATCHUP_WINDOW", 3600))  # seconds; older missed slots are skipped
+MAX_SLEEP = 3600  # re-check at least hourly in case the wall clock was adjusted
+
+
+def parse_timezone(name: Optional[str]) -> Optional[ZoneInfo]:
+    """ZoneInfo for an IANA name like "Europe/Paris"; None/"" means server local time"""
+    if not name:
+        return None
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise ValueError(f"Unknown timezone: {name}")
+
+
+def parse_times(times: Iterable[str]) -> Tuple[str, ...]:
+    """Validate and normalize "H:MM" strings into a sorted tuple of "HH:MM" """
+    parsed = set()
+    for value in times:
+        try:
+            hour, minute = map(int, value.strip().split(":"))
+            parsed.add(dtime(hour, minute).strftime("%H:%M"))
+        except ValueError:
+            raise ValueError(f"Invalid time (expected HH:MM): {value}")
+    return tuple(sorted(parsed))
+
+
+def next_daily(times: Iterable[str], tz: Optional[str], after: float) -> Optional[float]:
+    """Earliest epoch timestamp strictly after `after` that falls on one of `times` in timezone `tz`"""
+    zone = parse_timezone(tz)
+    clock = [tuple(map(int, t.split(":"))) for t in times]
+    if not clock:
+        return None
+    today = datetime.fromtimestamp(after, zone).date()
+    for offset in range(3):
+        day = today + timedelta(days=offset)
+        candidates = [
+            datetime.combine(day, dtime(hour, minute), tzinfo=zone).timestamp() for hour, minute in clock
+        ]
+        upcoming = [ts for ts in candidates if ts > after]
+        if upcoming:
+            return min(upcoming)
+    return None
+
+
+class Job:
+    """One scheduled job; `times` empty means a one-shot at fire_at"""
+    __slots__ = ("id", "kind", "payload", "times", "tz", "fire_at", "seq")
+
+    def __init__(self, id: str, kind: str, payload: Optional[Dict] = None, times: Iterable[str] = (),
+                 tz: Optional[str] = None, fire_at: Optional[float] = None):
+        self.id = id
+        self.kind = kind
+        self.payload = payload or {}
+        self.times = parse_times(times)
+        self.tz = tz or None
+        parse_timezone(self.tz)
+        if fire_at is None:
+            fire_at = next_daily(self.times, self.tz, time.time())
+            if fire_at is None:
+                raise ValueError("A job needs either fire_at or recurring times")
+        self.fire_at = fire_at
+        self.seq = 0
+
+    def next_after(self, after: float) -> Optional[float]:
+        """Next fire time for a recurring job, None for one-shots"""
+        return next_daily(self.times, self.tz, after) if self.times else None
+
+    def local_fire_time(self) -> datetime:
+        return datetime.fromtimestamp(self.fire_at, parse_timezone(self.tz))
+
+
+Handler = Callable[[List[Job]], Awaitable[None]]
+
+
+class Scheduler:
+    def __init__(self, db_path: Optional[str] = None, catchup: float = CATCHUP_WINDOW):
+        self.catchup = catchup
+        self._jobs: Dict[str, Job] = {}
+        # (fire_at, seq, job id); entries whose seq no longer matches the job are stale and skipped
+        self._heap: List[Tuple[float, int, str]] = []
+        self._counter = itertools.count(1)
+        self._handlers: Dict[str, Handler] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._running = set()
+        # Persistence: job id -> Job to upsert, or None to delete
+        self._dirty: Dict[str, Optional[Job]] = {}
+        self._lock = threading.Lock()
+        self._conn = None
+        if db_path:
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+            self._conn = sqlite3.connect(str(db_path), check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS scheduled_jobs (
+                    id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    times TEXT NOT NULL,
+                    tz TEXT,
+                    fire_at REAL NOT NULL
+                )"""
+            )
+            self._conn.commit()
+            self._load()
+
+    def _load(self):
+        """Restore persisted jobs, catching up on slots missed while we were down"""
+        now = time.time()
+        with self._lock:
+            rows = self._conn.execute("SELECT id, kind, payload, times, tz, fire_at FROM scheduled_jobs").fetchall()
+        caught_up = skipped = 0
+        for job_id, kind, payload, times, tz, fire_at in rows:
+            try:
+                job = Job(job_id, kind, json.loads(payload), json.loads(times), tz, fire_at)
+            except ValueError as e:
+                logger.warning(f"Dropping unreadable scheduled job {job_id}: {e}")
+                self._dirty[job_id] = None
+                continue
+            if job.fire_at < now - self.catchup:
+                next_fire = job.next_after(now)
+                if next_fire is None:
+                    self._dirty[job_id] = None
+                    skipped += 1
+                    continue
+                job.fire_at = next_fire
+                self._dirty[job_id] = job
+                skipped += 1
+            elif job.fire_at <= now:
+                caught_up += 1
+            self._push(job)
+        logger.info(f"Loaded {len(self._jobs)} scheduled jobs ({caught_up} missed slots to catch up, {skipped} too old)")
+
+    def register(self, kind: str, handler: Handler):
+        """Call handler(jobs) with all jobs of this kind that come due at once"""
+        self._handlers[kind] = handler
+
+    def _push(self, job: Job):
+        job.seq = next(self._counter)
+        self._jobs[job.id] = job
+        heapq.heappush(self._heap, (job.fire_at, job.seq, job.id))
+
+    def _poke(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def add(self, job: Job) -> Job:
+        """Add or replace a job; an unchanged recurring schedule keeps its pending fire time"""
+        existing = self._jobs.get(job.id)
+        if existing is not None and existing.times and existing.times == job.times and existing.tz == job.tz:
+            if existing.payload != job.payload:
+                existing.payload = job.payload
+                self._dirty[job.id] = existing
+            return existing
+        self._push(job)
+        self._dirty[job.id] = job
+        self._poke()
+        return job
+
+    def remove(self, job_id: str) -> bool:
+        job = self._jobs.pop(job_id, None)
+        if job is None:
+            return False
+        self._dirty[job_id] = None
+        self._poke()
+        return True
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def jobs(self, kind: Optional[str] = None) -> List[Job]:
+        """Jobs in fire order"""
+        return sorted((j for j in self._jobs.values() if kind is None or j.kind == kind), key=lambda j: j.fire_at)
+
+    def __len__(self):
+        return len(self._jobs)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    def _pop_due(self, now: float) -> List[Job]:
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            _, seq, job_id = heapq.heappop(self._heap)
+            job = self._jobs.get(job_id)
+            if job is None or job.seq != seq:
+                continue  # removed or rescheduled since this entry was pushed
+            due.append(job)
+        return due
+
+    async def _run(self):
+        while True:
+            now = time.time()
+            due = self._pop_due(now)
+            by_kind: Dict[str, List[Job]] = defaultdict(list)
+            for job in due:
+                by_kind[job.kind].append(job)
+                # Next slot comes from the scheduled time, not from when this run finishes
+                next_fire = job.next_after(max(job.fire_at, now))
+                if next_fire is None:
+                    del self._jobs[job.id]
+                    self._dirty[job.id] = None
+                else:
+                    job.fire_at = next_fire
+                    self._push(job)
+                    self._dirty[job.id] = job
+            for kind, jobs in by_kind.items():
+                self._dispatch(kind, jobs)
+
+            await self.flush()
+
+            timeout = MAX_SLEEP
+            if self._heap:
+                timeout = min(MAX_SLEEP, max(0.0, self._heap[0][0] - time.time()))
+            # asyncio.timeout rather than wait_for: on 3.11 wait_for can swallow a
+            # cancel that lands just as the event is set, and aclose() would hang
+            try:
+                async with asyncio.timeout(timeout):
+                    await self._wakeup.wait()
+            except TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    def _dispatch(self, kind: str, jobs: List[Job]):
+        """Run the handler in its own task so a slow run never delays the next due job"""
+        handler = self._handlers.get(kind)
+        if handler is None:
+            logger.warning(f"No handler registered for {len(jobs)} due '{kind}' jobs")
+            return
+        task = asyncio.create_task(handler(jobs))
+        self._running.add(task)
+        task.add_done_callback(self._finished)
+
+    def _finished(self, task: asyncio.Task):
+        self._running.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Scheduled job handler failed: {task.exception()}")
+
+    def _write(self, changes: List[Tuple[str, Optional[Job]]]):
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "DELETE FROM scheduled_jobs WHERE id = ?", [(job_id,) for job_id, job in changes if job is None]
+            )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO scheduled_jobs (id, kind, payload, times, tz, fire_at) VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (job.id, job.kind, json.dumps(job.payload), json.dumps(job.times), job.tz, job.fire_at)
+                    for _, job in changes if job is not None
+                ],
+            )
+
+    async def flush(self):
+        """Persist every job change since the last flush in one transaction"""
+        if self._conn is None or not self._dirty:
+            self._dirty.clear()
+            return
+        changes, self._dirty = self._dirty, {}
+        try:
+            await asyncio.to_thread(self._write, list(changes.items()))
+        except sqlite3.Error as e:
+            logger.error(f"Error saving {len(changes)} scheduled jobs: {e}")
+            for job_id, job in changes.items():
+                self._dirty.setdefault(job_id, job)
+
+    async def aclose(self):
+        """Stop dispatching, cancel running handlers, save pending changes and close the database"""
+        for task in [self._task, *self._running]:
+            if task is not None:
+                task.cancel()
+        for task in [self._task, *self._running]:
+            if task is not None:
+                try:
+                    await task
+                except (asyncio.CancelledError, Exception):
+                    pass
+        self._task = None
+        self._running.clear()
+        await self.flush()
+        if self._conn is not None:
+            with self._lock:
+                self._conn.close()
+            self._conn = None
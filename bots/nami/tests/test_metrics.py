@@ -0,0 +1,43 @@
+import pytest
+
+from metrics import LATENCY_BUCKETS, Histogram, HistogramFamily
+
+
+def test_observe_uses_upper_inclusive_buckets():
+    hist = Histogram((0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 1.0, 5.0):
+        hist.observe(value)
+    # le="0.1" holds values <= 0.1, the last slot is +Inf
+    assert hist.counts == [2, 2, 1]
+    assert hist.count == 5
+    assert hist.sum == pytest.approx(6.65)
+
+
+def test_quantile_interpolates_within_the_bucket():
+    hist = Histogram((1.0, 2.0))
+    assert hist.quantile(0.5) is None
+    for _ in range(10):
+        hist.observe(1.5)
+    assert hist.quantile(0.5) == pytest.approx(1.5)
+    assert hist.quantile(1.0) == pytest.approx(2.0)
+
+
+def test_quantile_in_the_inf_bucket_reports_the_last_bound():
+    hist = Histogram((1.0,))
+    hist.observe(50.0)
+    assert hist.quantile(0.99) == 1.0
+
+
+def test_default_buckets_are_sorted():
+    assert list(LATENCY_BUCKETS) == sorted(LATENCY_BUCKETS)
+
+
+def test_render_is_cumulative():
+    family = HistogramFamily("test_seconds", "Test", ("op",), bounds=(0.1, 1.0))
+    family.labels(op="get").observe(0.05)
+    family.labels(op="get").observe(0.5)
+    lines = family.render()
+    assert 'test_seconds_bucket{op="get",le="0.1"} 1' in lines
+    assert 'test_seconds_bucket{op="get",le="1.0"} 2' in lines
+    assert 'test_seconds_bucket{op="get",le="+Inf"} 2' in lines
+    assert 'test_seconds_count{op="get"} 2' in lines
@@ -0,0 +1,59 @@
+import asyncio
+import time
+
+from db.preferences import PreferencesDB
+
+
+def _slow_writes(db, seconds=0.2):
+    write_many = db._write_many
+
+    def slow(items):
+        time.sleep(seconds)
+        write_many(items)
+
+    db._write_many = slow
+
+
+def test_cache_is_bounded(tmp_path):
+    async def run():
+        db = PreferencesDB(tmp_path / "p.sqlite3", cache_size=3)
+        for user_id in range(10):
+            await db.aset(user_id, {"preferred_city": str(user_id)})
+        assert len(db._cache) == 3
+        # Evicted users come back from the write queue or disk
+        assert (await db.aget(0))["preferred_city"] == "0"
+        await db.aclose()
+
+    asyncio.run(run())
+
+
+def test_evicted_user_is_read_from_the_write_in_flight(tmp_path):
+    async def run():
+        db = PreferencesDB(tmp_path / "p.sqlite3", cache_size=2)
+        _slow_writes(db)
+        await db.aset(1, {"brief_enabled": True})
+        flushing = asyncio.create_task(db.flush())
+        await asyncio.sleep(0.05)
+        for user_id in range(2, 6):
+            await db.aget(user_id)
+        assert "1" not in db._cache
+        assert await db.aget(1) == {"brief_enabled": True}
+        await flushing
+        await db.aclose()
+
+    asyncio.run(run())
+
+
+def test_subscribers_wait_for_the_flush_in_progress(tmp_path):
+    async def run():
+        db = PreferencesDB(tmp_path / "p.sqlite3")
+        _slow_writes(db)
+        await db.aset(1, {"brief_enabled": True})
+        await db.aset(2, {"brief_enabled": False})
+        flushing = asyncio.create_task(db.flush())
+        await asyncio.sleep(0.05)
+        assert list(await db.get_brief_subscribers()) == ["1"]
+        await flushing
+        await db.aclose()
+
+    asyncio.run(run())
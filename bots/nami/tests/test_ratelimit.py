@@ -0,0 +1,94 @@
+import random
+
+import pytest
+
+from ratelimit import RateLimiter, SlidingWindowPolicy, TokenBucketPolicy, parse_limits
+
+
+def test_sliding_window_allows_limit_calls_per_window():
+    policy = SlidingWindowPolicy(3, 10)
+    state = policy.new_state(0.0)
+    for now in (0.0, 1.0, 2.0):
+        assert policy.retry_after(state, now) == 0.0
+        policy.consume(state, now)
+    assert policy.retry_after(state, 2.0) > 0
+
+
+def test_sliding_window_weights_the_previous_window():
+    policy = SlidingWindowPolicy(10, 60)
+    state = policy.new_state(0.0)
+    for _ in range(10):
+        policy.consume(state, 50.0)
+    # A quarter into the next window, three quarters of the previous window still count
+    assert policy.used(state, 75.0) == pytest.approx(7.5)
+    assert policy.retry_after(state, 75.0) == 0.0
+    # Two windows later nothing carries over
+    assert policy.used(state, 190.0) == 0
+
+
+def test_sliding_window_retry_after_is_exact():
+    rng = random.Random(7)
+    for limit, window in ((1, 10.0), (3, 10.0), (5, 60.0), (20, 1.0)):
+        policy = SlidingWindowPolicy(limit, window)
+        state = policy.new_state(0.0)
+        now = 0.0
+        for _ in range(200):
+            now += rng.uniform(0, window / limit)
+            wait = policy.retry_after(state, now)
+            if wait > 1e-6:
+                assert policy.retry_after(list(state), now + wait - 1e-6) > 0
+            now += wait
+            assert policy.retry_after(state, now + 1e-9) == 0.0
+            policy.consume(state, now + 1e-9)
+            assert policy.used(state, now + 1e-9) <= limit + 1e-6
+
+
+def test_token_bucket_refills_at_rate():
+    policy = TokenBucketPolicy(2, 10)
+    state = policy.new_state(0.0)
+    policy.consume(state, 0.0)
+    policy.consume(state, 0.0)
+    assert policy.retry_after(state, 0.0) == pytest.approx(5.0)
+    assert policy.retry_after(state, 5.0) == 0.0
+
+
+def test_parse_limits_number_is_a_per_user_cooldown():
+    (rule,) = parse_limits(10)
+    assert rule.scope == "user"
+    assert isinstance(rule.policy, TokenBucketPolicy)
+    assert rule.policy.capacity == 1 and rule.policy.rate == pytest.approx(0.1)
+    assert parse_limits(0) == []
+
+
+def test_parse_limits_rules():
+    rules = parse_limits("1/10s user, 20 / 60 s GUILD window,100/60s global bucket,")
+    assert [r.scope for r in rules] == ["user", "guild", "global"]
+    assert isinstance(rules[0].policy, TokenBucketPolicy)
+    assert isinstance(rules[1].policy, SlidingWindowPolicy)
+    assert (rules[1].policy.limit, rules[1].policy.window) == (20, 60.0)
+    assert isinstance(rules[2].policy, TokenBucketPolicy)
+    assert parse_limits("") == []
+
+
+@pytest.mark.parametrize("spec", ["1/10s", "1/10s channel", "ten/10s user", "1/10s user sliding"])
+def test_parse_limits_rejects_bad_rules(spec):
+    with pytest.raises(ValueError, match="Invalid rate limit rule"):
+        parse_limits(spec)
+
+
+def test_rate_limiter_only_consumes_when_every_rule_passes(monkeypatch):
+    monkeypatch.delenv("RATE_LIMIT_CMD", raising=False)
+    limiter = RateLimiter({"cmd": "2/60s user, 1/60s guild"})
+    assert limiter.hit("cmd", user=1, guild=9) == 0.0
+    # The guild rule refuses, so user 1's second call isn't spent
+    assert limiter.hit("cmd", user=1, guild=9) > 0
+    # In DMs there's no guild, so only the user rule applies
+    assert limiter.hit("cmd", user=1) == 0.0
+    assert limiter.hit("cmd", user=1) > 0
+
+
+def test_rate_limiter_env_override(monkeypatch):
+    monkeypatch.setenv("RATE_LIMIT_CMD", "1/60s global")
+    limiter = RateLimiter({"cmd": 0})
+    assert limiter.hit("cmd", user=1) == 0.0
+    assert limiter.hit("cmd", user=2) > 0
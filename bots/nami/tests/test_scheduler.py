@@ -0,0 +1,116 @@
+import asyncio
+import time
+from datetime import datetime, timezone
+
+import pytest
+
+from scheduler import Job, Scheduler, next_daily, parse_times
+
+NEW_YORK = "America/New_York"
+
+
+def _utc(*args) -> float:
+    return datetime(*args, tzinfo=timezone.utc).timestamp()
+
+
+def test_parse_times_normalizes_and_sorts():
+    assert parse_times(["9:05", "07:30", "09:05"]) == ("07:30", "09:05")
+    with pytest.raises(ValueError):
+        parse_times(["25:00"])
+
+
+def test_next_daily_is_strictly_after():
+    # 2024-06-01 09:00 EDT is 13:00 UTC
+    slot = _utc(2024, 6, 1, 13, 0)
+    assert next_daily(["09:00"], NEW_YORK, slot - 1) == slot
+    assert next_daily(["09:00"], NEW_YORK, slot) == _utc(2024, 6, 2, 13, 0)
+    assert next_daily(["09:00", "18:00"], NEW_YORK, slot) == _utc(2024, 6, 1, 22, 0)
+    assert next_daily([], NEW_YORK, slot) is None
+
+
+def test_next_daily_keeps_wall_clock_time_across_dst():
+    # Clocks go forward on 2024-03-10 and back on 2024-11-03 in New York
+    saturday = _utc(2024, 3, 9, 14, 0)  # 09:00 EST
+    sunday = next_daily(["09:00"], NEW_YORK, saturday)
+    assert sunday == _utc(2024, 3, 10, 13, 0)  # 09:00 EDT
+    assert sunday - saturday == 23 * 3600
+
+    saturday = _utc(2024, 11, 2, 13, 0)  # 09:00 EDT
+    sunday = next_daily(["09:00"], NEW_YORK, saturday)
+    assert sunday == _utc(2024, 11, 3, 14, 0)  # 09:00 EST
+    assert sunday - saturday == 25 * 3600
+
+
+def test_next_daily_skipped_hour_fires_once_after_the_jump():
+    # 02:30 doesn't exist on 2024-03-10; it fires at the same instant as 03:30 EDT
+    fire = next_daily(["02:30"], NEW_YORK, _utc(2024, 3, 10, 5, 0))
+    assert fire == _utc(2024, 3, 10, 7, 30)
+    assert next_daily(["02:30"], NEW_YORK, fire) == _utc(2024, 3, 11, 6, 30)
+
+
+def test_next_daily_repeated_hour_fires_once():
+    # 01:30 happens twice on 2024-11-03: fire at the first one only
+    fire = next_daily(["01:30"], NEW_YORK, _utc(2024, 11, 3, 4, 0))
+    assert fire == _utc(2024, 11, 3, 5, 30)  # 01:30 EDT
+    assert next_daily(["01:30"], NEW_YORK, fire) == _utc(2024, 11, 4, 6, 30)  # next day, 01:30 EST
+
+
+def _save(path, jobs):
+    async def run():
+        s = Scheduler(str(path))
+        for job in jobs:
+            s.add(job)
+        await s.aclose()
+    asyncio.run(run())
+
+
+def test_catch_up_window_after_restart(tmp_path):
+    path = tmp_path / "schedule.sqlite3"
+    now = time.time()
+    _save(path, [
+        Job("recent", "brief", times=["09:00"], fire_at=now - 600),
+        Job("stale", "brief", times=["09:00"], fire_at=now - 7200),
+        Job("stale-once", "reminder", fire_at=now - 7200),
+        Job("recent-once", "reminder", fire_at=now - 60),
+    ])
+
+    s = Scheduler(str(path), catchup=3600)
+    try:
+        # Missed within the window: still due, fires once on start
+        assert s.get("recent").fire_at == pytest.approx(now - 600)
+        assert s.get("recent-once").fire_at == pytest.approx(now - 60)
+        # Older: recurring jobs skip ahead to their next slot, one-shots are dropped
+        assert s.get("stale").fire_at == next_daily(["09:00"], None, now)
+        assert s.get("stale-once") is None
+    finally:
+        asyncio.run(s.aclose())
+
+
+def test_missed_slots_fire_once_then_reschedule(tmp_path):
+    path = tmp_path / "schedule.sqlite3"
+    now = time.time()
+    _save(path, [Job("recent", "brief", times=["09:00"], fire_at=now - 600)])
+
+    async def run():
+        s = Scheduler(str(path), catchup=3600)
+        fired = []
+        done = asyncio.Event()
+
+        async def handler(jobs):
+            fired.extend(job.id for job in jobs)
+            done.set()
+
+        s.register("brief", handler)
+        s.start()
+        await asyncio.wait_for(done.wait(), 1)
+        await asyncio.sleep(0)
+        next_fire = s.get("recent").fire_at
+        await s.aclose()
+        return fired, next_fire
+
+    fired, next_fire = asyncio.run(run())
+    assert fired == ["recent"]
+    assert next_fire > now
+    reloaded = Scheduler(str(path))
+    assert reloaded.get("recent").fire_at == pytest.approx(next_fire)
+    asyncio.run(reloaded.aclose())
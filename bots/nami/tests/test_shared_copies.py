@@ -0,0 +1,23 @@
+"""The modules both bots share are copied into each build context and must stay identical"""
+
+import re
+from pathlib import Path
+
+import pytest
+
+BOTS = Path(__file__).resolve().parents[2]
+
+
+def _read(bot: str, name: str) -> str:
+    return (BOTS / bot / name).read_text(encoding="utf-8")
+
+
+@pytest.mark.parametrize("name", ["ratelimit.py", "scheduler.py", "metrics.py"])
+def test_copies_are_identical(name):
+    nami, robin = _read("nami", name), _read("robin", name)
+    if name == "metrics.py":
+        # Only the default port differs, so both bots can run on one host
+        port = re.compile(r'^(METRICS_PORT = int\(os\.getenv\("METRICS_PORT", )\d+(\)\).*)$', re.MULTILINE)
+        assert port.search(nami) and port.search(robin)
+        nami, robin = port.sub(r"\1PORT\2", nami), port.sub(r"\1PORT\2", robin)
+    assert nami == robin, f"bots/nami/{name} and bots/robin/{name} have diverged; copy the change to both"
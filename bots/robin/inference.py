@@ -0,0 +1,189 @@
+"""
+Bounded-concurrency scheduler in front of Ollama.
+
+At most `concurrency` generations run at once; everyone else waits in a queue
+that is fair across users: waiting users take turns round-robin, so one person
+firing off several questions can't push everybody else to the back. Waiters
+are told their position as it changes, and a waiter that is cancelled (say,
+because the user deleted their message) simply leaves the queue.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, Deque, Dict, Optional
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+OLLAMA_CONCURRENCY = int(os.getenv("OLLAMA_CONCURRENCY", 1))  # generations Ollama runs at once (match OLLAMA_NUM_PARALLEL)
+OLLAMA_MAX_QUEUE = int(os.getenv("OLLAMA_MAX_QUEUE", 50))  # waiting requests before new ones are turned away
+OLLAMA_MAX_PER_USER = int(os.getenv("OLLAMA_MAX_PER_USER", 3))  # queued + running requests per user
+
+QUEUE_WAIT = metrics.REGISTRY.histogram(
+    "bot_ollama_queue_wait_seconds", "Time requests spent queued for an Ollama slot", ("outcome",)
+)
+SLOT_TIME = metrics.REGISTRY.histogram(
+    "bot_ollama_slot_seconds", "Time requests held an Ollama slot (generation plus streaming to Discord)"
+)
+REJECTED = metrics.REGISTRY.counter(
+    "bot_ollama_queue_rejected_total", "Requests turned away because the queue was full", ("reason",)
+)
+
+PositionCallback = Callable[[int], Awaitable[None]]
+
+
+class QueueFull(Exception):
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class _Waiter:
+    __slots__ = ("user_id", "changed", "granted", "enqueued_at")
+
+    def __init__(self, user_id: int):
+        self.user_id = user_id
+        self.changed = asyncio.Event()  # set when granted or when the queue ahead moved
+        self.granted = False
+        self.enqueued_at = time.perf_counter()
+
+
+class InferenceScheduler:
+    def __init__(self, concurrency: int = OLLAMA_CONCURRENCY, max_queue: int = OLLAMA_MAX_QUEUE,
+                 max_per_user: int = OLLAMA_MAX_PER_USER):
+        self.concurrency = max(1, concurrency)
+        self.max_queue = max_queue
+        self.max_per_user = max_per_user
+        self.active = 0
+        self._active_by_user: Dict[int, int] = {}
+        # user id -> that user's waiters in arrival order; dict order is the round-robin turn order
+        self._queues: "OrderedDict[int, Deque[_Waiter]]" = OrderedDict()
+        metrics.REGISTRY.gauge_callback(
+            "bot_ollama_queue_depth", "Ollama requests running and waiting",
+            lambda: {("running",): self.active, ("waiting",): self.waiting}, ("state",),
+        )
+
+    @property
+    def waiting(self) -> int:
+        return sum(len(q) for q in self._queues.values())
+
+    def position(self, waiter: _Waiter) -> int:
+        """1-based place in line: how many grants happen before this waiter's, plus one"""
+        queue = self._queues.get(waiter.user_id)
+        if queue is None or waiter not in queue:
+            return 0
+        rank = queue.index(waiter)  # this user's rank-th turn
+        ahead = 0
+        before_us = True
+        for user_id, q in self._queues.items():
+            if user_id == waiter.user_id:
+                before_us = False
+                continue
+            # Each user gets one grant per round; users earlier in the turn order also get the round we're in
+            ahead += min(len(q), rank + 1 if before_us else rank)
+        return ahead + rank + 1
+
+    def check_capacity(self, user_id: int):
+        if self.waiting >= self.max_queue:
+            REJECTED.labels(reason="queue").inc()
+            raise QueueFull("queue")
+        mine = self._active_by_user.get(user_id, 0) + len(self._queues.get(user_id, ()))
+        if mine >= self.max_per_user:
+            REJECTED.labels(reason="user").inc()
+            raise QueueFull("user")
+
+    def _grant(self, user_id: int):
+        self.active += 1
+        self._active_by_user[user_id] = self._active_by_user.get(user_id, 0) + 1
+
+    def _release(self, user_id: int):
+        self.active -= 1
+        left = self._active_by_user.get(user_id, 1) - 1
+        if left:
+            self._active_by_user[user_id] = left
+        else:
+            self._active_by_user.pop(user_id, None)
+        self._dispatch()
+
+    def _dispatch(self):
+        """Hand free slots to the next users in turn, then tell everyone still waiting that the line moved"""
+        moved = False
+        while self.active < self.concurrency and self._queues:
+            user_id, queue = next(iter(self._queues.items()))
+            waiter = queue.popleft()
+            del self._queues[user_id]
+            if queue:
+                self._queues[user_id] = queue  # back of the turn order
+            waiter.granted = True
+            self._grant(user_id)
+            waiter.changed.set()
+            moved = True
+        if moved:
+            for queue in self._queues.values():
+                for waiter in queue:
+                    waiter.changed.set()
+
+    def _remove(self, waiter: _Waiter):
+        queue = self._queues.get(waiter.user_id)
+        if queue is None or waiter not in queue:
+            return
+        queue.remove(waiter)
+        if not queue:
+            del self._queues[waiter.user_id]
+        for queue in self._queues.values():
+            for other in queue:
+                other.changed.set()
+
+    @asynccontextmanager
+    async def slot(self, user_id: int, on_position: Optional[PositionCallback] = None,
+                   check_limits: bool = True) -> AsyncIterator[None]:
+        """
+        Hold one Ollama slot for the body of the block, queueing fairly until one is free.
+        on_position(n) is awaited whenever this request's place in line changes (not called
+        if a slot is free right away). Raises QueueFull instead of queueing past the limits;
+        check_limits=False is for follow-up work of a request that was already admitted.
+        """
+        if check_limits:
+            self.check_capacity(user_id)
+        if self.active < self.concurrency and not self._queues:
+            self._grant(user_id)
+            QUEUE_WAIT.labels(outcome="granted").observe(0.0)
+        else:
+            waiter = _Waiter(user_id)
+            self._queues.setdefault(user_id, deque()).append(waiter)
+            last_position = None
+            try:
+                while not waiter.granted:
+                    position = self.position(waiter)
+                    if on_position is not None and position != last_position:
+                        last_position = position
+                        try:
+                            await on_position(position)
+                        except Exception as e:
+                            logger.warning(f"Queue position callback failed: {e}")
+                    if waiter.granted:
+                        break
+                    waiter.changed.clear()
+                    await waiter.changed.wait()
+            except BaseException:
+                QUEUE_WAIT.labels(outcome="cancelled").observe(time.perf_counter() - waiter.enqueued_at)
+                if waiter.granted:
+                    self._release(user_id)  # granted just as we were cancelled: pass the slot on
+                else:
+                    self._remove(waiter)
+                raise
+            QUEUE_WAIT.labels(outcome="granted").observe(time.perf_counter() - waiter.enqueued_at)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            SLOT_TIME.labels().observe(time.perf_counter() - started)
+            self._release(user_id)
+
+    def stats(self) -> Dict:
+        return {"running": self.active, "waiting": self.waiting, "concurrency": self.concurrency}
@@ -0,0 +1,253 @@
+"""
+Lightweight in-process metrics: fixed-bucket latency histograms, counters and
+scrape-time gauges, exposed in Prometheus text format on a local /metrics endpoint.
+"""
+
+import asyncio
+import bisect
+import logging
+import os
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", 9101))  # 0 disables the endpoint
+LOOP_LAG_INTERVAL = 0.5  # seconds between event-loop lag probes
+
+# Upper bounds in seconds; an implicit +Inf bucket catches everything else
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+class Histogram:
+    """Fixed-bucket histogram; observe() is a bisect and two additions"""
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimate the q-quantile by interpolating within its bucket"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            if seen + bucket_count >= rank and bucket_count:
+                lower = self.bounds[i - 1] if i > 0 else 0.0
+                if i >= len(self.bounds):
+                    return lower  # +Inf bucket: best we can say is "at least the last bound"
+                upper = self.bounds[i]
+                return lower + (upper - lower) * ((rank - seen) / bucket_count)
+            seen += bucket_count
+        return self.bounds[-1]
+
+
+class _Family:
+    """A metric name with one child per label combination"""
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...], factory: Callable):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self._factory = factory
+        self.children: Dict[Tuple[str, ...], object] = {}
+
+    def labels(self, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        child = self.children.get(key)
+        if child is None:
+            child = self.children[key] = self._factory()
+        return child
+
+    def _label_str(self, key: Tuple[str, ...], extra: str = "") -> str:
+        parts = [f'{name}="{value}"' for name, value in zip(self.labelnames, key)]
+        if extra:
+            parts.append(extra)
+        return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class HistogramFamily(_Family):
+    def __init__(self, name, help_text, labelnames=(), bounds=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames, lambda: Histogram(bounds))
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of the with-block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.labels(**labels).observe(time.perf_counter() - start)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, hist in self.children.items():
+            cumulative = 0
+            for bound, bucket_count in zip(hist.bounds, hist.counts):
+                cumulative += bucket_count
+                le = 'le="%s"' % bound
+                lines.append(f"{self.name}_bucket{self._label_str(key, le)} {cumulative}")
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{self._label_str(key, le)} {hist.count}")
+            lines.append(f"{self.name}_sum{self._label_str(key)} {hist.sum}")
+            lines.append(f"{self.name}_count{self._label_str(key)} {hist.count}")
+        return lines
+
+
+class Counter:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+
+class CounterFamily(_Family):
+    def __init__(self, name, help_text, labelnames=()):
+        super().__init__(name, help_text, labelnames, Counter)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for key, counter in self.children.items():
+            lines.append(f"{self.name}{self._label_str(key)} {counter.value}")
+        return lines
+
+
+class GaugeCallback:
+    """Gauge whose values are read from a callback at scrape time: fn() -> {label values tuple: value}"""
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...], fn: Callable[[], Dict[Tuple, float]]):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self.fn = fn
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        try:
+            values = self.fn()
+        except Exception as e:
+            logger.warning(f"Metric {self.name} callback failed: {e}")
+            return lines
+        for key, value in values.items():
+            labels = ",".join(f'{name}="{v}"' for name, v in zip(self.labelnames, key))
+            lines.append(f"{self.name}{{{labels}}} {value}" if labels else f"{self.name} {value}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+
+    def _register(self, metric):
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+    def histogram(self, name: str, help_text: str, labelnames: Iterable[str] = (), bounds=LATENCY_BUCKETS) -> HistogramFamily:
+        return self._register(HistogramFamily(name, help_text, tuple(labelnames), bounds))
+
+    def counter(self, name: str, help_text: str, labelnames: Iterable[str] = ()) -> CounterFamily:
+        return self._register(CounterFamily(name, help_text, tuple(labelnames)))
+
+    def gauge_callback(self, name: str, help_text: str, fn, labelnames: Iterable[str] = ()) -> GaugeCallback:
+        return self._register(GaugeCallback(name, help_text, tuple(labelnames), fn))
+
+    def get(self, name: str):
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+COMMAND_LATENCY = REGISTRY.histogram(
+    "bot_command_duration_seconds", "Time spent handling a Discord command", ("command", "status")
+)
+UPSTREAM_LATENCY = REGISTRY.histogram(
+    "bot_upstream_request_duration_seconds", "Latency of outbound API requests", ("api", "status")
+)
+LOOP_LAG = REGISTRY.histogram(
+    "bot_event_loop_lag_seconds", "How late the event loop woke a sleeping probe"
+)
+
+
+async def _monitor_loop_lag():
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(LOOP_LAG_INTERVAL)
+        LOOP_LAG.labels().observe(max(0.0, time.perf_counter() - start - LOOP_LAG_INTERVAL))
+
+
+class MetricsServer:
+    """Serves REGISTRY on /metrics and runs the event-loop lag probe"""
+
+    def __init__(self, host: str = METRICS_HOST, port: int = METRICS_PORT):
+        self.host = host
+        self.port = port
+        self._runner: Optional[web.AppRunner] = None
+        self._lag_task: Optional[asyncio.Task] = None
+
+    async def _handle_metrics(self, request):
+        return web.Response(text=REGISTRY.render(), content_type="text/plain", charset="utf-8")
+
+    async def start(self):
+        self._lag_task = asyncio.create_task(_monitor_loop_lag())
+        if not self.port:
+            return
+        app = web.Application()
+        app.router.add_get("/metrics", self._handle_metrics)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        try:
+            await web.TCPSite(self._runner, self.host, self.port).start()
+            logger.info(f"Serving metrics on http://{self.host}:{self.port}/metrics")
+        except OSError as e:
+            logger.error(f"Could not start metrics endpoint on {self.host}:{self.port}: {e}")
+
+    async def stop(self):
+        if self._lag_task is not None:
+            self._lag_task.cancel()
+            self._lag_task = None
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+def summarize(family: HistogramFamily, label: str) -> Dict[str, Dict[str, float]]:
+    """Merge a histogram family's children by one label and report count/p50/p99 for each value"""
+    index = family.labelnames.index(label)
+    merged: Dict[str, Histogram] = {}
+    for key, hist in family.children.items():
+        target = merged.get(key[index])
+        if target is None:
+            target = merged[key[index]] = Histogram(hist.bounds)
+        for i, bucket_count in enumerate(hist.counts):
+            target.counts[i] += bucket_count
+        target.sum += hist.sum
+        target.count += hist.count
+    return {
+        value: {"count": hist.count, "p50": hist.quantile(0.5), "p99": hist.quantile(0.99)}
+        for value, hist in merged.items()
+    }
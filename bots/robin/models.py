@@ -0,0 +1,141 @@
+"""
+Registry of the models installed in Ollama, plus model choice and routing.
+
+The /api/tags listing is cached and refreshed every MODEL_REFRESH_INTERVAL
+seconds instead of being fetched per command. At startup the models in
+OLLAMA_PIN_MODELS are loaded into memory and kept there (keep_alive -1), so
+nobody's first question pays the load time; other models stay loaded for
+OLLAMA_KEEP_ALIVE after each use.
+
+Without an explicit model, prompts are routed by size: under
+ROUTE_SHORT_PROMPT_TOKENS to OLLAMA_SMALL_MODEL, otherwise to
+OLLAMA_LARGE_MODEL. Either falls back to the default model when it's unset
+or not installed.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, List, Optional, Union
+
+from ollama import OllamaClient, OllamaError
+
+logger = logging.getLogger(__name__)
+
+OLLAMA_DEFAULT_MODEL = os.getenv("OLLAMA_DEFAULT_MODEL", "llama3")
+OLLAMA_SMALL_MODEL = os.getenv("OLLAMA_SMALL_MODEL") or None  # for short prompts; unset uses the default model
+OLLAMA_LARGE_MODEL = os.getenv("OLLAMA_LARGE_MODEL") or None  # for long prompts; unset uses the default model
+ROUTE_SHORT_PROMPT_TOKENS = int(os.getenv("ROUTE_SHORT_PROMPT_TOKENS", 200))
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")  # how long a model stays loaded after its last use
+# Models to load at startup and keep loaded; defaults to the default and routing models
+OLLAMA_PIN_MODELS = os.getenv("OLLAMA_PIN_MODELS")
+MODEL_REFRESH_INTERVAL = float(os.getenv("MODEL_REFRESH_INTERVAL", 300))  # seconds between /api/tags refreshes
+
+KeepAlive = Union[str, int]
+
+
+class ModelRegistry:
+    def __init__(self, client: OllamaClient, default: str = OLLAMA_DEFAULT_MODEL,
+                 small: Optional[str] = OLLAMA_SMALL_MODEL, large: Optional[str] = OLLAMA_LARGE_MODEL,
+                 short_tokens: int = ROUTE_SHORT_PROMPT_TOKENS, keep_alive: str = OLLAMA_KEEP_ALIVE,
+                 pinned: Optional[str] = OLLAMA_PIN_MODELS, refresh_interval: float = MODEL_REFRESH_INTERVAL):
+        self.client = client
+        self.default = default
+        self.small = small
+        self.large = large
+        self.short_tokens = short_tokens
+        self.default_keep_alive = keep_alive
+        if pinned is None:
+            pinned_names = [name for name in (default, small, large) if name]
+        else:
+            pinned_names = [name.strip() for name in pinned.split(",") if name.strip()]
+        self.pinned = list(dict.fromkeys(_canonical(name) for name in pinned_names))
+        self.refresh_interval = refresh_interval
+        # name -> /api/tags entry, e.g. {"name": "llama3:latest", "size": ..., "details": {...}}
+        self.models: Dict[str, Dict] = {}
+        self.refreshed_at = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    # --- listing ---
+
+    async def refresh(self) -> Dict[str, Dict]:
+        data = await self.client.request("GET", "/api/tags")
+        self.models = {m["name"]: m for m in data.get("models", []) if m.get("name")}
+        self.refreshed_at = time.monotonic()
+        return self.models
+
+    async def list(self, max_age: Optional[float] = None) -> List[Dict]:
+        """Installed models, refreshing the cached listing if it's older than max_age (default: the refresh interval)"""
+        max_age = self.refresh_interval if max_age is None else max_age
+        if not self.models or time.monotonic() - self.refreshed_at > max_age:
+            await self.refresh()
+        return sorted(self.models.values(), key=lambda m: m["name"])
+
+    def resolve(self, name: str) -> Optional[str]:
+        """Installed model matching name ("llama3" matches "llama3:latest"), or None"""
+        name = _canonical(name)
+        return name if name in self.models else None
+
+    def installed(self, name: Optional[str]) -> bool:
+        # Before the first successful listing, assume the configured models exist
+        return bool(name) and (not self.models or self.resolve(name) is not None)
+
+    # --- routing ---
+
+    def route(self, prompt_tokens: int) -> str:
+        """Model for a prompt of about prompt_tokens tokens when the user didn't pick one"""
+        preferred = self.small if prompt_tokens < self.short_tokens else self.large
+        return _canonical(preferred if self.installed(preferred) else self.default)
+
+    def keep_alive(self, model: str) -> KeepAlive:
+        """keep_alive to send with a request for model: pinned models stay loaded indefinitely"""
+        return -1 if _canonical(model) in self.pinned else self.default_keep_alive
+
+    # --- warm-up ---
+
+    async def warm_up(self):
+        """Load the pinned models so the first question doesn't wait for them"""
+        for model in self.pinned:
+            if self.models and model not in self.models:
+                logger.warning(f"Not preloading {model}: it isn't installed")
+                continue
+            start = time.perf_counter()
+            try:
+                # A generate request without a prompt just loads the model
+                await self.client.request("POST", "/api/generate", {"model": model, "keep_alive": -1})
+                logger.info(f"Loaded {model} in {time.perf_counter() - start:.1f}s and pinned it in memory")
+            except OllamaError as e:
+                logger.warning(f"Couldn't preload {model}: {e}")
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        try:
+            await self.refresh()
+            logger.info(f"{len(self.models)} Ollama models installed")
+        except OllamaError as e:
+            logger.warning(f"Couldn't list Ollama models: {e}")
+        await self.warm_up()
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await self.refresh()
+            except OllamaError as e:
+                logger.warning(f"Couldn't refresh Ollama models, keeping the last list: {e}")
+
+    async def aclose(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._task = None
+
+
+def _canonical(name: str) -> str:
+    name = name.strip()
+    return name if ":" in name else f"{name}:latest"
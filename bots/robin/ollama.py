@@ -0,0 +1,158 @@
+"""
+Async client for the Ollama HTTP API.
+
+generate() and chat() stream /api/generate and /api/chat: Ollama answers with
+newline-delimited JSON, one object per token batch, and we yield each object's
+text as soon as its line arrives instead of waiting for the whole completion.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from contextlib import aclosing
+from typing import AsyncIterator, Callable, Dict, List, Optional
+
+import aiohttp
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+OLLAMA_API = os.getenv("OLLAMA_API", "http://localhost:11434")
+OLLAMA_CONNECT_TIMEOUT = float(os.getenv("OLLAMA_CONNECT_TIMEOUT", 10))
+OLLAMA_READ_TIMEOUT = float(os.getenv("OLLAMA_READ_TIMEOUT", 120))  # max silence between chunks; covers model loading
+OLLAMA_TIMEOUT = float(os.getenv("OLLAMA_TIMEOUT", 600))  # total seconds per generation
+
+OLLAMA_LATENCY = metrics.REGISTRY.histogram(
+    "bot_ollama_request_duration_seconds", "Latency of Ollama generate calls", ("model", "status")
+)
+OLLAMA_TTFT = metrics.REGISTRY.histogram(
+    "bot_ollama_time_to_first_token_seconds", "Time from sending a prompt to Ollama's first streamed token", ("model",)
+)
+OLLAMA_TOKENS = metrics.REGISTRY.counter(
+    "bot_ollama_tokens_total", "Tokens processed by Ollama", ("model", "kind")
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about 4 characters per token for English with Llama-style tokenizers)"""
+    return len(text) // 4 + 1
+
+
+class OllamaError(Exception):
+    """Ollama was unreachable, failed, or reported an error mid-stream"""
+    pass
+
+
+class OllamaClient:
+    def __init__(self, base_url: str = OLLAMA_API, keep_alive: Optional[Callable[[str], Optional[str]]] = None):
+        self.base_url = base_url.rstrip("/")
+        # model -> keep_alive value sent with each request (None leaves it to the server's default)
+        self.keep_alive = keep_alive
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            timeout = aiohttp.ClientTimeout(
+                total=OLLAMA_TIMEOUT, connect=OLLAMA_CONNECT_TIMEOUT, sock_read=OLLAMA_READ_TIMEOUT
+            )
+            self._session = aiohttp.ClientSession(timeout=timeout)
+        return self._session
+
+    async def request(self, method: str, path: str, payload: Optional[Dict] = None) -> Dict:
+        """Non-streaming call, e.g. GET /api/tags; raises OllamaError like the streaming calls"""
+        session = self._get_session()
+        try:
+            async with session.request(method, f"{self.base_url}{path}", json=payload) as response:
+                if response.status != 200:
+                    raise OllamaError(f"Error {response.status}: {await response.text()}")
+                return await response.json(content_type=None)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise OllamaError(f"Connection error: {e or type(e).__name__}")
+
+    async def _stream(self, path: str, payload: Dict) -> AsyncIterator[Dict]:
+        """POST payload with streaming on and yield each NDJSON object"""
+        session = self._get_session()
+        try:
+            async with session.post(f"{self.base_url}{path}", json={**payload, "stream": True}) as response:
+                if response.status != 200:
+                    raise OllamaError(f"Error {response.status}: {await response.text()}")
+                async for line in response.content:
+                    if not line.strip():
+                        continue
+                    try:
+                        data = json.loads(line)
+                    except ValueError:
+                        logger.warning(f"Skipping malformed line from Ollama: {line[:200]!r}")
+                        continue
+                    if "error" in data:
+                        raise OllamaError(f"Model error: {data['error']}")
+                    yield data
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise OllamaError(f"Connection error: {e or type(e).__name__}")
+
+    def generate(self, prompt: str, model: str, options: Optional[Dict] = None,
+                 usage: Optional[Dict] = None) -> AsyncIterator[str]:
+        """
+        Yield the completion for prompt piece by piece as Ollama produces it.
+        If usage is given, it's filled with Ollama's prompt_eval_count/eval_count once the stream is done.
+        """
+        payload = {"model": model, "prompt": prompt}
+        return self._generate("/api/generate", payload, model, options, usage)
+
+    def chat(self, messages: List[Dict], model: str, options: Optional[Dict] = None,
+             usage: Optional[Dict] = None) -> AsyncIterator[str]:
+        """Like generate(), but for a list of {"role", "content"} messages via /api/chat"""
+        payload = {"model": model, "messages": messages}
+        return self._generate("/api/chat", payload, model, options, usage)
+
+    async def _generate(self, path: str, payload: Dict, model: str, options: Optional[Dict],
+                        usage: Optional[Dict]) -> AsyncIterator[str]:
+        if options:
+            payload["options"] = options
+        if self.keep_alive is not None:
+            keep_alive = self.keep_alive(model)
+            if keep_alive is not None:
+                payload["keep_alive"] = keep_alive
+        status = "error"
+        start = time.perf_counter()
+        first_token = True
+        try:
+            # aclosing: if our caller stops early, release the connection now rather than at GC
+            async with aclosing(self._stream(path, payload)) as stream:
+                async for data in stream:
+                    # /api/generate streams {"response": ...}, /api/chat {"message": {"content": ...}}
+                    text = data.get("response") or (data.get("message") or {}).get("content", "")
+                    if text and first_token:
+                        OLLAMA_TTFT.labels(model=model).observe(time.perf_counter() - start)
+                        first_token = False
+                    if data.get("done"):
+                        OLLAMA_TOKENS.labels(model=model, kind="prompt").inc(data.get("prompt_eval_count", 0))
+                        OLLAMA_TOKENS.labels(model=model, kind="completion").inc(data.get("eval_count", 0))
+                        status = "ok"
+                        if usage is not None:
+                            usage["prompt_eval_count"] = data.get("prompt_eval_count", 0)
+                            usage["eval_count"] = data.get("eval_count", 0)
+                    if text:
+                        yield text
+        except (asyncio.CancelledError, GeneratorExit):
+            status = "cancelled"
+            raise
+        finally:
+            OLLAMA_LATENCY.labels(model=model, status=status).observe(time.perf_counter() - start)
+
+    async def complete(self, prompt: str, model: str, options: Optional[Dict] = None,
+                       usage: Optional[Dict] = None) -> str:
+        """Whole completion for prompt, for internal jobs that don't stream to Discord"""
+        parts = []
+        async with aclosing(self.generate(prompt, model, options, usage)) as chunks:
+            async for chunk in chunks:
+                parts.append(chunk)
+        return "".join(parts)
+
+    async def aclose(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
@@ -9,7 +9,22 @@ from discord.ext import commands, tasks
 import requests
 import asyncio
 import logging
+import time
+import uuid
+from contextlib import aclosing
+from datetime import datetime
 from dotenv import load_dotenv
+import metrics
+from metrics import MetricsServer, COMMAND_LATENCY
+from scheduler import Job, Scheduler, next_daily, parse_timezone, parse_times
+from ratelimit import RateLimiter
+from ollama import OLLAMA_API, OllamaClient, OllamaError, OLLAMA_LATENCY, OLLAMA_TTFT, estimate_tokens
+from models import ModelRegistry
+from streaming import StreamingReply
+from inference import InferenceScheduler, QueueFull
+from response_cache import ResponseCache
+from sessions import Session, SessionStore
+from summarizer import STAGE_LATENCY, SUMMARIZE_MAX_BYTES, SUMMARIZE_PROMPT, InputError, MapReduce, gather_input, split_chunks
 
 # Load environment variables from .env file
 load_dotenv()
@@ -23,9 +38,18 @@ logger = logging.getLogger('ollama_discord_bot')
 
 # Bot configuration
 DISCORD_TOKEN = os.getenv("DISCORD_TOKEN")
-OLLAMA_API = os.getenv('OLLAMA_API', 'http://localhost:11434')
 DEFAULT_MODEL = os.getenv('OLLAMA_DEFAULT_MODEL', 'llama3')
 COMMAND_PREFIX = os.getenv('COMMAND_PREFIX', '.')
+# Generation options per command. Deterministic ones (temperature 0 or a fixed seed) are answered from the response cache
+ASK_OPTIONS = {'temperature': float(os.environ['OLLAMA_ASK_TEMPERATURE'])} if os.getenv('OLLAMA_ASK_TEMPERATURE') else {}
+SUMMARIZE_OPTIONS = {'temperature': 0}
+SCHEDULE_TIMEZONE = os.getenv('SCHEDULE_TIMEZONE') or None  # IANA name for .schedule times; unset means server local time
+SCHEDULE_DB_PATH = os.getenv('SCHEDULE_DB_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'schedule.sqlite3'))
+
+# Rate limiting in front of Ollama (see ratelimit.py for the rule format; override with RATE_LIMIT_OLLAMA)
+RATE_LIMITS = {
+    'ollama': "2/20s user, 10/60s guild window, 30/60s global window",
+}
 
 if not DISCORD_TOKEN:
     logger.error("DISCORD_TOKEN is not set.")
@@ -35,16 +59,109 @@ if not DISCORD_TOKEN:
 intents = discord.Intents.default()
 intents.message_content = True
 
-bot = commands.Bot(command_prefix=COMMAND_PREFIX, intents=intents, help_command=None)
+class RobinBot(commands.Bot):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics_server = MetricsServer()
+
+    async def setup_hook(self):
+        await self.metrics_server.start()
+        scheduler.start()
+        models.start()
+
+    async def close(self):
+        try:
+            await super().close()
+        finally:
+            await scheduler.aclose()
+            await models.aclose()
+            await ollama_client.aclose()
+            response_cache.close()
+            await self.metrics_server.stop()
+
+bot = RobinBot(command_prefix=COMMAND_PREFIX, intents=intents, help_command=None)
+
+ollama_client = OllamaClient(OLLAMA_API)
+models = ModelRegistry(ollama_client, default=DEFAULT_MODEL)
+ollama_client.keep_alive = models.keep_alive
+inference = InferenceScheduler()
+response_cache = ResponseCache()
+sessions = SessionStore()
+# Command message id -> task generating its reply, so deleting the question cancels it
+inflight = {}
+
+rate_limiter = RateLimiter(RATE_LIMITS)
+
+metrics.REGISTRY.gauge_callback(
+    "bot_cache_hit_ratio",
+    "Share of lookups served from cache",
+    lambda: {("ollama",): response_cache.stats()['hit_rate'] / 100},
+    labelnames=("cache",),
+)
+metrics.REGISTRY.gauge_callback(
+    "bot_cache_entries",
+    "Entries currently held in each response cache",
+    lambda: {("ollama",): response_cache.stats()['entries']},
+    labelnames=("cache",),
+)
+
+class RateLimited(commands.CheckFailure):
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"{name} is rate limited for {retry_after:.1f}s")
+        self.name = name
+        self.retry_after = retry_after
+
+def rate_limited(name: str):
+    """Command check: reject the call if any RATE_LIMITS[name] rule is exhausted"""
+    async def predicate(ctx):
+        retry_after = rate_limiter.hit(name, user=ctx.author.id, guild=ctx.guild.id if ctx.guild else None)
+        if retry_after:
+            raise RateLimited(name, retry_after)
+        return True
+    return commands.check(predicate)
+
+# Time every command
+@bot.before_invoke
+async def start_command_timer(ctx):
+    ctx.started_at = time.perf_counter()
+
+@bot.after_invoke
+async def record_command_time(ctx):
+    started_at = getattr(ctx, "started_at", None)
+    if started_at is not None:
+        status = "error" if ctx.command_failed else "ok"
+        COMMAND_LATENCY.labels(command=ctx.command.name, status=status).observe(time.perf_counter() - started_at)
 
-# In-memory schedule storage
-SCHEDULE = []
+# Reminders from .schedule, persisted so they survive restarts
+scheduler = Scheduler(SCHEDULE_DB_PATH)
+
+async def send_reminders(jobs):
+    await bot.wait_until_ready()
+    for job in jobs:
+        channel = bot.get_channel(job.payload["channel_id"])
+        if channel is None:
+            logger.warning(f"Channel for reminder {job.id} not found")
+            continue
+        try:
+            await channel.send(f"⏰ <@{job.payload['user_id']}> {job.payload['text']}")
+        except discord.HTTPException as e:
+            logger.warning(f"Failed to send reminder {job.id}: {e}")
+
+scheduler.register("reminder", send_reminders)
 
 @bot.event
 async def on_ready():
     logger.info(f"{bot.user.name} connected!")
     await bot.change_presence(activity=discord.Game(name=f"{COMMAND_PREFIX}help for commands"))
-    update_status.start()
+    if not update_status.is_running():
+        update_status.start()
+
+@bot.event
+async def on_message_delete(message):
+    task = inflight.get(message.id)
+    if task is not None:
+        logger.info(f"Question {message.id} deleted, cancelling its generation")
+        task.cancel()
 
 @bot.event
 async def on_command_error(ctx, error):
@@ -52,6 +169,8 @@ async def on_command_error(ctx, error):
         return  # Quietly ignore unknown commands
     elif isinstance(error, commands.CommandOnCooldown):
         await ctx.send(f"Please wait {error.retry_after:.2f}s before using this command again.")
+    elif isinstance(error, RateLimited):
+        await ctx.send(f"The model is busy, please wait {max(1, round(error.retry_after))}s and try again.")
     else:
         logger.error(f"Command error in {ctx.command}: {error}")
         await ctx.send("An unexpected error occurred. Please try again later.")
@@ -59,58 +178,91 @@ async def on_command_error(ctx, error):
 @tasks.loop(seconds=60)
 async def update_status():
     await bot.change_presence(
-        activity=discord.Game(name=f"{COMMAND_PREFIX}help | {len(SCHEDULE)} scheduled")
+        activity=discord.Game(name=f"{COMMAND_PREFIX}help | {len(scheduler)} scheduled")
     )
 
 # --- Core Commands ---
 @bot.command(name="ask")
+@rate_limited("ollama")
 async def ask(ctx, *, question: str = None):
+    requested, question = _split_model_flag(question)
     if not question:
-        return await ctx.send("Usage: `.ask <question>`")
-    async with ctx.typing():
-        response = await _async_call(question)
-    if len(response) > 2000:
-        for i in range(0, len(response), 2000):
-            msg = await ctx.send(response[i:i+2000])
-            await msg.add_reaction("🤖")
+        return await ctx.send("Usage: `.ask [--model <name>] <question>`")
+    session = sessions.get(ctx.channel.id, ctx.author.id)
+    model = await _choose_model(ctx, requested, estimate_tokens(question) + session.tokens)
+    if model is None:
+        return
+    await _stream_reply(ctx, question, "🤖", model=model, options=ASK_OPTIONS, session=session)
+
+@bot.command(name="forget")
+async def forget(ctx):
+    if sessions.forget(ctx.channel.id, ctx.author.id):
+        await ctx.send("🧹 Conversation cleared; the next `.ask` starts fresh.")
     else:
-        msg = await ctx.send(response)
-        await msg.add_reaction("🤖")
+        await ctx.send("There's no conversation to clear.")
 
 @bot.command(name="models")
 async def list_models(ctx):
     async with ctx.typing():
         try:
-            resp = await asyncio.to_thread(requests.get, f"{OLLAMA_API}/api/tags", timeout=30)
-            if resp.status_code == 200:
-                models = [m['name'] for m in resp.json().get('models', [])]
-                text = "Available models:\n" + "\n".join(models) if models else "No models found."
-            else:
-                text = f"Error {resp.status_code}: {resp.text}"
-        except Exception as e:
-            text = f"Error fetching models: {e}"
-    await ctx.send(text)
+            installed = await models.list()
+        except OllamaError as e:
+            return await ctx.send(f"Error fetching models: {e}")
+    if not installed:
+        return await ctx.send("No models found.")
+    latency = metrics.summarize(OLLAMA_LATENCY, "model")
+    ttft = metrics.summarize(OLLAMA_TTFT, "model")
+    roles = {models.resolve(models.default): "default"}
+    if models.small:
+        roles.setdefault(models.resolve(models.small), "short prompts")
+    if models.large:
+        roles.setdefault(models.resolve(models.large), "long prompts")
+    lines = []
+    for m in installed:
+        name = m["name"]
+        line = f"`{name}` {m.get('size', 0) / 1e9:.1f} GB"
+        if name in roles:
+            line += f" ({roles[name]})"
+        if name in models.pinned:
+            line += " 📌"
+        if name in latency and latency[name]["count"]:
+            line += f" · p50 {latency[name]['p50']:.1f}s"
+            if name in ttft and ttft[name]["count"]:
+                line += f", first token {ttft[name]['p50']:.1f}s"
+        lines.append(line)
+    await ctx.send("Available models:\n" + "\n".join(lines))
 
 @bot.command(name="help")
 async def help_command(ctx, command: str = None):
     embed = discord.Embed(title="Robin Bot Commands", color=discord.Color.blue())
-    embed.add_field(name=".ask", value="Ask the LLM a question.", inline=False)
+    embed.add_field(
+        name=".ask",
+        value="Ask the LLM a question; follow-ups remember the conversation. "
+              "Add `--model <name>` to pick a model.",
+        inline=False
+    )
+    embed.add_field(name=".forget", value="Clear the conversation so `.ask` starts fresh.", inline=False)
     embed.add_field(name=".models", value="List available Ollama models.", inline=False)
     embed.add_field(name=".summarize", value="Summarize provided text.", inline=False)
     embed.add_field(name=".define", value="Define a term.", inline=False)
     embed.add_field(name=".anime", value="Lookup anime info.", inline=False)
-    embed.add_field(name=".schedule", value="View or add schedule entries.", inline=False)
+    embed.add_field(
+        name=".schedule",
+        value="View your reminders, or add one: `.schedule 14:00 standup`, "
+              "`.schedule 2025-01-31 09:30 demo`, `.schedule daily 09:00 stretch`.",
+        inline=False
+    )
+    embed.add_field(name=".unschedule", value="Remove a reminder by id.", inline=False)
     await ctx.send(embed=embed)
 
 # --- New Commands ---
 @bot.command(name="summarize")
+@rate_limited("ollama")
 async def summarize(ctx, *, text: str = None):
-    if not text:
-        return await ctx.send("Usage: `.summarize <text>`")
-    prompt = f"Summarize this:\n\n{text}"
-    response = await _async_call(prompt)
-    msg = await ctx.send(response)
-    await msg.add_reaction("📝")
+    requested, text = _split_model_flag(text)
+    if not text and not ctx.message.attachments:
+        return await ctx.send("Usage: `.summarize [--model <name>] <text, links or an attached text file>`")
+    await _run_cancellable(ctx, _summarize(ctx, text, requested))
 
 @bot.command(name="define")
 async def define(ctx, *, term: str = None):
@@ -146,30 +298,279 @@ async def anime(ctx, *, query: str = None):
     except Exception as e:
         await ctx.send(f"Error: {e}")
 
+SCHEDULE_USAGE = (
+    f"Usage: `{COMMAND_PREFIX}schedule [daily|YYYY-MM-DD] <HH:MM> <text>` "
+    f"(times in {SCHEDULE_TIMEZONE or 'server local time'})"
+)
+
+def _parse_reminder(entry: str):
+    """'[daily|YYYY-MM-DD] HH:MM text' -> (times, fire_at, text); times is empty for one-shots"""
+    parts = entry.split(maxsplit=2)
+    tz = parse_timezone(SCHEDULE_TIMEZONE)
+    if parts[0].lower() == "daily":
+        if len(parts) < 3:
+            raise ValueError("missing reminder text")
+        times = parse_times([parts[1]])
+        return times, next_daily(times, SCHEDULE_TIMEZONE, time.time()), parts[2]
+    if len(parts) >= 3 and "-" in parts[0]:
+        at = datetime.strptime(f"{parts[0]} {parts[1]}", "%Y-%m-%d %H:%M").replace(tzinfo=tz)
+        if at.timestamp() <= time.time():
+            raise ValueError("that time has already passed")
+        return (), at.timestamp(), parts[2]
+    rest = entry.split(maxsplit=1)
+    if len(rest) < 2:
+        raise ValueError("missing reminder text")
+    # Bare HH:MM means its next occurrence
+    return (), next_daily(parse_times([rest[0]]), SCHEDULE_TIMEZONE, time.time()), rest[1]
+
 @bot.command(name="schedule")
 async def schedule(ctx, *, entry: str = None):
-    global SCHEDULE
     if not entry:
-        if not SCHEDULE:
+        mine = [job for job in scheduler.jobs("reminder") if job.payload["user_id"] == ctx.author.id]
+        if not mine:
             return await ctx.send("No events scheduled.")
-        return await ctx.send("📅 **Your schedule:**\n" + "\n".join(f"- {e}" for e in SCHEDULE))
-    SCHEDULE.append(entry)
-    await ctx.send(f"Added to schedule: {entry}")
+        lines = [
+            f"- `{job.id.split(':', 1)[1]}` {job.local_fire_time():%Y-%m-%d %H:%M}"
+            f"{' (daily)' if job.times else ''}: {job.payload['text']}"
+            for job in mine
+        ]
+        return await ctx.send("📅 **Your schedule:**\n" + "\n".join(lines))
+    try:
+        times, fire_at, text = _parse_reminder(entry)
+    except ValueError as e:
+        return await ctx.send(f"Couldn't schedule that: {e}\n{SCHEDULE_USAGE}")
+    job = scheduler.add(Job(
+        f"reminder:{uuid.uuid4().hex[:8]}", "reminder",
+        {"user_id": ctx.author.id, "channel_id": ctx.channel.id, "text": text},
+        times=times, tz=SCHEDULE_TIMEZONE, fire_at=fire_at,
+    ))
+    await ctx.send(f"Added to schedule for {job.local_fire_time():%Y-%m-%d %H:%M}: {text}")
+
+@bot.command(name="unschedule")
+async def unschedule(ctx, reminder_id: str = None):
+    if not reminder_id:
+        return await ctx.send(f"Usage: `{COMMAND_PREFIX}unschedule <id>` (ids are shown by `{COMMAND_PREFIX}schedule`)")
+    job = scheduler.get(f"reminder:{reminder_id}")
+    if job is None or job.payload["user_id"] != ctx.author.id:
+        return await ctx.send(f"No reminder `{reminder_id}` found.")
+    scheduler.remove(job.id)
+    await ctx.send(f"Removed reminder: {job.payload['text']}")
 
 @bot.command(name="news")
 async def news(ctx):
     return await ctx.send("Robin does not handle news. Please use Nami with `!news`.")
 
-async def _async_call(prompt: str, model: str = DEFAULT_MODEL) -> str:
-    api_url = f"{OLLAMA_API}/api/generate"
-    payload = {"model": model, "prompt": prompt, "stream": False}
+def _split_model_flag(text: str):
+    """'--model name rest' or '-m name rest' -> (name, rest); (None, text) without the flag"""
+    parts = (text or "").split(maxsplit=2)
+    if len(parts) >= 2 and parts[0] in ("--model", "-m"):
+        return parts[1], parts[2] if len(parts) > 2 else ""
+    if parts and parts[0].startswith("--model="):
+        return parts[0].split("=", 1)[1], " ".join(parts[1:])
+    return None, text
+
+async def _choose_model(ctx, requested: str, prompt_tokens: int):
+    """The model the user asked for if it's installed, else the routed one; None (after telling them) if unknown"""
+    if requested is None:
+        return models.route(prompt_tokens)
+    model = models.resolve(requested)
+    if model is None:
+        try:
+            await models.list(max_age=60)  # maybe it was pulled since the last refresh
+        except OllamaError as e:
+            logger.warning(f"Couldn't refresh Ollama models: {e}")
+        model = models.resolve(requested)
+    if model is None:
+        await ctx.send(f"No model called `{requested}` is installed. See `{COMMAND_PREFIX}models`.")
+    return model
+
+async def _stream_reply(ctx, prompt: str, reaction: str, model: str = DEFAULT_MODEL, options: dict = None,
+                        session: Session = None) -> str:
+    """Queue for an Ollama slot, then stream the answer in; deleting the question cancels either step"""
+    return await _run_cancellable(ctx, _generate_reply(ctx, prompt, reaction, model, options, session))
+
+async def _run_cancellable(ctx, coro):
+    """Run a command's Ollama work as its own task, cancelled if the command message is deleted"""
+    task = asyncio.create_task(coro)
+    inflight[ctx.message.id] = task
     try:
-        response = await asyncio.to_thread(requests.post, api_url, json=payload, timeout=120)
-        if response.status_code == 200:
-            return response.json().get('response', 'No response from model')
-        return f"Error {response.status_code}: {response.text}"
-    except Exception as e:
-        return f"Connection error: {e}"
+        return await task
+    except asyncio.CancelledError:
+        if asyncio.current_task().cancelling():
+            raise  # we're being cancelled ourselves (shutdown), not the question being deleted
+        return ""
+    finally:
+        inflight.pop(ctx.message.id, None)
+
+async def _generate_reply(ctx, prompt: str, reaction: str, model: str, options: dict = None,
+                          session: Session = None, footer=None) -> str:
+    """Stream an answer into the channel and return it; footer() is appended below a completed answer"""
+    reply = StreamingReply(ctx.channel, reaction)
+    # A follow-up's answer depends on the conversation, so only standalone prompts use the cache
+    cacheable = session is None or session.is_empty()
+    cached = response_cache.get(model, prompt, options) if cacheable else None
+    if cached is not None:
+        await reply.write(cached)
+        await reply.close()
+        if session is not None:
+            session.add_turn(prompt, cached)
+        return cached
+
+    notice = None
+
+    async def show_position(position: int):
+        nonlocal notice
+        text = f"⏳ Robin is busy, you're #{position} in line."
+        if notice is None:
+            notice = await ctx.reply(text, mention_author=False)
+        else:
+            await notice.edit(content=text)
+
+    async def clear_notice():
+        nonlocal notice
+        if notice is not None:
+            try:
+                await notice.delete()
+            except discord.HTTPException:
+                pass
+            notice = None
+
+    usage = {}
+    completed, answer = False, ""
+    try:
+        async with inference.slot(ctx.author.id, on_position=show_position):
+            await clear_notice()
+            async with ctx.typing():
+                if session is not None:
+                    stream = ollama_client.chat(session.messages(prompt), model, options, usage=usage)
+                else:
+                    stream = ollama_client.generate(prompt, model, options, usage=usage)
+                try:
+                    async with aclosing(stream) as chunks:
+                        async for chunk in chunks:
+                            await reply.write(chunk)
+                    completed = True
+                    answer = reply.text
+                    if footer is not None:
+                        await reply.write(footer())
+                except OllamaError as e:
+                    await reply.write(f"\n\n⚠️ {e}" if reply.text else str(e))
+                except asyncio.CancelledError:
+                    if reply.text:
+                        await reply.write("\n\n⚠️ Cancelled")
+                        await reply.close()
+                    raise
+                await reply.close()
+            if completed:
+                if cacheable:
+                    response_cache.put(model, prompt, options, answer, usage.get("eval_count", 0))
+                if session is not None:
+                    session.add_turn(prompt, answer, usage.get("eval_count", 0))
+                    # Still holding the slot, so summarizing older turns counts against the concurrency limit
+                    await sessions.compact(
+                        session, lambda text: ollama_client.complete(text, model, SUMMARIZE_OPTIONS)
+                    )
+    except QueueFull as e:
+        if e.reason == "user":
+            await ctx.send(f"You already have {inference.max_per_user} questions in progress, please wait for them to finish.")
+        else:
+            await ctx.send("Robin's queue is full right now, please try again in a minute.")
+    finally:
+        await clear_notice()
+    return answer
+
+async def _complete(ctx, prompt: str, model: str = DEFAULT_MODEL, options: dict = SUMMARIZE_OPTIONS) -> str:
+    """One non-streamed generation on behalf of an already admitted command (map/reduce steps)"""
+    cached = response_cache.get(model, prompt, options)
+    if cached is not None:
+        return cached
+    async with inference.slot(ctx.author.id, check_limits=False):
+        usage = {}
+        text = await ollama_client.complete(prompt, model, options, usage=usage)
+    response_cache.put(model, prompt, options, text, usage.get("eval_count", 0))
+    return text
+
+async def _summarize(ctx, text: str, requested: str = None):
+    """Summarize text plus any linked pages and attachments; long inputs go through map-reduce"""
+    start = time.perf_counter()
+    try:
+        async with ctx.typing():
+            document, truncated = await gather_input(text, ctx.message.attachments)
+    except InputError as e:
+        return await ctx.send(f"Couldn't read that: {e}")
+    if truncated:
+        links = ", ".join(f"<{url}>" for url in truncated)
+        await ctx.send(f"⚠️ Only the first {SUMMARIZE_MAX_BYTES // 1024} KB of {links} will be summarized.")
+    fetched = time.perf_counter() - start
+    STAGE_LATENCY.labels(stage="fetch").observe(fetched)
+    if not document:
+        return await ctx.send("There's nothing to summarize.")
+    model = await _choose_model(ctx, requested, estimate_tokens(document))
+    if model is None:
+        return
+
+    # Short inputs are a single prompt that _generate_reply looks up in the cache itself; long ones
+    # are cached as a whole too, so summarizing the same document again skips map-reduce entirely
+    whole = SUMMARIZE_PROMPT.format(text=document.strip())
+    long_input = len(split_chunks(document)) > 1
+    cached = response_cache.get(model, whole, SUMMARIZE_OPTIONS) if long_input else None
+    if cached is not None:
+        reply = StreamingReply(ctx.channel, "📝")
+        await reply.write(cached)
+        return await reply.close()
+
+    progress = None
+    last_progress = 0.0
+
+    async def show_progress(done: int, total: int):
+        nonlocal progress, last_progress
+        if done < total and time.monotonic() - last_progress < 2:
+            return
+        last_progress = time.monotonic()
+        content = f"📚 Summarizing in {total} parts… {done}/{total} done"
+        if progress is None:
+            progress = await ctx.reply(content, mention_author=False)
+        else:
+            await progress.edit(content=content)
+
+    try:
+        try:
+            inference.check_capacity(ctx.author.id)
+            async with ctx.typing():
+                pipeline = MapReduce(lambda prompt: _complete(ctx, prompt, model))
+                prompt, stats = await pipeline.final_prompt(document, on_progress=show_progress)
+        except InputError as e:
+            return await ctx.send(str(e))
+        except QueueFull:
+            return await ctx.send("Robin's queue is full right now, please try again in a minute.")
+        except OllamaError as e:
+            return await ctx.send(f"Summarizing failed: {e}")
+    finally:
+        if progress is not None:
+            try:
+                await progress.delete()
+            except discord.HTTPException:
+                pass
+
+    final_start = time.perf_counter()
+
+    def timings() -> str:
+        final = time.perf_counter() - final_start
+        STAGE_LATENCY.labels(stage="final").observe(final)
+        if stats["chunks"] <= 1:
+            return ""
+        parts = [f"{stats['chunks']} parts"]
+        if fetched >= 0.05:
+            parts.append(f"fetch {fetched:.1f}s")
+        parts.append(f"map {stats['map']:.1f}s")
+        if stats["reduce"]:
+            parts.append(f"reduce {stats['reduce']:.1f}s")
+        parts.append(f"final {final:.1f}s")
+        return "\n-# " + " · ".join(parts)
+
+    answer = await _generate_reply(ctx, prompt, "📝", model, SUMMARIZE_OPTIONS, footer=timings)
+    if answer and long_input:
+        response_cache.put(model, whole, SUMMARIZE_OPTIONS, answer)
 
 if __name__ == "__main__":
     try:
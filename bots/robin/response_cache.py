@@ -0,0 +1,205 @@
+"""
+Content-addressed cache of Ollama completions.
+
+Entries are keyed on a hash of (model, normalized prompt, options), so the
+same question asked with different spacing or line endings is answered once.
+Only deterministic generations are cached (temperature 0, or a fixed seed):
+with sampling on, a second answer is supposed to differ from the first.
+
+The cache is an in-memory LRU bounded by entries and bytes. Set
+RESPONSE_CACHE_PATH to also write entries through to SQLite and reload them
+at startup; writes run on a dedicated thread so they never block the event loop.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import time
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+RESPONSE_CACHE_PATH = os.getenv("RESPONSE_CACHE_PATH")  # unset keeps the cache in memory only
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", 1000))
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", 8 * 1024 * 1024))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", 7 * 86400))  # seconds; models get updated under the same name
+
+CACHE_LOOKUPS = metrics.REGISTRY.counter(
+    "bot_ollama_cache_lookups_total", "Response cache lookups", ("outcome",)
+)
+TOKENS_SAVED = metrics.REGISTRY.counter(
+    "bot_ollama_cache_tokens_saved_total", "Completion tokens served from the response cache instead of generated"
+)
+
+_SPACES = re.compile(r"[ \t\f\v]+")
+_BLANK_LINES = re.compile(r"\n{3,}")
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Canonical form for keying: NFC, \\n line endings, runs of spaces collapsed, no edge whitespace"""
+    text = unicodedata.normalize("NFC", prompt).replace("\r\n", "\n").replace("\r", "\n")
+    lines = [_SPACES.sub(" ", line).strip() for line in text.split("\n")]
+    return _BLANK_LINES.sub("\n\n", "\n".join(lines)).strip()
+
+
+def is_deterministic(options: Optional[Dict]) -> bool:
+    """True when Ollama should give the same completion every time for these options"""
+    options = options or {}
+    return options.get("temperature") == 0 or options.get("seed") is not None
+
+
+def cache_key(model: str, prompt: str, options: Optional[Dict]) -> str:
+    material = json.dumps(
+        {"model": model, "prompt": normalize_prompt(prompt), "options": options or {}},
+        sort_keys=True, ensure_ascii=False,
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class _Entry:
+    __slots__ = ("text", "tokens", "expires_at", "size")
+
+    def __init__(self, text: str, tokens: int, expires_at: float):
+        self.text = text
+        self.tokens = tokens
+        self.expires_at = expires_at
+        self.size = len(text.encode("utf-8"))
+
+
+class ResponseCache:
+    def __init__(self, max_entries: int = RESPONSE_CACHE_MAX_ENTRIES, max_bytes: int = RESPONSE_CACHE_MAX_BYTES,
+                 ttl: float = RESPONSE_CACHE_TTL, db_path: Optional[str] = RESPONSE_CACHE_PATH):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.tokens_saved = 0
+        self._conn = None
+        self._writer = None
+        if db_path:
+            try:
+                self._open(db_path)
+            except sqlite3.Error as e:
+                logger.error(f"Could not open response cache at {db_path}, continuing in memory only: {e}")
+                self._conn = None
+
+    # --- persistence ---
+
+    def _open(self, db_path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                text TEXT NOT NULL,
+                tokens INTEGER NOT NULL,
+                expires_at REAL NOT NULL,
+                used_at REAL NOT NULL
+            )"""
+        )
+        self._conn.execute("DELETE FROM responses WHERE expires_at <= ?", (time.time(),))
+        self._conn.commit()
+        # Most recently used last, so the LRU order survives the restart
+        rows = self._conn.execute(
+            "SELECT key, text, tokens, expires_at FROM responses ORDER BY used_at DESC LIMIT ?", (self.max_entries,)
+        ).fetchall()
+        for key, text, tokens, expires_at in reversed(rows):
+            self._insert(key, _Entry(text, tokens, expires_at))
+        # Every statement after this point runs on this single worker thread
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="response-cache")
+        logger.info(f"Loaded {len(self._entries)} cached responses from {db_path}")
+
+    def _execute(self, sql: str, params: Tuple):
+        try:
+            self._conn.execute(sql, params)
+            self._conn.commit()
+        except sqlite3.Error as e:
+            logger.error(f"Response cache write failed: {e}")
+
+    def _persist(self, sql: str, params: Tuple):
+        if self._writer is not None:
+            self._writer.submit(self._execute, sql, params)
+
+    # --- LRU ---
+
+    def _insert(self, key: str, entry: _Entry):
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.bytes -= old.size
+        self._entries[key] = entry
+        self.bytes += entry.size
+        while self._entries and (len(self._entries) > self.max_entries or self.bytes > self.max_bytes):
+            evicted_key, evicted = self._entries.popitem(last=False)
+            self.bytes -= evicted.size
+            self._persist("DELETE FROM responses WHERE key = ?", (evicted_key,))
+
+    def get(self, model: str, prompt: str, options: Optional[Dict]) -> Optional[str]:
+        """Cached completion, or None; non-deterministic options always miss"""
+        if not is_deterministic(options):
+            CACHE_LOOKUPS.labels(outcome="bypass").inc()
+            return None
+        key = cache_key(model, prompt, options)
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at <= time.time():
+            self._entries.pop(key)
+            self.bytes -= entry.size
+            self._persist("DELETE FROM responses WHERE key = ?", (key,))
+            entry = None
+        if entry is None:
+            self.misses += 1
+            CACHE_LOOKUPS.labels(outcome="miss").inc()
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        self.tokens_saved += entry.tokens
+        CACHE_LOOKUPS.labels(outcome="hit").inc()
+        TOKENS_SAVED.labels().inc(entry.tokens)
+        self._persist("UPDATE responses SET used_at = ? WHERE key = ?", (time.time(), key))
+        return entry.text
+
+    def put(self, model: str, prompt: str, options: Optional[Dict], text: str, tokens: int = 0):
+        """Remember a completed generation (ignored for non-deterministic options or empty text)"""
+        if not is_deterministic(options) or not text.strip():
+            return
+        key = cache_key(model, prompt, options)
+        entry = _Entry(text, tokens, time.time() + self.ttl)
+        if entry.size > self.max_bytes:
+            return
+        self._insert(key, entry)
+        self._persist(
+            "INSERT OR REPLACE INTO responses (key, text, tokens, expires_at, used_at) VALUES (?, ?, ?, ?, ?)",
+            (key, text, tokens, entry.expires_at, time.time()),
+        )
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups * 100, 1) if lookups else 0.0,
+            "tokens_saved": self.tokens_saved,
+        }
+
+    def close(self):
+        """Finish queued writes and close the database"""
+        if self._writer is not None:
+            self._writer.shutdown(wait=True)
+            self._writer = None
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
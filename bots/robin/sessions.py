@@ -0,0 +1,145 @@
+"""
+Conversation sessions for .ask, sent to Ollama's /api/chat.
+
+Each session keeps recent turns verbatim plus a running summary of older
+ones. Sending the same history prefix on every turn lets Ollama reuse its KV
+cache for it instead of re-reading the whole conversation. Once a session's
+estimated size passes SESSION_TOKEN_BUDGET, everything but the last
+SESSION_KEEP_TURNS turns is folded into the summary. Sessions idle for longer
+than SESSION_IDLE_TIMEOUT, or beyond the SESSION_MAX_COUNT most recently used,
+are dropped.
+"""
+
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Tuple
+
+from ollama import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+SESSION_SCOPE = os.getenv("SESSION_SCOPE", "channel")  # "channel": shared by everyone in a channel; "user": per user per channel
+SESSION_TOKEN_BUDGET = int(os.getenv("SESSION_TOKEN_BUDGET", 1500))  # keep below the model's num_ctx, leaving room for the answer
+SESSION_KEEP_TURNS = int(os.getenv("SESSION_KEEP_TURNS", 2))  # recent turns never folded into the summary
+SESSION_IDLE_TIMEOUT = float(os.getenv("SESSION_IDLE_TIMEOUT", 3600))  # seconds
+SESSION_MAX_COUNT = int(os.getenv("SESSION_MAX_COUNT", 500))
+
+SUMMARY_PROMPT = (
+    "Summarize the conversation below in a few sentences. Keep the names, facts, numbers and decisions "
+    "someone would need to carry on the conversation.\n\n{conversation}"
+)
+
+Summarizer = Callable[[str], Awaitable[str]]
+
+
+class Turn:
+    __slots__ = ("question", "answer", "tokens")
+
+    def __init__(self, question: str, answer: str, answer_tokens: int = 0):
+        self.question = question
+        self.answer = answer
+        self.tokens = estimate_tokens(question) + (answer_tokens or estimate_tokens(answer))
+
+
+class Session:
+    def __init__(self, key: Tuple):
+        self.key = key
+        self.summary = ""
+        self.turns: List[Turn] = []
+        self.last_used = time.monotonic()
+        self.compacting = False
+
+    @property
+    def tokens(self) -> int:
+        return (estimate_tokens(self.summary) if self.summary else 0) + sum(t.tokens for t in self.turns)
+
+    def is_empty(self) -> bool:
+        return not self.summary and not self.turns
+
+    def messages(self, question: str) -> List[Dict]:
+        """Chat messages for the next question: summary, recent turns, then the question"""
+        messages = []
+        if self.summary:
+            messages.append({"role": "system", "content": f"Summary of the earlier conversation: {self.summary}"})
+        for turn in self.turns:
+            messages.append({"role": "user", "content": turn.question})
+            messages.append({"role": "assistant", "content": turn.answer})
+        messages.append({"role": "user", "content": question})
+        return messages
+
+    def add_turn(self, question: str, answer: str, answer_tokens: int = 0):
+        self.turns.append(Turn(question, answer, answer_tokens))
+        self.last_used = time.monotonic()
+
+
+class SessionStore:
+    def __init__(self, scope: str = SESSION_SCOPE, budget: int = SESSION_TOKEN_BUDGET,
+                 keep_turns: int = SESSION_KEEP_TURNS, idle_timeout: float = SESSION_IDLE_TIMEOUT,
+                 max_sessions: int = SESSION_MAX_COUNT):
+        self.scope = scope
+        self.budget = budget
+        self.keep_turns = keep_turns
+        self.idle_timeout = idle_timeout
+        self.max_sessions = max_sessions
+        self._sessions: "OrderedDict[Tuple, Session]" = OrderedDict()
+        self.compactions = 0
+
+    def key_for(self, channel_id: int, user_id: int) -> Tuple:
+        return (channel_id, user_id) if self.scope == "user" else (channel_id,)
+
+    def _evict(self):
+        now = time.monotonic()
+        # Least recently used first, so stop at the first session still in use
+        while self._sessions:
+            key, session = next(iter(self._sessions.items()))
+            if len(self._sessions) <= self.max_sessions and now - session.last_used < self.idle_timeout:
+                break
+            del self._sessions[key]
+
+    def get(self, channel_id: int, user_id: int) -> Session:
+        key = self.key_for(channel_id, user_id)
+        self._evict()
+        session = self._sessions.pop(key, None) or Session(key)
+        session.last_used = time.monotonic()
+        self._sessions[key] = session
+        self._evict()
+        return session
+
+    def forget(self, channel_id: int, user_id: int) -> bool:
+        return self._sessions.pop(self.key_for(channel_id, user_id), None) is not None
+
+    def __len__(self):
+        return len(self._sessions)
+
+    async def compact(self, session: Session, summarize: Summarizer):
+        """If the session is over budget, fold its older turns into the summary"""
+        if session.tokens <= self.budget or session.compacting:
+            return
+        session.compacting = True
+        try:
+            old = session.turns[:-self.keep_turns] if self.keep_turns else list(session.turns)
+            if old:
+                parts = [f"Earlier summary: {session.summary}"] if session.summary else []
+                for turn in old:
+                    parts.append(f"User: {turn.question}\nAssistant: {turn.answer}")
+                try:
+                    summary = (await summarize(SUMMARY_PROMPT.format(conversation="\n\n".join(parts)))).strip()
+                except Exception as e:
+                    logger.warning(f"Couldn't summarize session {session.key}, dropping its oldest turns: {e}")
+                    summary = session.summary
+                session.summary = summary
+                # Turns added while we were summarizing stay
+                session.turns = session.turns[len(old):]
+                self.compactions += 1
+            # Recent turns alone can still be too big: drop the oldest, but always keep the latest
+            while session.tokens > self.budget and len(session.turns) > 1:
+                session.turns.pop(0)
+            if session.tokens > self.budget and session.summary:
+                session.summary = ""
+        finally:
+            session.compacting = False
+
+    def stats(self) -> Dict:
+        return {"sessions": len(self._sessions), "compactions": self.compactions}
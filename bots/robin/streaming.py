@@ -0,0 +1,79 @@
+"""
+Discord replies that grow as an LLM streams its answer.
+
+The first text is sent as soon as it arrives; after that the message is edited
+at most once every STREAM_EDIT_INTERVAL seconds (Discord allows roughly five
+edits per 5s per channel). When the text outgrows Discord's 2000-character
+limit, the current message is finished at a line or word break and the rest
+continues in a new message.
+"""
+
+import logging
+import os
+import time
+from typing import List, Optional
+
+import discord
+
+logger = logging.getLogger(__name__)
+
+EDIT_INTERVAL = float(os.getenv("STREAM_EDIT_INTERVAL", 1.0))  # min seconds between edits of a streaming reply
+MESSAGE_LIMIT = 2000
+
+
+def split_point(text: str, limit: int = MESSAGE_LIMIT) -> int:
+    """Where to cut text so the head fits in limit: the last newline, else the last space, else limit"""
+    for sep in ("\n", " "):
+        cut = text.rfind(sep, 0, limit + 1)
+        if cut > limit // 2:
+            return cut
+    return limit
+
+
+class StreamingReply:
+    def __init__(self, channel: discord.abc.Messageable, reaction: Optional[str] = None,
+                 interval: float = EDIT_INTERVAL):
+        self.channel = channel
+        self.reaction = reaction
+        self.interval = interval
+        self.text = ""
+        self.messages: List[discord.Message] = []
+        self._current: Optional[discord.Message] = None
+        self._pending = ""  # everything that belongs in the current message
+        self._shown = ""  # what the current message displays right now
+        self._last_edit = 0.0
+
+    async def write(self, chunk: str):
+        """Append streamed text, editing the reply if the throttle allows"""
+        self.text += chunk
+        self._pending += chunk
+        while len(self._pending) > MESSAGE_LIMIT:
+            cut = split_point(self._pending)
+            head, self._pending = self._pending[:cut], self._pending[cut:].lstrip()
+            await self._show(head)
+            self._current, self._shown = None, ""
+        if time.monotonic() - self._last_edit >= self.interval:
+            await self._show(self._pending)
+
+    async def _show(self, content: str):
+        if not content.strip() or content == self._shown:
+            return  # Discord rejects blank messages; skip no-op edits
+        if self._current is None:
+            self._current = await self.channel.send(content)
+            self.messages.append(self._current)
+        else:
+            await self._current.edit(content=content)
+        self._shown = content
+        self._last_edit = time.monotonic()
+
+    async def close(self, empty: str = "No response from model"):
+        """Render whatever is still buffered and add the reaction; send `empty` if nothing came back"""
+        if not self.text.strip():
+            self._pending = empty
+        await self._show(self._pending)
+        if self.reaction:
+            for message in self.messages:
+                try:
+                    await message.add_reaction(self.reaction)
+                except discord.HTTPException as e:
+                    logger.debug(f"Couldn't react to reply {message.id}: {e}")
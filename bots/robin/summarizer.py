@@ -0,0 +1,333 @@
+"""
+Map-reduce summarization for inputs too long for one prompt.
+
+The input is split into chunks of about SUMMARIZE_CHUNK_TOKENS at paragraph,
+then sentence, then word boundaries. Each chunk is summarized on its own (map),
+as concurrently as the inference scheduler allows. The partial summaries are
+then combined (reduce), in several rounds if they don't fit in one prompt
+together. Input can also come from message attachments and links; links are
+only fetched from public addresses.
+"""
+
+import asyncio
+import ipaddress
+import logging
+import os
+import re
+import socket
+import time
+from html.parser import HTMLParser
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urljoin, urlsplit
+
+import aiohttp
+import discord
+from aiohttp.abc import AbstractResolver
+from aiohttp.resolver import DefaultResolver
+
+import metrics
+from ollama import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+SUMMARIZE_CHUNK_TOKENS = int(os.getenv("SUMMARIZE_CHUNK_TOKENS", 1500))  # keep below the model's num_ctx, leaving room for the answer
+SUMMARIZE_MAX_CHUNKS = int(os.getenv("SUMMARIZE_MAX_CHUNKS", 24))  # longer inputs are refused
+SUMMARIZE_MAX_BYTES = int(os.getenv("SUMMARIZE_MAX_BYTES", 512 * 1024))  # per attachment or link; longer pages are cut off
+FETCH_TIMEOUT = float(os.getenv("SUMMARIZE_FETCH_TIMEOUT", 15))
+MAX_REDIRECTS = 3
+
+STAGE_LATENCY = metrics.REGISTRY.histogram(
+    "bot_summarize_stage_seconds", "Time spent in each stage of .summarize", ("stage",)
+)
+
+SUMMARIZE_PROMPT = "Summarize this:\n\n{text}"
+MAP_PROMPT = (
+    "Summarize this part of a longer document. Keep the key facts, names and numbers.\n\n{text}"
+)
+REDUCE_PROMPT = (
+    "Below are summaries of consecutive parts of one document. "
+    "Combine them into a single coherent summary of the whole document.\n\n{text}"
+)
+
+TEXT_TYPES = ("text/", "application/json", "application/xml", "application/xhtml+xml")
+TEXT_EXTENSIONS = (".txt", ".md", ".rst", ".csv", ".log", ".json", ".xml", ".html", ".htm", ".py", ".js", ".yaml", ".yml")
+URL_PATTERN = re.compile(r"https?://[^\s<>]+")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+Complete = Callable[[str], Awaitable[str]]
+Progress = Callable[[int, int], Awaitable[None]]
+
+
+class InputError(Exception):
+    """The input couldn't be read or is too long"""
+    pass
+
+
+# --- input ---
+
+class _TextExtractor(HTMLParser):
+    BLOCK_TAGS = {"p", "div", "br", "li", "tr", "h1", "h2", "h3", "h4", "h5", "h6", "section", "article", "pre"}
+    SKIP_TAGS = {"script", "style", "noscript", "template", "svg", "head", "nav", "footer"}
+
+    def __init__(self):
+        super().__init__()
+        self.parts: List[str] = []
+        self._skipping = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP_TAGS:
+            self._skipping += 1
+        elif tag in self.BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP_TAGS and self._skipping:
+            self._skipping -= 1
+        elif tag in self.BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_data(self, data):
+        if not self._skipping:
+            self.parts.append(data)
+
+
+def html_to_text(html: str) -> str:
+    parser = _TextExtractor()
+    parser.feed(html)
+    lines = (re.sub(r"[ \t\r\f\v]+", " ", line).strip() for line in "".join(parser.parts).split("\n"))
+    return re.sub(r"\n{3,}", "\n\n", "\n".join(lines)).strip()
+
+
+def extract_urls(text: str) -> Tuple[List[str], str]:
+    """Links in text (without trailing punctuation), and the text with them removed"""
+    urls = [url.rstrip(".,;:!?)>\"'") for url in URL_PATTERN.findall(text)]
+    return urls, URL_PATTERN.sub("", text).strip()
+
+
+def _is_public(address: str) -> bool:
+    return ipaddress.ip_address(address.split("%")[0]).is_global
+
+
+class NotPublic(OSError):
+    """A link resolved to a loopback/private address, e.g. the Ollama server itself"""
+    pass
+
+
+class PublicResolver(AbstractResolver):
+    """
+    Resolver that refuses hosts with any non-public address. The connector connects to exactly
+    the addresses returned here, so the check can't be bypassed by DNS answering differently
+    the second time (DNS rebinding), and it applies to every redirect hop.
+    """
+
+    def __init__(self):
+        self._resolver = DefaultResolver()
+
+    async def resolve(self, host: str, port: int = 0, family: int = socket.AF_INET) -> List[Dict[str, Any]]:
+        hosts = await self._resolver.resolve(host, port, family)
+        if not all(_is_public(h["host"]) for h in hosts):
+            raise NotPublic(f"{host} isn't a public address")
+        return hosts
+
+    async def close(self):
+        await self._resolver.close()
+
+
+async def _read_capped(response: aiohttp.ClientResponse, limit: int) -> Tuple[bytes, bool]:
+    """Up to limit bytes of the body, and whether there was more"""
+    body = bytearray()
+    async for chunk in response.content.iter_chunked(64 * 1024):
+        body += chunk
+        if len(body) > limit:
+            return bytes(body[:limit]), True
+    return bytes(body), False
+
+
+async def fetch_url(session: aiohttp.ClientSession, url: str) -> Tuple[str, bool]:
+    """
+    Text of the page at url, and whether it was cut off at SUMMARIZE_MAX_BYTES. The session must
+    use a PublicResolver (see open_session()); literal IP hosts skip the resolver and are checked here.
+    """
+    for _ in range(MAX_REDIRECTS + 1):
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise InputError(f"Unsupported link: {url}")
+        try:
+            address = ipaddress.ip_address(parts.hostname)
+        except ValueError:
+            address = None  # a hostname: PublicResolver checks it when connecting
+        if address is not None and not address.is_global:
+            raise InputError(f"{parts.hostname} isn't a public address")
+        try:
+            async with session.get(url, allow_redirects=False) as response:
+                if response.status in (301, 302, 303, 307, 308) and "Location" in response.headers:
+                    url = urljoin(url, response.headers["Location"])
+                    continue
+                if response.status != 200:
+                    raise InputError(f"{parts.hostname} answered {response.status}")
+                content_type = response.headers.get("Content-Type", "").lower()
+                if not content_type.startswith(TEXT_TYPES):
+                    raise InputError(f"Can't summarize {content_type or 'that kind of'} content from {parts.hostname}")
+                body, truncated = await _read_capped(response, SUMMARIZE_MAX_BYTES)
+                text = body.decode(response.get_encoding() if response.charset else "utf-8", errors="replace")
+                return (html_to_text(text) if "html" in content_type else text), truncated
+        except aiohttp.ClientConnectorError as e:
+            if isinstance(e.os_error, NotPublic):
+                raise InputError(str(e.os_error))
+            raise
+    raise InputError(f"Too many redirects from {url}")
+
+
+def open_session() -> aiohttp.ClientSession:
+    """Session for fetching links: public addresses only, no proxy settings from the environment"""
+    return aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(resolver=PublicResolver()),
+        timeout=aiohttp.ClientTimeout(total=FETCH_TIMEOUT),
+        headers={"User-Agent": "RobinBot/1.0"},
+    )
+
+
+async def read_attachment(attachment: discord.Attachment) -> str:
+    name = attachment.filename.lower()
+    content_type = (attachment.content_type or "").lower()
+    if not content_type.startswith(TEXT_TYPES) and not name.endswith(TEXT_EXTENSIONS):
+        raise InputError(f"Can't summarize {attachment.filename}: only text files are supported")
+    if attachment.size > SUMMARIZE_MAX_BYTES:
+        raise InputError(f"{attachment.filename} is too big (limit {SUMMARIZE_MAX_BYTES // 1024} KB)")
+    text = (await attachment.read()).decode("utf-8", errors="replace")
+    return html_to_text(text) if "html" in content_type or name.endswith((".html", ".htm")) else text
+
+
+async def gather_input(text: Optional[str], attachments: List[discord.Attachment]) -> Tuple[str, List[str]]:
+    """The message text plus the contents of its links and attachments as one document, and the links that were cut short"""
+    urls, rest = extract_urls(text or "")
+    sources = [rest] if rest else []
+    truncated = []
+    if urls:
+        async with open_session() as session:
+            for url in urls:
+                try:
+                    page, cut = await fetch_url(session, url)
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    raise InputError(f"Couldn't fetch {url}: {e or type(e).__name__}")
+                sources.append(page)
+                if cut:
+                    truncated.append(url)
+    for attachment in attachments:
+        sources.append(await read_attachment(attachment))
+    return "\n\n".join(s.strip() for s in sources if s.strip()), truncated
+
+
+# --- map-reduce ---
+
+def _pieces(text: str, max_chars: int) -> List[str]:
+    """Paragraphs, with any paragraph over max_chars broken into sentences, then at spaces"""
+    pieces = []
+    for paragraph in re.split(r"\n\s*\n", text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if len(paragraph) <= max_chars:
+            pieces.append(paragraph)
+            continue
+        for sentence in _SENTENCE_END.split(paragraph):
+            while len(sentence) > max_chars:
+                cut = sentence.rfind(" ", 0, max_chars)
+                cut = cut if cut > max_chars // 2 else max_chars
+                pieces.append(sentence[:cut])
+                sentence = sentence[cut:].lstrip()
+            if sentence:
+                pieces.append(sentence)
+    return pieces
+
+
+def split_chunks(text: str, max_tokens: int = SUMMARIZE_CHUNK_TOKENS) -> List[str]:
+    """Pack text into chunks of at most about max_tokens, breaking at the largest boundary that fits"""
+    max_chars = max_tokens * 4
+    chunks, current = [], ""
+    for piece in _pieces(text, max_chars):
+        candidate = f"{current}\n\n{piece}" if current else piece
+        if len(candidate) <= max_chars:
+            current = candidate
+        else:
+            chunks.append(current)
+            current = piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _groups(summaries: List[str], max_tokens: int) -> List[List[str]]:
+    """Consecutive summaries packed into prompts that fit, at least two per group so each round shrinks"""
+    groups, current = [], []
+    for summary in summaries:
+        if len(current) >= 2 and estimate_tokens("\n\n".join(current + [summary])) > max_tokens:
+            groups.append(current)
+            current = []
+        current.append(summary)
+    if current:
+        groups.append(current)
+    return groups
+
+
+async def _gather(coros) -> List[str]:
+    """asyncio.gather that cancels the other jobs as soon as one fails"""
+    tasks = [asyncio.ensure_future(coro) for coro in coros]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+
+
+def _numbered(summaries: List[str]) -> str:
+    return "\n\n".join(f"Part {i}: {summary.strip()}" for i, summary in enumerate(summaries, 1))
+
+
+class MapReduce:
+    def __init__(self, complete: Complete, chunk_tokens: int = SUMMARIZE_CHUNK_TOKENS,
+                 max_chunks: int = SUMMARIZE_MAX_CHUNKS):
+        self.complete = complete
+        self.chunk_tokens = chunk_tokens
+        self.max_chunks = max_chunks
+
+    async def final_prompt(self, text: str, on_progress: Optional[Progress] = None) -> Tuple[str, Dict[str, float]]:
+        """
+        Run the map and all but the last reduce round; returns the prompt for the final summary (for the
+        caller to stream) and stats: chunks, and seconds spent in map/reduce.
+        """
+        chunks = split_chunks(text, self.chunk_tokens)
+        if len(chunks) > self.max_chunks:
+            raise InputError(
+                f"That's too long to summarize (about {estimate_tokens(text)} tokens, "
+                f"the limit is {self.chunk_tokens * self.max_chunks})"
+            )
+        stats = {"chunks": len(chunks), "map": 0.0, "reduce": 0.0}
+        if len(chunks) <= 1:
+            return SUMMARIZE_PROMPT.format(text=text.strip()), stats
+
+        start = time.perf_counter()
+        done = 0
+
+        async def summarize_chunk(chunk: str) -> str:
+            nonlocal done
+            summary = await self.complete(MAP_PROMPT.format(text=chunk))
+            done += 1
+            if on_progress is not None:
+                await on_progress(done, len(chunks))
+            return summary
+
+        # The scheduler bounds how many of these actually run at once
+        summaries = await _gather(summarize_chunk(chunk) for chunk in chunks)
+        stats["map"] = time.perf_counter() - start
+        STAGE_LATENCY.labels(stage="map").observe(stats["map"])
+
+        start = time.perf_counter()
+        while len(summaries) > 1 and estimate_tokens(_numbered(summaries)) > self.chunk_tokens:
+            groups = _groups(summaries, self.chunk_tokens)
+            summaries = await _gather(self.complete(REDUCE_PROMPT.format(text=_numbered(group))) for group in groups)
+        stats["reduce"] = time.perf_counter() - start
+        if stats["reduce"]:
+            STAGE_LATENCY.labels(stage="reduce").observe(stats["reduce"])
+        return REDUCE_PROMPT.format(text=_numbered(summaries)), stats
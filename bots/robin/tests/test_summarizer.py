@@ -0,0 +1,117 @@
+import asyncio
+
+import aiohttp
+import pytest
+from aiohttp import web
+
+import summarizer
+from summarizer import InputError, PublicResolver, fetch_url
+
+
+async def _serve(handler):
+    app = web.Application()
+    app.router.add_get("/{tail:.*}", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "localhost", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://localhost:{port}"
+
+
+async def _chunked(request):
+    response = web.StreamResponse(headers={"Content-Type": "text/plain; charset=utf-8"})
+    await response.prepare(request)
+    for _ in range(50):
+        await response.write(b"x" * 4096)
+        await asyncio.sleep(0)
+    await response.write_eof()
+    return response
+
+
+def test_fetch_url_reads_a_chunked_body_to_the_end():
+    async def run():
+        runner, base = await _serve(_chunked)
+        try:
+            async with aiohttp.ClientSession() as session:
+                return await fetch_url(session, base)
+        finally:
+            await runner.cleanup()
+
+    text, truncated = asyncio.run(run())
+    assert len(text) == 50 * 4096
+    assert not truncated
+
+
+def test_fetch_url_cuts_long_pages_off_and_says_so(monkeypatch):
+    monkeypatch.setattr(summarizer, "SUMMARIZE_MAX_BYTES", 10_000)
+
+    async def run():
+        runner, base = await _serve(_chunked)
+        try:
+            async with aiohttp.ClientSession() as session:
+                return await fetch_url(session, base)
+        finally:
+            await runner.cleanup()
+
+    text, truncated = asyncio.run(run())
+    assert len(text) == 10_000
+    assert truncated
+
+
+class _FakeResolver:
+    def __init__(self, address):
+        self.address = address
+
+    async def resolve(self, host, port=0, family=0):
+        return [{"hostname": host, "host": self.address, "port": port, "family": family, "proto": 0, "flags": 0}]
+
+    async def close(self):
+        pass
+
+
+@pytest.mark.parametrize("address", ["127.0.0.1", "10.0.0.5", "169.254.169.254", "::1"])
+def test_public_resolver_refuses_private_addresses(address):
+    async def run():
+        resolver = PublicResolver()
+        resolver._resolver = _FakeResolver(address)
+        connector = aiohttp.TCPConnector(resolver=resolver, use_dns_cache=False)
+        async with aiohttp.ClientSession(connector=connector) as session:
+            await fetch_url(session, "http://rebinding.example/")
+
+    with pytest.raises(InputError, match="isn't a public address"):
+        asyncio.run(run())
+
+
+@pytest.mark.parametrize("url", ["http://127.0.0.1/", "http://[::1]:11434/", "http://192.168.1.10/"])
+def test_fetch_url_refuses_private_ip_literals(url):
+    async def run():
+        async with summarizer.open_session() as session:
+            await fetch_url(session, url)
+
+    with pytest.raises(InputError, match="isn't a public address"):
+        asyncio.run(run())
+
+
+def test_redirects_are_checked_on_every_hop():
+    async def redirect(request):
+        raise web.HTTPFound("http://127.0.0.1:11434/api/tags")
+
+    async def run():
+        runner, base = await _serve(redirect)
+        try:
+            async with aiohttp.ClientSession() as session:
+                await fetch_url(session, base)
+        finally:
+            await runner.cleanup()
+
+    with pytest.raises(InputError, match="127.0.0.1 isn't a public address"):
+        asyncio.run(run())
+
+
+def test_split_chunks_respects_the_token_budget():
+    text = "\n\n".join(f"Paragraph {i}. " + "word " * 300 for i in range(10))
+    chunks = summarizer.split_chunks(text, max_tokens=500)
+    assert len(chunks) > 1
+    assert all(len(chunk) <= 500 * 4 for chunk in chunks)
+    assert "".join(chunks).replace("\n", "").replace(" ", "") == text.replace("\n", "").replace(" ", "")